@@ -0,0 +1,134 @@
+"""
+Benchmark de concurrencia de /stream: hilos, memoria y FPS entregados con 10 a 300 espectadores.
+
+Compara SERVING_MODE "threads" (werkzeug, un hilo por conexión) contra "asyncio" (uvicorn con
+create_async_app, una corrutina por espectador). El servidor corre en un proceso aparte con un
+SecurityProcessor real al que se le publican frames a TARGET_FPS; sus hilos y su RSS se leen de /proc.
+
+Uso: python benchmarks/bench_async_viewers.py [segundos_por_escenario]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_ps import Config
+
+PORT = 8094
+VIEWER_COUNTS = [10, 100, 300]
+
+
+def serve(mode, ready):
+    """Servidor de clientes en el modo pedido con frames sintéticos publicados a TARGET_FPS"""
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    folder = tempfile.mkdtemp()
+    Config.EVENTS_FOLDER = os.path.join(folder, "events")
+    Config.EVENTS_DB_PATH = os.path.join(folder, "events.sqlite")
+
+    import processing_server
+    processing_server.EventCatalog.__init__.__defaults__ = (Config.EVENTS_DB_PATH,)
+    processor = processing_server.SecurityProcessor()
+    broadcaster = processor.get_camera(Config.DEFAULT_CAMERA_ID).broadcaster
+
+    def feed():
+        frame = np.full((Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), 90, dtype=np.uint8)
+        for i in range(sys.maxsize):
+            frame[:] = 90
+            cv2.putText(frame, str(i), (100, 360), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 8)
+            broadcaster.publish(frame.copy())
+            time.sleep(1.0 / Config.TARGET_FPS)
+
+    threading.Thread(target=feed, daemon=True).start()
+
+    if mode == "asyncio":
+        import uvicorn
+        app = processing_server.create_async_app(
+            processor, processing_server.VideoFileSender(), processing_server.FrameStreamReceiver(processor)
+        )
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="error"))
+        threading.Timer(1.0, ready.set).start()
+        server.run()
+    else:
+        from flask import Flask, Response
+        from werkzeug.serving import make_server
+        app = Flask(__name__)
+
+        @app.route("/stream")
+        def stream():
+            return Response(broadcaster.stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+        server = make_server("127.0.0.1", PORT, app, threaded=True)
+        ready.set()
+        server.serve_forever()
+
+
+def process_status(pid):
+    """(hilos, RSS en MB) del proceso servidor"""
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.strip()
+    return int(fields["Threads"]), int(fields["VmRSS"].split()[0]) / 1024
+
+
+async def viewer(frames, stop):
+    """Lee /stream contando los frames recibidos hasta que se pide detener"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    index = len(frames)
+    frames.append(0)
+    while not stop.is_set():
+        chunk = await reader.read(256 * 1024)
+        if not chunk:
+            break
+        frames[index] += chunk.count(b"--frame\r\n")
+    writer.close()
+
+
+async def run(pid, viewers, duration):
+    """Conecta N espectadores y retorna (hilos, RSS MB, FPS promedio por espectador)"""
+    frames, stop = [], asyncio.Event()
+    tasks = [asyncio.create_task(viewer(frames, stop)) for _ in range(viewers)]
+    await asyncio.sleep(1.0)
+    start_frames = sum(frames)
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    fps = (sum(frames) - start_frames) / (time.perf_counter() - start) / viewers
+    threads, rss = process_status(pid)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(1.0)
+    return threads, rss, fps
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    print(f"Frames publicados a {Config.TARGET_FPS} FPS")
+    print(f"{'modo':<9}{'espectadores':>13}{'hilos':>8}{'RSS MB':>9}{'FPS/espectador':>16}")
+    for mode in ("threads", "asyncio"):
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(mode, ready), daemon=True)
+        server.start()
+        ready.wait()
+        idle_threads, idle_rss = process_status(server.pid)
+        print(f"{mode:<9}{0:>13}{idle_threads:>8}{idle_rss:>9.1f}{'-':>16}")
+        for viewers in VIEWER_COUNTS:
+            threads, rss, fps = asyncio.run(run(server.pid, viewers, duration))
+            print(f"{mode:<9}{viewers:>13}{threads:>8}{rss:>9.1f}{fps:>16.1f}")
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark de codificación de eventos: ruta anterior (AVI MJPG temporal + re-codificación con ffmpeg)
+contra EncoderPool (frames crudos por stdin a un único ffmpeg, una sola pasada).
+
+Reporta tiempo total por evento y bytes escritos en disco (incluyendo archivos temporales).
+
+Uso: python benchmarks/bench_event_encoding.py [segundos_de_clip]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_ps import Config
+from processing_server import EncoderPool, EventRecorder
+
+
+def synthetic_frames(count):
+    """Frames 1280x720 con movimiento para que el codificador tenga trabajo realista"""
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(
+        rng.integers(0, 255, (Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), dtype=np.uint8), (15, 15), 0)
+    return [np.roll(base, i * 6, axis=1) for i in range(count)]
+
+
+def legacy_path(frames, path):
+    """Ruta anterior: todos los frames a un AVI MJPG y luego ffmpeg lo decodifica y re-codifica"""
+    temp_path = path + ".tmp.avi"
+    out = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*"MJPG"), Config.TARGET_FPS,
+                          (Config.FRAME_WIDTH, Config.FRAME_HEIGHT))
+    for frame in frames:
+        out.write(frame)
+    out.release()
+    temp_bytes = os.path.getsize(temp_path)
+    subprocess.run(['ffmpeg', '-y', '-i', temp_path, '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', path],
+                   check=True, capture_output=True)
+    os.remove(temp_path)
+    return temp_bytes + os.path.getsize(path)
+
+
+def single_pass(frames, path):
+    done = threading.Event()
+    recorder = EventRecorder(EncoderPool(workers=1, on_complete=lambda job: done.set()))
+    recorder.start(path)
+    for frame in frames:
+        recorder.write(frame)
+    recorder.finish()
+    done.wait()
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    frames = synthetic_frames(int(seconds * Config.TARGET_FPS))
+    # Cola por grabación del tamaño del clip para que ningún frame se descarte durante la medición
+    Config.ENCODER_FRAME_QUEUE_SIZE = len(frames)
+    folder = tempfile.mkdtemp()
+
+    try:
+        print(f"clip: {len(frames)} frames ({seconds} s at {Config.TARGET_FPS} FPS)")
+        for name, encode in (("legacy avi+ffmpeg", legacy_path), ("single-pass pipe", single_pass)):
+            start = time.time()
+            written = encode(frames, os.path.join(folder, name.replace(" ", "_") + ".mp4"))
+            print(f"{name:>18}: {time.time() - start:6.2f} s wall, {written / (1024 * 1024):7.2f} MB written")
+    finally:
+        shutil.rmtree(folder)
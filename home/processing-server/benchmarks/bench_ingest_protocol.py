@@ -0,0 +1,81 @@
+"""
+Microbenchmark de ingesta: JSON con JPEG en base64 (/process_frame) contra el sobre binario
+(/process_frame_binary). Reporta bytes en la red y CPU del servidor por frame.
+
+Uso: python benchmarks/bench_ingest_protocol.py [iteraciones]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_ps import Config
+from processing_server import FrameEnvelope
+
+DETECTIONS = [
+    {"bbox": {"x": 100, "y": 120, "width": 220, "height": 480}, "category": "person", "score": 0.81},
+    {"bbox": {"x": 700, "y": 300, "width": 180, "height": 140}, "category": "bicycle", "score": 0.62},
+]
+
+
+def synthetic_jpeg():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (9, 9), 0)
+    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY])
+    return buffer
+
+
+def json_payload(jpeg):
+    return json.dumps({
+        "frame": base64.b64encode(jpeg).decode('utf-8'),
+        "detections": DETECTIONS,
+        "timestamp": time.strftime("%B%d/%Y %H:%M:%S"),
+        "fps": 24.0,
+        "frame_width": Config.FRAME_WIDTH,
+        "frame_height": Config.FRAME_HEIGHT,
+        "detections_count": len(DETECTIONS)
+    }).encode()
+
+
+def decode_json(body):
+    """Lo que hace el servidor antes de imdecode en /process_frame"""
+    frame_data = json.loads(body)
+    frame_bytes = base64.b64decode(frame_data['frame'])
+    return np.frombuffer(frame_bytes, np.uint8), frame_data['detections']
+
+
+def decode_binary(body):
+    """Lo que hace el servidor antes de imdecode en /process_frame_binary"""
+    envelope = FrameEnvelope.unpack(body)
+    return envelope["jpeg"], envelope["detections"]
+
+
+def cpu_per_frame(decoder, body, iterations, with_imdecode):
+    start = time.process_time()
+    for _ in range(iterations):
+        jpeg, _ = decoder(body)
+        if with_imdecode:
+            cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+    return (time.process_time() - start) / iterations * 1000
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    jpeg = synthetic_jpeg()
+    bodies = {
+        "json+base64": (decode_json, json_payload(jpeg)),
+        "binary": (decode_binary, FrameEnvelope.pack(jpeg, DETECTIONS, time.time(), 24.0)),
+    }
+
+    print(f"JPEG size: {len(jpeg)} bytes")
+    print(f"{'protocol':>12} | {'wire bytes':>10} | {'parse ms/frame':>14} | {'parse+imdecode ms/frame':>23}")
+    for name, (decoder, body) in bodies.items():
+        parse_ms = cpu_per_frame(decoder, body, iterations, with_imdecode=False)
+        total_ms = cpu_per_frame(decoder, body, iterations, with_imdecode=True)
+        print(f"{name:>12} | {len(body):>10} | {parse_ms:>14.3f} | {total_ms:>23.3f}")
@@ -0,0 +1,82 @@
+"""
+Benchmark de procesamiento de frames: throughput total con 1 a 4 cámaras en modo hilos vs procesos.
+
+En modo "threads" cada cámara decodifica y anota en su hilo (compartiendo el GIL); en modo
+"processes" lo hace un FrameProcessPool con los frames en memoria compartida. Cada cámara se
+alimenta tan rápido como la acepta (como la ingesta persistente con contrapresión).
+
+Uso: python benchmarks/bench_process_pool.py [segundos_por_escenario] [procesos]
+"""
+import os
+import sys
+import time
+import threading
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_ps import Config
+from processing_server import CameraPipeline, EncoderPool, FrameProcessPool
+
+CAMERA_COUNTS = [1, 2, 4]
+
+# Fuera de la zona segura por defecto: no se inician grabaciones durante la medición
+DETECTIONS = [
+    {"bbox": {"x": 700, "y": 200, "width": 180, "height": 360}, "category": "person", "score": 0.87},
+    {"bbox": {"x": 950, "y": 260, "width": 140, "height": 220}, "category": "bicycle", "score": 0.64},
+]
+
+
+def synthetic_jpeg():
+    """JPEG 1280x720 con ruido suavizado para que la decodificación tenga un costo realista"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (9, 9), 0)
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def run(jpeg, cameras, duration, frame_pool=None):
+    """Alimenta N cámaras durante duration segundos y retorna (fps totales, CPU del proceso principal %)"""
+    encoder_pool = EncoderPool(workers=1)
+    pipelines = [CameraPipeline(f"bench{i}", encoder_pool, frame_pool=frame_pool) for i in range(cameras)]
+    timestamp_str = time.strftime("%B%d/%Y %H:%M:%S")
+    running = True
+
+    def feed(pipeline):
+        while running:
+            pipeline.submit((jpeg, DETECTIONS, timestamp_str, 30.0), block=True)
+
+    feeders = [threading.Thread(target=feed, args=(pipeline,), daemon=True) for pipeline in pipelines]
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for feeder in feeders:
+        feeder.start()
+    time.sleep(duration)
+    processed = sum(pipeline.frames_processed for pipeline in pipelines)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    running = False
+    for pipeline in pipelines:
+        pipeline.stop()
+    return processed / elapsed, cpu / elapsed * 100
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else Config.PROCESSING_WORKERS
+    jpeg = synthetic_jpeg()
+    print(f"JPEG de {len(jpeg) / 1024:.0f} KB, {os.cpu_count()} CPUs, pool de {workers} procesos")
+
+    frame_pool = FrameProcessPool(workers)
+    print(f"{'cámaras':>8}{'hilos fps':>12}{'CPU %':>8}{'procesos fps':>15}{'CPU %':>8}")
+    for cameras in CAMERA_COUNTS:
+        threads_fps, threads_cpu = run(jpeg, cameras, duration)
+        processes_fps, processes_cpu = run(jpeg, cameras, duration, frame_pool)
+        print(f"{cameras:>8}{threads_fps:>12.1f}{threads_cpu:>8.0f}{processes_fps:>15.1f}{processes_cpu:>8.0f}")
+    frame_pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark de carga para /stream: CPU usada por la codificación MJPEG con 1 a 50 espectadores.
+
+Compara el esquema anterior (cada espectador ejecuta su propio imencode) contra
+FrameBroadcaster (un solo imencode por frame compartido por todos).
+
+Uso: python benchmarks/bench_stream_fanout.py [segundos_por_escenario]
+"""
+import os
+import sys
+import time
+import threading
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_ps import Config
+from processing_server import FrameBroadcaster
+
+VIEWER_COUNTS = [1, 5, 10, 25, 50]
+
+
+def synthetic_frames(count=30):
+    """Genera frames 1280x720 con ruido para que el JPEG tenga un costo realista"""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), dtype=np.uint8)
+    base = cv2.GaussianBlur(base, (9, 9), 0)
+    return [np.roll(base, i * 8, axis=1) for i in range(count)]
+
+
+def run_legacy(frames, viewers, duration):
+    """Un hilo por espectador que codifica el frame actual a STREAM_FPS"""
+    state = {"frame": frames[0], "running": True}
+
+    def viewer():
+        while state["running"]:
+            cv2.imencode('.jpg', state["frame"], [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY])
+            time.sleep(1.0 / Config.STREAM_FPS)
+
+    threads = [threading.Thread(target=viewer, daemon=True) for _ in range(viewers)]
+    return _measure(frames, duration, threads, lambda frame: state.__setitem__("frame", frame),
+                    lambda: state.__setitem__("running", False))
+
+
+def run_broadcaster(frames, viewers, duration):
+    """Un único hilo codificador y N consumidores esperando cada frame nuevo"""
+    broadcaster = FrameBroadcaster()
+    streams = [broadcaster.stream() for _ in range(viewers)]
+
+    def viewer(stream):
+        for _ in stream:
+            if not broadcaster.running:
+                break
+
+    threads = [threading.Thread(target=viewer, args=(stream,), daemon=True) for stream in streams]
+    return _measure(frames, duration, threads, broadcaster.publish, broadcaster.stop)
+
+
+def _measure(frames, duration, threads, publish, stop):
+    for thread in threads:
+        thread.start()
+
+    cpu_start = time.process_time()
+    wall_start = time.time()
+    index = 0
+    while time.time() - wall_start < duration:
+        publish(frames[index % len(frames)])
+        index += 1
+        time.sleep(1.0 / Config.TARGET_FPS)
+    cpu_used = time.process_time() - cpu_start
+    wall_used = time.time() - wall_start
+    stop()
+    return cpu_used / wall_used * 100
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    frames = synthetic_frames()
+
+    print(f"{'viewers':>8} | {'legacy CPU %':>12} | {'broadcaster CPU %':>17}")
+    for viewers in VIEWER_COUNTS:
+        legacy = run_legacy(frames, viewers, duration)
+        broadcast = run_broadcaster(frames, viewers, duration)
+        print(f"{viewers:>8} | {legacy:>12.1f} | {broadcast:>17.1f}")
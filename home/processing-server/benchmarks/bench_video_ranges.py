@@ -0,0 +1,136 @@
+"""
+Benchmark de descargas de /video: MB/s y CPU del servidor con 1 a 16 descargas concurrentes.
+
+Compara el handler anterior (generador de 1 KB, sin soporte real de Range) contra
+VideoFileSender (wsgi.file_wrapper para archivos completos y lecturas de VIDEO_CHUNK_SIZE
+para rangos). El servidor corre en un proceso aparte para medir solo su CPU.
+
+Uso: python benchmarks/bench_video_ranges.py [tamaño_mb]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+import http.client
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
+from processing_server import VideoFileSender
+
+PORT = 8093
+CONCURRENCY = [1, 4, 16]
+
+
+def serve(path, ready):
+    """Servidor con ambos handlers y un endpoint que reporta su tiempo de CPU"""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = Flask(__name__)
+    sender = VideoFileSender()
+
+    @app.route("/legacy")
+    def legacy():
+        def generate():
+            with open(path, 'rb') as f:
+                data = f.read(1024)
+                while data:
+                    yield data
+                    data = f.read(1024)
+
+        response = Response(generate(), mimetype='video/mp4')
+        response.headers['Content-Length'] = str(os.path.getsize(path))
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+
+    @app.route("/ranged")
+    def ranged():
+        return sender.send(path, request)
+
+    @app.route("/cpu")
+    def cpu():
+        return str(time.process_time())
+
+    server = make_server("127.0.0.1", PORT, app, threaded=True)
+    ready.set()
+    server.serve_forever()
+
+
+def request_bytes(route, headers=None):
+    """Descarga una ruta y retorna (status, bytes recibidos)"""
+    conn = http.client.HTTPConnection("127.0.0.1", PORT)
+    conn.request("GET", route, headers=headers or {})
+    response = conn.getresponse()
+    received = 0
+    while True:
+        chunk = response.read(256 * 1024)
+        if not chunk:
+            break
+        received += len(chunk)
+    conn.close()
+    return response.status, received
+
+
+def server_cpu():
+    """Segundos de CPU consumidos hasta ahora por el proceso servidor"""
+    conn = http.client.HTTPConnection("127.0.0.1", PORT)
+    conn.request("GET", "/cpu")
+    seconds = float(conn.getresponse().read())
+    conn.close()
+    return seconds
+
+
+def run(route, concurrency, headers=None):
+    """Lanza descargas concurrentes y mide MB/s totales y CPU del servidor por descarga"""
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(request_bytes(route, headers)))
+               for _ in range(concurrency)]
+    cpu_start = server_cpu()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = server_cpu() - cpu_start
+    total_mb = sum(received for _, received in results) / (1024 ** 2)
+    statuses = sorted({status for status, _ in results})
+    return total_mb / elapsed, cpu / concurrency * 1000, statuses
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    path = os.path.join(tempfile.mkdtemp(), "clip.mp4")
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size_mb * 1024 * 1024))
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(path, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    size = size_mb * 1024 * 1024
+    parts = ",".join(f"{i * size // 4}-{i * size // 4 + size // 8 - 1}" for i in range(4))
+    scenarios = [
+        ("legacy completo", "/legacy", None),
+        ("file_wrapper completo", "/ranged", None),
+        ("rango 2ª mitad", "/ranged", {"Range": f"bytes={size // 2}-"}),
+        ("multirango 4 partes", "/ranged", {"Range": f"bytes={parts}"}),
+    ]
+
+    print(f"Archivo de {size_mb} MB")
+    print(f"{'escenario':<24}{'concurrencia':>13}{'MB/s':>10}{'CPU ms/descarga':>18}  status")
+    for name, route, headers in scenarios:
+        for concurrency in CONCURRENCY:
+            throughput, cpu_ms, statuses = run(route, concurrency, headers)
+            print(f"{name:<24}{concurrency:>13}{throughput:>10.1f}{cpu_ms:>18.1f}  {statuses}")
+
+    server.terminate()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
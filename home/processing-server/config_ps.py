@@ -13,19 +13,53 @@ class Config:
     # Zona segura (x1, y1, x2, y2)
     SAFE_ZONE_START = (0, 0)
     SAFE_ZONE_END = (480, 720)
+    CAMERA_SAFE_ZONES = {}  # zona segura por cámara {camera_id: ((x1, y1), (x2, y2))}; las demás usan la de arriba
+    
+    # Cámaras (cada Raspberry Pi envía su camera_id; los clientes que no lo envían usan DEFAULT_CAMERA_ID)
+    DEFAULT_CAMERA_ID = "cam0"
+    MAX_CAMERAS = 16  # cámaras distintas aceptadas
+    CAMERA_QUEUE_SIZE = 2  # frames por cámara pendientes de procesar antes de descartar los viejos
+    
+    # Procesamiento de frames: "threads" (un hilo por cámara) o "processes" (pool de procesos fuera del GIL,
+    # cada cámara asignada a un proceso y los frames en memoria compartida)
+    PROCESSING_MODE = os.getenv("PROCESSING_MODE", "threads")
+    PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+    PROCESSING_SHARED_SLOTS = 4  # ranuras de memoria compartida por cámara (~2.8 MB c/u a 1280x720)
+    PROCESSING_JPEG_SLOT_BYTES = 512 * 1024  # JPEG más grandes se procesan en el hilo de la cámara
+    PROCESSING_RESULT_TIMEOUT = 2.0  # segundos de espera por un resultado antes de procesar en el hilo de la cámara
     
     # Grabación de eventos
     MIN_VIDEO_DURATION = 1  # segundos mínimos para guardar video
-    MAX_VIDEO_DURATION = 3  # segundos máximos por video
+    MAX_VIDEO_DURATION = 3  # segundos máximos por video (la grabación es incremental: no depende de la RAM)
     MAX_DETECTION_DELAY = 2  # segundos sin detección para finalizar grabación
-    EVENT_CHECK_INTERVAL = 12  # cada cuantos eventos verificar almacenamiento
+    PRE_ROLL_SECONDS = 2  # segundos previos a la invasión incluidos al inicio de cada video (0 = desactivado)
+    PRE_ROLL_SLOT_BYTES = 256 * 1024  # tamaño máximo de cada JPEG en el buffer previo (memoria fija)
+    
+    # Codificación de eventos en segundo plano (cada worker maneja un proceso ffmpeg)
+    ENCODER_WORKERS = 2  # grabaciones codificándose en paralelo
+    ENCODER_MAX_PENDING_JOBS = 2  # grabaciones esperando un worker libre (más allá se rechazan)
+    ENCODER_FRAME_QUEUE_SIZE = 30  # frames en cola por grabación antes de descartar (~2.7 MB c/u)
+    ENCODER_RECENT_JOBS = 20  # trabajos recientes reportados en /status
     
     # Almacenamiento temporal (se borra al reiniciar contenedor)
     STORAGE_CAPACITY_GB = 3  # capacidad máxima en GB
+    STORAGE_HIGH_WATERMARK = 1.0  # fracción de la capacidad (o cuota) a partir de la cual se borran videos
+    STORAGE_LOW_WATERMARK = 0.9  # fracción hasta la que se borran los videos más antiguos
+    CAMERA_STORAGE_QUOTAS_GB = {}  # cuota opcional por cámara, p. ej. {"cam1": 0.5}
+    RETENTION_BATCH_SIZE = 64  # videos leídos del catálogo por consulta al liberar espacio
     EVENTS_FOLDER = "/tmp/events"  # Carpeta temporal
     LOGS_FOLDER = "/tmp/logs"  # Logs temporales
+    EVENTS_DB_PATH = "/tmp/events.sqlite"  # Catálogo de eventos (fuera de EVENTS_FOLDER)
+    
+    # Consulta de eventos (/events)
+    EVENTS_PAGE_SIZE = 50  # eventos por página cuando se pide ?page sin ?page_size
+    EVENTS_MAX_PAGE_SIZE = 1000  # máximo de eventos por página (sin ?page ni ?page_size se retornan todos)
+    
+    # Descarga de videos (/video)
+    VIDEO_CHUNK_SIZE = 1024 * 1024  # bytes por lectura al servir rangos
+    VIDEO_MAX_RANGES = 16  # rangos por petición; si se piden más se sirve el archivo completo
     
-    # Seguridad de red - Solo acepta conexiones de IPs específicas
+    # Seguridad de red (IPs, redes CIDR o hostnames) - Solo acepta conexiones de IPs específicas
     ALLOWED_RASPBERRY_IPS = ["172.20.0.9"]  # Solo IP del contenedor raspberry
     ALLOWED_CLIENT_IPS = [
         "127.0.0.1", 
@@ -37,6 +71,8 @@ class Config:
         "MacBook-Air-Montenegro.local",
         "185.199.108.133"
     ]
+    ALLOWLIST_DNS_TTL = 300  # segundos que se confía en la IP resuelta de un hostname antes de re-resolverlo
+    ALLOWLIST_DNS_NEGATIVE_TTL = 30  # segundos antes de reintentar un hostname que no resolvió
     
     # ================= CONFIGURACIÓN AUTOMÁTICA (Sistema) =================
     
@@ -45,10 +81,19 @@ class Config:
     FRAME_HEIGHT = 720
     TARGET_FPS = 30
     
+    # Servidor web de clientes (puerto 8080): "threads" (werkzeug, un hilo por conexión) o "asyncio"
+    # (uvicorn, una corrutina por espectador de /stream o descarga de /video); la ingesta no cambia
+    SERVING_MODE = os.getenv("SERVING_MODE", "threads")
+    
     # Streaming
     STREAM_FPS = 30
     STREAM_QUALITY = 70  # Calidad JPEG para streaming
     
+    # Ingesta por conexión persistente (TCP con acks de control de flujo)
+    STREAM_INGEST_PORT = 8082
+    STREAM_INGEST_QUEUE_SIZE = 4  # frames recibidos pendientes de procesar por conexión
+    STREAM_INGEST_MAX_FRAME_BYTES = 8 * 1024 * 1024
+    
     # Timeouts de red automáticos basados en contenedores (AUMENTADOS)
     @staticmethod
     def get_network_timeout():
@@ -76,6 +121,11 @@ class Config:
         """Retorna la URL completa de la Raspberry Pi"""
         return f"http://{cls.get_raspberry_pi_host()}:{cls.get_raspberry_pi_port()}"
     
+    @classmethod
+    def get_safe_zone(cls, camera_id):
+        """Zona segura (inicio, fin) de una cámara"""
+        return cls.CAMERA_SAFE_ZONES.get(camera_id, (cls.SAFE_ZONE_START, cls.SAFE_ZONE_END))
+    
     @classmethod
     def validate_config(cls):
         """Valida la configuración antes de iniciar el sistema"""
@@ -87,14 +137,35 @@ class Config:
             raise ValueError("MIN_VIDEO_DURATION debe ser menor que MAX_VIDEO_DURATION")
         if cls.DETECTION_SCORE_THRESHOLD < 0 or cls.DETECTION_SCORE_THRESHOLD > 1:
             raise ValueError("DETECTION_SCORE_THRESHOLD debe estar entre 0 y 1")
+        if cls.PRE_ROLL_SECONDS < 0:
+            raise ValueError("PRE_ROLL_SECONDS no puede ser negativo")
+        if cls.ENCODER_WORKERS < 1:
+            raise ValueError("ENCODER_WORKERS debe ser mayor o igual a 1")
         if cls.STORAGE_CAPACITY_GB <= 0:
             raise ValueError("STORAGE_CAPACITY_GB debe ser mayor que 0")
+        if not 0 < cls.STORAGE_LOW_WATERMARK <= cls.STORAGE_HIGH_WATERMARK:
+            raise ValueError("Debe cumplirse 0 < STORAGE_LOW_WATERMARK <= STORAGE_HIGH_WATERMARK")
+        if any(quota <= 0 for quota in cls.CAMERA_STORAGE_QUOTAS_GB.values()):
+            raise ValueError("CAMERA_STORAGE_QUOTAS_GB debe tener cuotas mayores que 0")
         
         # Validar zona segura dentro del frame
         if cls.SAFE_ZONE_START[0] < 0 or cls.SAFE_ZONE_START[1] < 0:
             raise ValueError("SAFE_ZONE_START debe tener coordenadas positivas")
         if cls.SAFE_ZONE_END[0] > cls.FRAME_WIDTH or cls.SAFE_ZONE_END[1] > cls.FRAME_HEIGHT:
             raise ValueError(f"SAFE_ZONE_END debe estar dentro del frame {cls.FRAME_WIDTH}x{cls.FRAME_HEIGHT}")
+        for camera_id, (start, end) in cls.CAMERA_SAFE_ZONES.items():
+            if start[0] >= end[0] or start[1] >= end[1] or min(start) < 0:
+                raise ValueError(f"Zona segura inválida para la cámara {camera_id}")
+        if cls.PROCESSING_MODE not in ("threads", "processes"):
+            raise ValueError("PROCESSING_MODE debe ser 'threads' o 'processes'")
+        if cls.PROCESSING_WORKERS < 1 or cls.PROCESSING_SHARED_SLOTS < 2:
+            raise ValueError("PROCESSING_WORKERS debe ser >= 1 y PROCESSING_SHARED_SLOTS >= 2")
+        if cls.PROCESSING_RESULT_TIMEOUT <= 0:
+            raise ValueError("PROCESSING_RESULT_TIMEOUT debe ser mayor que 0")
+        if cls.SERVING_MODE not in ("threads", "asyncio"):
+            raise ValueError("SERVING_MODE debe ser 'threads' o 'asyncio'")
+        if cls.MAX_CAMERAS < 1:
+            raise ValueError("MAX_CAMERAS debe ser mayor o igual a 1")
         
         # Crear carpetas temporales (se borran al reiniciar contenedor)
         os.makedirs(cls.EVENTS_FOLDER, exist_ok=True)
@@ -2,262 +2,1645 @@ import os
 import re
 import cv2
 import time
+import queue
+import atexit
+import asyncio
 import base64
-import shutil
 import socket
+import struct
 import logging
+import sqlite3
 import threading
 import ipaddress
 import subprocess
+import collections
+import multiprocessing
 import numpy as np
+from datetime import datetime, timezone
 from flask import Flask, Response, jsonify, request, abort, send_file
 from flask_cors import CORS
+from multiprocessing import shared_memory
+from werkzeug.wsgi import wrap_file
+from werkzeug.security import safe_join
+from werkzeug.http import http_date, quote_etag, is_resource_modified
 from config_ps import Config
 
 
-class SecurityMiddleware:
-    """Middleware para validar IPs y hostnames autorizados"""
-    
-    @staticmethod
-    def resolve_hostname_to_ip(hostname):
-        """Resuelve un hostname a su IP correspondiente"""
-        try:
-            return socket.gethostbyname(hostname)
-        except socket.gaierror:
-            logging.warning(f"Could not resolve hostname: {hostname}")
-            return None
-    
-    @staticmethod
-    def get_all_allowed_ips(allowed_list):
-        """Convierte lista de IPs y hostnames a lista de IPs válidas"""
-        allowed_ips = []
-        
-        for item in allowed_list:
-            # Si es una IP directa
+class IPAllowlist:
+    """Lista de acceso precompilada: IPs exactas en un set (búsqueda O(1)), redes CIDR como ip_network
+    y hostnames resueltos en segundo plano con TTL (y TTL negativo para los que no resuelven)"""
+
+    def __init__(self, entries, ttl=Config.ALLOWLIST_DNS_TTL, negative_ttl=Config.ALLOWLIST_DNS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.static_addresses = set()
+        self.networks = []
+        self.hostnames = {}  # hostname -> (IPs resueltas, expiración)
+
+        for item in entries:
             try:
-                ipaddress.ip_address(item)
-                allowed_ips.append(item)
-                continue
+                network = ipaddress.ip_network(item, strict=False)
             except ValueError:
-                pass
-            
-            # Si es un hostname, intentar resolverlo
-            resolved_ip = SecurityMiddleware.resolve_hostname_to_ip(item)
-            if resolved_ip:
-                allowed_ips.append(resolved_ip)
-                logging.info(f"Resolved {item} -> {resolved_ip}")
-        
-        return allowed_ips
-    
+                self.hostnames[item] = (frozenset(), 0.0)
+                continue
+            if network.num_addresses == 1:
+                self.static_addresses.add(network.network_address)
+            else:
+                self.networks.append(network)
+
+        self.addresses = frozenset(self.static_addresses)
+
     @staticmethod
-    def is_raspberry_allowed(client_ip):
-        """Verifica si la IP es de la Raspberry Pi autorizada"""
+    def resolve(hostname):
+        """Resuelve un hostname a todas sus IPs (vacío si no resuelve)"""
+        try:
+            return frozenset(ipaddress.ip_address(info[4][0].split('%')[0])
+                             for info in socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP))
+        except (socket.gaierror, UnicodeError, ValueError):
+            return frozenset()
+
+    def refresh(self, force=False):
+        """Vuelve a resolver los hostnames vencidos y publica el nuevo conjunto de IPs de una sola vez"""
+        now = time.monotonic()
+        changed = False
+        for hostname, (resolved, expires) in list(self.hostnames.items()):
+            if not force and expires > now:
+                continue
+            ips = self.resolve(hostname)
+            if ips:
+                if ips != resolved:
+                    logging.info(f"Resolved {hostname} -> {', '.join(sorted(map(str, ips)))}")
+                self.hostnames[hostname] = (ips, now + self.ttl)
+            else:
+                if resolved or expires == 0.0:
+                    logging.warning(f"Could not resolve hostname: {hostname}")
+                self.hostnames[hostname] = (ips, now + self.negative_ttl)
+            changed = changed or ips != resolved
+
+        if changed:
+            addresses = set(self.static_addresses)
+            for ips, _ in self.hostnames.values():
+                addresses.update(ips)
+            self.addresses = frozenset(addresses)
+
+    def next_refresh(self):
+        """Instante (monotonic) en que vence el primer hostname, None si no hay hostnames"""
+        return min((expires for _, expires in self.hostnames.values()), default=None)
+
+    def __contains__(self, client_ip):
         try:
             client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_RASPBERRY_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
         except ValueError:
             return False
-    
+        if client_addr.version == 6 and client_addr.ipv4_mapped:
+            client_addr = client_addr.ipv4_mapped
+        if client_addr in self.addresses:
+            return True
+        return any(client_addr in network for network in self.networks)
+
+    def get_stats(self):
+        return {
+            "addresses": sorted(map(str, self.addresses)),
+            "networks": [str(network) for network in self.networks],
+            "unresolved_hostnames": sorted(name for name, (ips, _) in self.hostnames.items() if not ips)
+        }
+
+
+class SecurityMiddleware:
+    """Middleware para validar IPs y hostnames autorizados (listas precompiladas, sin DNS por petición)"""
+
+    allowlists = {}
+    _lock = threading.Lock()
+    _refresher = None
+
+    @staticmethod
+    def get_allowlist(name):
+        """Lista precompilada para el atributo de Config indicado (se construye y resuelve una sola vez)"""
+        allowlist = SecurityMiddleware.allowlists.get(name)
+        if allowlist is None:
+            with SecurityMiddleware._lock:
+                allowlist = SecurityMiddleware.allowlists.get(name)
+                if allowlist is None:
+                    allowlist = IPAllowlist(getattr(Config, name, []))
+                    allowlist.refresh(force=True)
+                    SecurityMiddleware.allowlists[name] = allowlist
+                    SecurityMiddleware._start_refresher()
+        return allowlist
+
+    @staticmethod
+    def _start_refresher():
+        """Hilo que re-resuelve los hostnames cuando vence su TTL, fuera del camino de las peticiones"""
+        if SecurityMiddleware._refresher is not None:
+            return
+        SecurityMiddleware._refresher = threading.Thread(target=SecurityMiddleware._refresh_loop, daemon=True)
+        SecurityMiddleware._refresher.start()
+
+    @staticmethod
+    def _refresh_loop():
+        while True:
+            allowlists = list(SecurityMiddleware.allowlists.values())
+            for allowlist in allowlists:
+                allowlist.refresh()
+            deadlines = [d for d in (a.next_refresh() for a in allowlists) if d is not None]
+            wait = min(deadlines) - time.monotonic() if deadlines else Config.ALLOWLIST_DNS_TTL
+            time.sleep(min(max(wait, 1.0), Config.ALLOWLIST_DNS_TTL))
+
+    @staticmethod
+    def warm_up(*names):
+        """Compila (y resuelve) las listas indicadas al arrancar para que la primera petición no espere DNS"""
+        for name in names:
+            SecurityMiddleware.get_allowlist(name)
+
+    @staticmethod
+    def get_stats():
+        return {name: allowlist.get_stats() for name, allowlist in SecurityMiddleware.allowlists.items()}
+
+    @staticmethod
+    def is_raspberry_allowed(client_ip):
+        """Verifica si la IP es de la Raspberry Pi autorizada"""
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_RASPBERRY_IPS")
+
     @staticmethod
     def is_client_allowed(client_ip):
         """Verifica si la IP es de un cliente autorizado para ver contenido"""
-        try:
-            client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_CLIENT_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
-        except ValueError:
-            return False
-    
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_CLIENT_IPS")
+
     @staticmethod
     def is_processing_server_allowed(client_ip):
         """Verifica si la IP es del servidor de procesamiento autorizado"""
-        try:
-            client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_PROCESSING_SERVER_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
-        except ValueError:
-            return False
-        
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_PROCESSING_SERVER_IPS")
+
     @staticmethod
     def is_admin_allowed(client_ip):
         """Verifica si la IP es de un administrador autorizado"""
-        try:
-            client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_ADMIN_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
-        except ValueError:
-            return False
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_ADMIN_IPS")
+
+
+class EventCatalog:
+    """Catálogo de eventos grabados (SQLite) para responder /events con consultas indexadas en vez de listar carpetas
+
+    Es también la única fuente del espacio usado: los bytes por cámara se mantienen en memoria y la retención
+    mide y borra sobre los mismos videos. Lo que no es un video catalogado no cuenta ni se borra.
+    """
+
+    def __init__(self, db_path=Config.EVENTS_DB_PATH):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                path TEXT PRIMARY KEY,
+                day TEXT NOT NULL,
+                hour TEXT NOT NULL,
+                start_time REAL NOT NULL,
+                end_time REAL NOT NULL,
+                duration REAL,
+                size_bytes INTEGER NOT NULL,
+                categories TEXT NOT NULL,
+                max_score REAL NOT NULL,
+                breach INTEGER NOT NULL,
+                camera TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_start_time ON events (start_time);
+            CREATE INDEX IF NOT EXISTS events_day ON events (day);
+            CREATE TABLE IF NOT EXISTS event_categories (
+                category TEXT NOT NULL,
+                path TEXT NOT NULL,
+                PRIMARY KEY (category, path)
+            );
+        """)
+        # Catálogos creados antes del soporte multicámara: sus eventos son de la cámara por defecto
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(events)")}
+        if "camera" not in columns:
+            self.connection.execute(
+                f"ALTER TABLE events ADD COLUMN camera TEXT NOT NULL DEFAULT '{Config.DEFAULT_CAMERA_ID}'"
+            )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS events_camera_start_time ON events (camera, start_time)")
+        # Tabla del índice de almacenamiento anterior, que duplicaba los tamaños del catálogo
+        self.connection.execute("DROP TABLE IF EXISTS clips")
+        self.connection.commit()
+        self.camera_bytes = self._camera_totals()
+
+    @property
+    def total_bytes(self):
+        """Bytes de todos los videos catalogados (suma de los totales por cámara en memoria)"""
+        return sum(self.camera_bytes.values())
+
+    def _camera_totals(self):
+        """Bytes por cámara según el catálogo (se mantienen en memoria para las cuotas de retención)"""
+        rows = self.connection.execute("SELECT camera, SUM(size_bytes) FROM events GROUP BY camera").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    @staticmethod
+    def camera_of(relative_path):
+        """Cámara de un video según su nombre (Mes07_14hr_05min03sec[_camara].mp4)"""
+        parts = os.path.splitext(os.path.basename(relative_path))[0].split("_", 3)
+        return parts[3] if len(parts) == 4 else Config.DEFAULT_CAMERA_ID
+
+    def add(self, relative_path, start_time, end_time, duration, size_bytes, categories, max_score, breach, camera_id=None):
+        """Registra (o reemplaza) un evento"""
+        day, hour = relative_path.split(os.sep)[:2]
+        categories = sorted(categories)
+        camera_id = camera_id or self.camera_of(relative_path)
+        with self.lock:
+            previous = self.connection.execute(
+                "SELECT camera, size_bytes FROM events WHERE path = ?", (relative_path,)
+            ).fetchone()
+            if previous:
+                self.camera_bytes[previous["camera"]] -= previous["size_bytes"]
+            self.camera_bytes[camera_id] = self.camera_bytes.get(camera_id, 0) + size_bytes
+            self.connection.execute(
+                "INSERT OR REPLACE INTO events "
+                "(path, day, hour, start_time, end_time, duration, size_bytes, categories, max_score, breach, camera) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (relative_path, day, hour, start_time, end_time, duration, size_bytes,
+                 ",".join(categories), max_score, int(breach), camera_id)
+            )
+            self.connection.execute("DELETE FROM event_categories WHERE path = ?", (relative_path,))
+            self.connection.executemany(
+                "INSERT INTO event_categories (category, path) VALUES (?, ?)",
+                [(category, relative_path) for category in categories]
+            )
+            self.connection.commit()
+
+    def oldest(self, limit, camera=None):
+        """Los eventos más antiguos por hora de captura (usa el índice de start_time, sin recorrer la tabla)"""
+        where, params = ("WHERE camera = ?", [camera]) if camera else ("", [])
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT path, camera, size_bytes FROM events {where} ORDER BY start_time ASC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, events):
+        """Elimina eventos del catálogo (dicts con path, camera y size_bytes como los de oldest())"""
+        paths = [(event["path"],) for event in events]
+        with self.lock:
+            self.connection.executemany("DELETE FROM event_categories WHERE path = ?", paths)
+            self.connection.executemany("DELETE FROM events WHERE path = ?", paths)
+            self.connection.commit()
+            for event in events:
+                self.camera_bytes[event["camera"]] -= event["size_bytes"]
+
+    def reconcile(self, events_folder):
+        """Sincroniza el catálogo con el disco: quita eventos borrados y agrega videos sin registrar
+
+        Retorna la cantidad de videos catalogados.
+        """
+        on_disk = {}
+        for dirpath, _, filenames in os.walk(events_folder):
+            for filename in filenames:
+                relative_path = os.path.relpath(os.path.join(dirpath, filename), events_folder)
+                if filename.endswith('.mp4') and len(relative_path.split(os.sep)) == 3:
+                    on_disk[relative_path] = os.path.join(dirpath, filename)
+        
+        with self.lock:
+            known = {row["path"] for row in self.connection.execute("SELECT path FROM events")}
+            missing = [(path,) for path in known - on_disk.keys()]
+            self.connection.executemany("DELETE FROM event_categories WHERE path = ?", missing)
+            self.connection.executemany("DELETE FROM events WHERE path = ?", missing)
+            self.connection.commit()
+            self.camera_bytes = self._camera_totals()
+        
+        # Videos sin metadatos (p. ej. catálogo borrado): se registran con lo que se sabe del archivo
+        for relative_path in on_disk.keys() - known:
+            stat = os.stat(on_disk[relative_path])
+            self.add(relative_path, stat.st_mtime, stat.st_mtime, None, stat.st_size, [], 0, True)
+        return len(on_disk)
+
+    def query(self, start=None, end=None, day=None, categories=None, limit=None, offset=0, descending=False,
+              camera=None):
+        """Retorna (eventos, total) que cumplen los filtros, ordenados por hora de inicio"""
+        conditions, params = [], []
+        if camera:
+            conditions.append("camera = ?")
+            params.append(camera)
+        if start is not None:
+            conditions.append("start_time >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("start_time < ?")
+            params.append(end)
+        if day:
+            conditions.append("day = ?")
+            params.append(day)
+        if categories:
+            conditions.append(
+                f"path IN (SELECT path FROM event_categories WHERE category IN ({', '.join('?' * len(categories))}))"
+            )
+            params.extend(categories)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if descending else "ASC"
+        
+        with self.lock:
+            total = self.connection.execute(f"SELECT COUNT(*) FROM events {where}", params).fetchone()[0]
+            rows = self.connection.execute(
+                f"SELECT * FROM events {where} ORDER BY start_time {order} LIMIT ? OFFSET ?",
+                params + [limit if limit is not None else -1, offset]
+            ).fetchall()
+        return [dict(row) for row in rows], total
 
 
 class StorageManager:
+    """Catálogo de eventos (con el espacio usado) y retención por video
+
+    La retención borra videos individuales en orden de hora de captura (índice start_time del catálogo):
+    al superar la marca alta de la capacidad (o de la cuota de una cámara) se eliminan los más antiguos
+    hasta bajar de la marca baja. No recorre directorios: el costo es proporcional a los videos borrados.
+    """
+
     def __init__(self):
         self.events_folder = Config.EVENTS_FOLDER
         self.storage_capacity = Config.STORAGE_CAPACITY_GB
+        self.catalog = EventCatalog()
+        self.retention_lock = threading.Lock()
+        
+        # Estadísticas
+        self.clips_evicted = 0
+        self.bytes_evicted = 0
+        self.last_eviction_time = 0
 
-    @staticmethod
-    def folder_size_gb(folder_path):
-        """Calcula el tamaño de una carpeta en GB"""
-        total_size_bytes = 0
-        for dirpath, _, filenames in os.walk(folder_path):
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                if os.path.exists(file_path):
-                    total_size_bytes += os.path.getsize(file_path)
-        return total_size_bytes / (1024 ** 3)
-    
-    @staticmethod
-    def delete_folder(folder_path):
-        """Elimina una carpeta y retorna el tamaño liberado"""
-        if not os.path.exists(folder_path):
-            return 0
-        folder_size = StorageManager.folder_size_gb(folder_path)
-        shutil.rmtree(folder_path)
-        logging.warning(f"STORAGE: '{folder_path}' deleted (-{folder_size:.4f} GB)")
-        return folder_size
+    def used_gb(self):
+        """Espacio usado por los eventos en GB, sin tocar el disco (O(1))"""
+        return self.catalog.total_bytes / (1024 ** 3)
+
+    def rescan(self, remove_partial=False):
+        """Sincroniza el catálogo de eventos con el disco
+
+        Con remove_partial (al iniciar, sin codificaciones en curso) borra los .part que dejó una
+        codificación interrumpida; en una resincronización en caliente se ignoran porque pueden estar escribiéndose.
+        """
+        if remove_partial:
+            for dirpath, _, filenames in os.walk(self.events_folder):
+                for filename in filenames:
+                    if filename.endswith(".part"):
+                        try:
+                            os.remove(os.path.join(dirpath, filename))
+                        except OSError as e:
+                            logging.warning(f"STORAGE: could not remove partial file {filename}: {e}")
+        files = self.catalog.reconcile(self.events_folder)
+        logging.info(f"STORAGE: catalog synchronized ({files} clips, {self.used_gb():.4f} GB)")
+        return files
+
+    def delete_clips(self, events):
+        """Borra videos del disco y del catálogo, y las carpetas de hora/día que queden vacías. Retorna los bytes liberados"""
+        folders = set()
+        for event in events:
+            full_path = os.path.join(self.events_folder, event["path"])
+            try:
+                os.remove(full_path)
+            except FileNotFoundError:
+                pass
+            folders.add(os.path.dirname(full_path))
+        
+        self.catalog.remove(events)
+        freed = sum(event["size_bytes"] for event in events)
+        
+        for folder in folders:
+            for empty_folder in (folder, os.path.dirname(folder)):
+                try:
+                    os.rmdir(empty_folder)
+                except OSError:
+                    break
+        return freed
+
+    def _evict(self, usage, high_bytes, low_bytes, camera=None):
+        """Borra los videos más antiguos (de una cámara o de todas) mientras usage() supere la marca baja"""
+        if usage() <= high_bytes:
+            return 0, 0
+        
+        evicted, freed = 0, 0
+        while usage() > low_bytes:
+            excess = usage() - low_bytes
+            batch = []
+            for event in self.catalog.oldest(Config.RETENTION_BATCH_SIZE, camera):
+                batch.append(event)
+                excess -= event["size_bytes"]
+                if excess <= 0:
+                    break
+            if not batch:
+                break
+            freed += self.delete_clips(batch)
+            evicted += len(batch)
+        return evicted, freed
 
     def supervise_folder_capacity(self):
-        """Supervisa y limpia el almacenamiento cuando excede la capacidad"""
-        if not os.path.exists(self.events_folder):
+        """Aplica la retención: cuotas por cámara y capacidad total con marcas alta y baja"""
+        if not self.retention_lock.acquire(blocking=False):
+            return  # otro worker ya está liberando espacio
+        try:
+            gb = 1024 ** 3
+            targets = [
+                (camera, lambda camera=camera: self.catalog.camera_bytes.get(camera, 0), quota_gb * gb)
+                for camera, quota_gb in Config.CAMERA_STORAGE_QUOTAS_GB.items()
+            ]
+            targets.append((None, lambda: self.catalog.total_bytes, self.storage_capacity * gb))
+            
+            for camera, usage, capacity in targets:
+                evicted, freed = self._evict(
+                    usage, capacity * Config.STORAGE_HIGH_WATERMARK, capacity * Config.STORAGE_LOW_WATERMARK, camera
+                )
+                if evicted:
+                    self.clips_evicted += evicted
+                    self.bytes_evicted += freed
+                    self.last_eviction_time = time.time()
+                    scope = f"camera '{camera}'" if camera else f"'{self.events_folder}'"
+                    logging.warning(f"STORAGE: {evicted} oldest clips deleted from {scope} (-{freed / gb:.4f} GB, "
+                                    f"now {self.used_gb():.4f} GB)")
+        finally:
+            self.retention_lock.release()
+
+    def get_stats(self):
+        """Retorna uso por cámara y estadísticas de la retención"""
+        return {
+            "camera_used_gb": {camera: round(size / (1024 ** 3), 3) for camera, size in self.catalog.camera_bytes.items()},
+            "clips_evicted": self.clips_evicted,
+            "evicted_gb": round(self.bytes_evicted / (1024 ** 3), 3),
+            "last_eviction_time": self.last_eviction_time
+        }
+
+
+class VideoFileSender:
+    """Sirve videos con rangos HTTP (206 y multipart/byteranges), validación condicional (ETag, If-Range)
+    y wsgi.file_wrapper para descargas completas, de modo que el servidor pueda usar sendfile"""
+
+    def __init__(self, chunk_size=Config.VIDEO_CHUNK_SIZE, max_ranges=Config.VIDEO_MAX_RANGES, mimetype='video/mp4'):
+        self.chunk_size = chunk_size
+        self.max_ranges = max_ranges
+        self.mimetype = mimetype
+
+    def prepare(self, path, req):
+        """Decide la respuesta (200, 206, 304 o 416) según los encabezados de la petición
+
+        Retorna (status, headers, mimetype, parts, trailer): parts es [(encabezado, inicio, fin)] con lo que hay
+        que leer del archivo, vacío si no hay cuerpo y None para el archivo completo. Es independiente del
+        servidor, así que lo usan tanto send() (WSGI) como el modo asyncio.
+        """
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f"{stat.st_mtime_ns:x}-{size:x}"
+        last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'ETag': quote_etag(etag),
+            'Last-Modified': http_date(last_modified),
+            'Cache-Control': 'public, max-age=3600'  # Cache 1 hora
+        }
+
+        if not is_resource_modified(req.environ, etag=etag, last_modified=last_modified):
+            return 304, headers, None, [], b''
+
+        ranges = self._satisfiable_ranges(req, etag, last_modified, size)
+        if ranges is None:
+            headers['Content-Length'] = str(size)
+            return 200, headers, self.mimetype, None, b''
+
+        if not ranges:
+            headers['Content-Range'] = f"bytes */{size}"
+            return 416, headers, None, [], b''
+
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+            headers['Content-Length'] = str(stop - start)
+            return 206, headers, self.mimetype, [(b'', start, stop)], b''
+
+        boundary = os.urandom(12).hex()
+        parts = [((f"\r\n--{boundary}\r\nContent-Type: {self.mimetype}\r\n"
+                  f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n").encode(), start, stop)
+                 for start, stop in ranges]
+        trailer = f"\r\n--{boundary}--\r\n".encode()
+        headers['Content-Length'] = str(sum(len(head) + stop - start for head, start, stop in parts) + len(trailer))
+        return 206, headers, f"multipart/byteranges; boundary={boundary}", parts, trailer
+
+    def send(self, path, req):
+        """Construye la respuesta WSGI para el archivo según los encabezados de la petición"""
+        status, headers, mimetype, parts, trailer = self.prepare(path, req)
+        if parts is None:
+            # Archivo completo: el servidor WSGI puede delegarlo a sendfile vía wsgi.file_wrapper
+            body = wrap_file(req.environ, open(path, 'rb'), self.chunk_size)
+            return Response(body, headers=headers, mimetype=mimetype, direct_passthrough=True)
+        if not parts:
+            return Response(status=status, headers=headers)
+        return Response(self._read_ranges(path, parts, trailer), status=status, headers=headers,
+                        mimetype=mimetype, direct_passthrough=True)
+
+    def _satisfiable_ranges(self, req, etag, last_modified, size):
+        """Rangos pedidos como [(inicio, fin_exclusivo)] en orden; None para servir el archivo completo
+
+        parse_range_header ya rechaza rangos desordenados o solapados (se sirve el archivo completo), así que
+        sólo se unen rangos contiguos y un rango final de sufijo (bytes=-N) que alcance al anterior.
+        """
+        requested = req.range
+        if requested is None or requested.units != 'bytes' or len(requested.ranges) > self.max_ranges:
+            return None
+
+        # If-Range: si el archivo cambió desde la copia parcial del cliente se envía completo
+        if_range = req.if_range
+        if if_range.etag is not None and if_range.etag != etag:
+            return None
+        if if_range.date is not None and last_modified > if_range.date:
+            return None
+
+        ranges = []
+        for start, stop in requested.ranges:
+            if start < 0:
+                start, stop = max(size + start, 0), size
+            else:
+                stop = size if stop is None else min(stop, size)
+            if start >= stop:
+                continue
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], stop))
+            else:
+                ranges.append((start, stop))
+        return ranges
+
+    def _read_ranges(self, path, parts, trailer):
+        """Generador que emite cada parte (encabezado + bytes) con lecturas grandes sobre un único descriptor"""
+        with open(path, 'rb') as f:
+            for head, start, stop in parts:
+                if head:
+                    yield head
+                f.seek(start)
+                remaining = stop - start
+                while remaining > 0:
+                    data = f.read(min(self.chunk_size, remaining))
+                    if not data:
+                        return
+                    remaining -= len(data)
+                    yield data
+        if trailer:
+            yield trailer
+
+    async def aread_ranges(self, path, parts, trailer):
+        """Versión asíncrona de _read_ranges: cada lectura va al pool de hilos compartido del event loop"""
+        f = await asyncio.to_thread(open, path, 'rb')
+        try:
+            for head, start, stop in parts:
+                if head:
+                    yield head
+                await asyncio.to_thread(f.seek, start)
+                remaining = stop - start
+                while remaining > 0:
+                    data = await asyncio.to_thread(f.read, min(self.chunk_size, remaining))
+                    if not data:
+                        return
+                    remaining -= len(data)
+                    yield data
+        finally:
+            f.close()
+        if trailer:
+            yield trailer
+
+
+class FrameBroadcaster:
+    """Codifica cada frame procesado una sola vez y reparte los mismos bytes JPEG a todos los espectadores
+
+    Los espectadores esperan en una Condition el siguiente JPEG (sin sondeo ni colas por cliente); uno
+    que va atrasado salta directamente al último frame codificado. En modo asyncio los espectadores son
+    corrutinas: el codificador despierta una vez por frame a cada event loop y éste a todas sus corrutinas.
+    """
+
+    BOUNDARY_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+    def __init__(self, quality=Config.STREAM_QUALITY):
+        self.quality = quality
+        self.running = True
+
+        # Último frame publicado por el procesador (pendiente de codificar)
+        self._condition = threading.Condition()
+        self._pending_frame = None
+        self._pending_sequence = 0
+
+        # Último JPEG codificado (número de frame, bytes) y espectadores esperándolo
+        self._frames = threading.Condition()
+        self._latest = (0, None)
+        self._async_events = {}  # event loop -> asyncio.Event del próximo frame
+        self.viewers = 0
+
+        # Estadísticas
+        self.sequence = 0
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self.last_encode_time = 0
+
+        self._encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._encoder_thread.start()
+
+    def publish(self, frame):
+        """Entrega un nuevo frame procesado al hilo codificador sin bloquear la ingesta"""
+        with self._condition:
+            self._pending_frame = frame
+            self._pending_sequence += 1
+            self._condition.notify()
+
+    def _encode_loop(self):
+        """Hilo único de codificación: un imencode por frame nuevo, sin importar los espectadores"""
+        encoded_sequence = 0
+        while self.running:
+            with self._condition:
+                while self.running and self._pending_sequence == encoded_sequence:
+                    self._condition.wait(timeout=1.0)
+                frame = self._pending_frame
+                encoded_sequence = self._pending_sequence
+
+            if frame is None:
+                continue
+
+            try:
+                encode_start = time.time()
+
+                # Añadir indicador de transmisión sobre una copia (el frame original se graba)
+                if int(time.time()) % 2:
+                    frame = frame.copy()
+                    cv2.circle(frame, (1238, 21), 12, (0, 255, 0), -1)  # Verde
+
+                success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not success:
+                    logging.error("Failed to encode stream frame")
+                    continue
+
+                # Bytes inmutables compartidos por todos los espectadores
+                chunk = self.BOUNDARY_HEADER + buffer.tobytes() + b'\r\n'
+                self.sequence = encoded_sequence
+                self.frames_encoded += 1
+                self.last_encode_time = time.time() - encode_start
+
+                with self._frames:
+                    self._latest = (self.frames_encoded, chunk)
+                    self._frames.notify_all()
+                    loops = list(self._async_events)
+                self._wake_loops(loops)
+
+            except Exception as e:
+                logging.error(f"Error in stream encoder: {e}", exc_info=True)
+
+    def stream(self):
+        """Generador MJPEG para un espectador: despierta con cada frame nuevo, sin sondear"""
+        with self._frames:
+            self.viewers += 1
+        try:
+            sent = 0
+            while True:
+                with self._frames:
+                    self._frames.wait_for(lambda: self._latest[0] != sent or not self.running)
+                    if not self.running:
+                        return
+                    latest, chunk = self._latest
+                    if sent and latest > sent + 1:
+                        self.frames_dropped += latest - sent - 1
+                sent = latest
+                yield chunk
+        finally:
+            with self._frames:
+                self.viewers -= 1
+
+    def _wake_loops(self, loops):
+        """Despierta (desde el hilo codificador) a los espectadores asíncronos de cada event loop"""
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_async, loop)
+            except RuntimeError:
+                # Event loop cerrado
+                with self._frames:
+                    self._async_events.pop(loop, None)
+
+    def _wake_async(self, loop):
+        """Corre dentro del event loop: libera a las corrutinas en espera y prepara el evento del próximo frame"""
+        with self._frames:
+            event = self._async_events.get(loop)
+            if event is None:
+                return
+            self._async_events[loop] = asyncio.Event()
+        event.set()
+
+    async def astream(self):
+        """Generador MJPEG asíncrono para un espectador: una corrutina en vez de un hilo por conexión"""
+        loop = asyncio.get_running_loop()
+        with self._frames:
+            self._async_events.setdefault(loop, asyncio.Event())
+            self.viewers += 1
+        try:
+            sent = 0
+            while self.running:
+                latest, chunk = self._latest
+                if latest == sent:
+                    # Sin await entre la verificación y la espera: _wake_async no puede colarse en medio
+                    await self._async_events[loop].wait()
+                    continue
+                if sent and latest > sent + 1:
+                    self.frames_dropped += latest - sent - 1
+                sent = latest
+                yield chunk
+        finally:
+            with self._frames:
+                self.viewers -= 1
+
+    def stop(self):
+        """Detiene el hilo codificador y libera a los espectadores en espera"""
+        self.running = False
+        with self._condition:
+            self._condition.notify_all()
+        with self._frames:
+            self._frames.notify_all()
+            loops = list(self._async_events)
+        self._wake_loops(loops)
+
+    def get_stats(self):
+        """Retorna estadísticas del stream"""
+        return {
+            "viewers": self.viewers,
+            "sequence": self.sequence,
+            "frames_encoded": self.frames_encoded,
+            "frames_dropped": self.frames_dropped,
+            "last_encode_ms": round(self.last_encode_time * 1000, 2)
+        }
+
+
+class FrameEnvelope:
+    """Sobre binario de ingesta: cabecera fija + id de cámara + arreglo de detecciones empaquetado + JPEG crudo
+
+    Cabecera (little-endian, 24 bytes): magic, versión, largo del id de cámara, ancho, alto, timestamp epoch,
+    fps, nº de detecciones. La versión 1 no tenía id de cámara (ese byte era relleno) y se asigna a DEFAULT_CAMERA_ID.
+    """
+
+    MAGIC = b'OSPF'
+    VERSION = 2
+    HEADER = struct.Struct('<4sBBHHdfH')
+    DETECTION_DTYPE = np.dtype([
+        ('x', '<i4'), ('y', '<i4'), ('width', '<i4'), ('height', '<i4'),
+        ('score', '<f4'), ('category', 'S16')
+    ])
+    CONTENT_TYPE = 'application/x-osp-frame'
+
+    @classmethod
+    def pack(cls, jpeg, detections, timestamp, fps, width=Config.FRAME_WIDTH, height=Config.FRAME_HEIGHT,
+             camera_id=Config.DEFAULT_CAMERA_ID):
+        """Empaqueta un frame (usado por la Raspberry Pi y los benchmarks)"""
+        camera = camera_id.encode()
+        records = np.zeros(len(detections), dtype=cls.DETECTION_DTYPE)
+        for i, detection in enumerate(detections):
+            bbox = detection['bbox']
+            records[i] = (bbox['x'], bbox['y'], bbox['width'], bbox['height'],
+                          detection.get('score', 0), detection['category'].encode())
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(camera), width, height, timestamp, fps, len(records))
+        return b''.join([header, camera, records.tobytes(), memoryview(jpeg)])
+
+    @classmethod
+    def unpack(cls, body):
+        """Interpreta el sobre sin copiar el JPEG (vistas sobre el buffer recibido)"""
+        view = memoryview(body)
+        if len(view) < cls.HEADER.size:
+            raise ValueError("Frame envelope too short")
+        
+        magic, version, camera_length, width, height, timestamp, fps, count = cls.HEADER.unpack_from(view, 0)
+        if magic != cls.MAGIC or version not in (1, cls.VERSION):
+            raise ValueError(f"Unsupported frame envelope: {magic!r} v{version}")
+        if version == 1:
+            camera_length = 0
+        
+        detections_start = cls.HEADER.size + camera_length
+        detections_end = detections_start + count * cls.DETECTION_DTYPE.itemsize
+        if len(view) <= detections_end:
+            raise ValueError("Frame envelope truncated")
+        camera_id = bytes(view[cls.HEADER.size:detections_start]).decode() or Config.DEFAULT_CAMERA_ID
+        
+        records = np.frombuffer(view, dtype=cls.DETECTION_DTYPE, count=count, offset=detections_start)
+        detections = [{
+            "bbox": {
+                "x": int(record['x']),
+                "y": int(record['y']),
+                "width": int(record['width']),
+                "height": int(record['height'])
+            },
+            "category": record['category'].decode(),
+            "score": float(record['score'])
+        } for record in records]
+        
+        return {
+            "camera_id": camera_id,
+            "timestamp": timestamp,
+            "fps": round(fps, 2),
+            "width": width,
+            "height": height,
+            "detections": detections,
+            "jpeg": np.frombuffer(view, dtype=np.uint8, offset=detections_end)
+        }
+
+
+class FrameStreamReceiver:
+    """Receptor de frames por conexión TCP persistente con acks de control de flujo
+
+    Cada mensaje de la Raspberry Pi es un entero de 4 bytes con la longitud seguido de un FrameEnvelope.
+    Por cada frame entregado a su cámara se responde un ack (secuencia, estado, frames en cola) que la
+    Pi usa como ventana de créditos: si la cámara se atrasa, las colas se llenan, la lectura se detiene
+    y la Pi deja de recibir acks.
+    """
+
+    LENGTH = struct.Struct('<I')
+    ACK = struct.Struct('<IBH')
+
+    def __init__(self, processor, port=Config.STREAM_INGEST_PORT):
+        self.processor = processor
+        self.port = port
+        self.running = True
+        self.server_socket = None
+
+        # Estadísticas
+        self.connections = 0
+        self.active_connections = 0
+        self.frames_received = 0
+        self.frames_failed = 0
+
+    def start(self):
+        """Inicia el hilo que acepta conexiones"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(('0.0.0.0', self.port))
+        self.server_socket.listen()
+
+        accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        accept_thread.start()
+        logging.info(f"Frame stream receiver listening on port {self.port}")
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                connection, address = self.server_socket.accept()
+            except OSError:
+                break
+
+            if not SecurityMiddleware.is_raspberry_allowed(address[0]):
+                logging.warning(f"Unauthorized Raspberry Pi stream attempt from: {address[0]}")
+                connection.close()
+                continue
+
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle_connection, args=(connection, address), daemon=True).start()
+
+    def _handle_connection(self, connection, address):
+        """Lee frames en un hilo y los procesa en otro, conectados por una cola acotada"""
+        self.connections += 1
+        self.active_connections += 1
+        logging.info(f"Frame stream connected from {address[0]}")
+
+        frames = queue.Queue(maxsize=Config.STREAM_INGEST_QUEUE_SIZE)
+        worker = threading.Thread(target=self._process_loop, args=(connection, frames), daemon=True)
+        worker.start()
+
+        try:
+            sequence = 0
+            while self.running:
+                header = self._recv_exact(connection, self.LENGTH.size)
+                if header is None:
+                    break
+                (length,) = self.LENGTH.unpack(header)
+                if length > Config.STREAM_INGEST_MAX_FRAME_BYTES:
+                    logging.error(f"Frame stream message too large ({length} bytes) - closing")
+                    break
+                body = self._recv_exact(connection, length)
+                if body is None:
+                    break
+                sequence += 1
+                # Bloquea si el procesamiento va atrasado: la presión se propaga por TCP hasta la Pi
+                frames.put((sequence, body))
+        except OSError as e:
+            logging.warning(f"Frame stream from {address[0]} failed: {e}")
+        finally:
+            frames.put(None)
+            worker.join()
+            connection.close()
+            self.active_connections -= 1
+            logging.info(f"Frame stream from {address[0]} closed")
+
+    def _process_loop(self, connection, frames):
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            sequence, body = item
+
+            # Bloquea si la cámara va atrasada, igual que la cola de la conexión
+            success = self.processor.process_binary_frame(body, block=True)
+            self.frames_received += 1
+            if not success:
+                self.frames_failed += 1
+
+            try:
+                connection.sendall(self.ACK.pack(sequence, 1 if success else 0, frames.qsize()))
+            except OSError:
+                # La conexión se cerró; seguir vaciando la cola hasta recibir el marcador de fin
+                pass
+
+    @staticmethod
+    def _recv_exact(connection, size):
+        """Lee exactamente size bytes en un buffer preasignado (None si la conexión se cierra)"""
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = connection.recv_into(view[received:])
+            if count == 0:
+                return None
+            received += count
+        return buffer
+
+    def stop(self):
+        self.running = False
+        if self.server_socket:
+            self.server_socket.close()
+
+    def get_stats(self):
+        return {
+            "port": self.port,
+            "connections": self.connections,
+            "active_connections": self.active_connections,
+            "frames_received": self.frames_received,
+            "frames_failed": self.frames_failed
+        }
+
+
+class PreRollBuffer:
+    """Buffer circular de los últimos frames JPEG recibidos, para incluir los segundos previos a un evento
+
+    Los JPEG se copian a ranuras de un único arreglo preasignado (capacidad x PRE_ROLL_SLOT_BYTES), por lo
+    que la memoria es constante y no hay listas que crezcan por frame.
+    """
+
+    def __init__(self, seconds=Config.PRE_ROLL_SECONDS, fps=Config.TARGET_FPS, slot_bytes=Config.PRE_ROLL_SLOT_BYTES):
+        self.capacity = int(seconds * fps)
+        self.slot_bytes = slot_bytes
+        self.data = np.zeros((self.capacity, slot_bytes), dtype=np.uint8)
+        self.lengths = np.zeros(self.capacity, dtype=np.int32)
+        self.metadata = [None] * self.capacity
+        self.next_slot = 0
+        self.count = 0
+        self.lock = threading.Lock()
+        
+        # Estadísticas
+        self.frames_oversized = 0
+
+    def push(self, jpeg, metadata):
+        """Copia un JPEG a la siguiente ranura, sobrescribiendo el más viejo"""
+        if not self.capacity:
+            return
+        jpeg = np.frombuffer(jpeg, dtype=np.uint8)
+        if jpeg.size > self.slot_bytes:
+            self.frames_oversized += 1
+            return
+        
+        with self.lock:
+            slot = self.next_slot
+            self.data[slot, :jpeg.size] = jpeg
+            self.lengths[slot] = jpeg.size
+            self.metadata[slot] = metadata
+            self.next_slot = (slot + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def drain(self):
+        """Retorna los frames guardados (del más viejo al más nuevo) como (bytes JPEG, metadata) y vacía el buffer"""
+        with self.lock:
+            first = (self.next_slot - self.count) % self.capacity if self.capacity else 0
+            frames = []
+            for i in range(self.count):
+                slot = (first + i) % self.capacity
+                frames.append((self.data[slot, :self.lengths[slot]].tobytes(), self.metadata[slot]))
+            self.count = 0
+            return frames
+
+    def get_stats(self):
+        return {
+            "capacity_frames": self.capacity,
+            "frames": self.count,
+            "memory_mb": round(self.data.nbytes / (1024 * 1024), 2),
+            "frames_oversized": self.frames_oversized
+        }
+
+
+class EncodingJob:
+    """Grabación de un evento: los frames esperan en una cola acotada hasta que un worker los codifica"""
+
+    def __init__(self, path, preroll=None, camera_id=Config.DEFAULT_CAMERA_ID, preroll_decoder=None):
+        self.path = path
+        self.temp_path = path + ".part"
+        self.camera_id = camera_id
+        self.preroll = preroll or []
+        self.preroll_decoder = preroll_decoder
+        self.preroll_frames = len(self.preroll)
+        
+        # Metadatos para el catálogo de eventos
+        self.start_time = None
+        self.end_time = None
+        self.categories = set()
+        self.max_score = 0
+        self.breach = False
+        for _, (detections, timestamp_str, _) in self.preroll:
+            self.note(detections, time.mktime(time.strptime(timestamp_str, "%B%d/%Y %H:%M:%S")), False)
+        self.frames = queue.Queue(maxsize=Config.ENCODER_FRAME_QUEUE_SIZE)
+        self.closed = threading.Event()
+        self.cancelled = False
+        self.status = "queued"
+        self.error = None
+        
+        # Estadísticas
+        self.frames_received = 0
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def put(self, frame):
+        """Entrega un frame sin bloquear la ingesta; si el codificador va atrasado se descarta"""
+        self.frames_received += 1
+        if self.status == "rejected":
+            self.frames_dropped += 1
+            return
+        try:
+            self.frames.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def note(self, detections, capture_time, breach):
+        """Acumula los metadatos de un frame de la grabación"""
+        if self.start_time is None:
+            self.start_time = capture_time
+        self.end_time = capture_time
+        self.breach = self.breach or breach
+        for detection in detections:
+            self.categories.add(detection['category'])
+            self.max_score = max(self.max_score, detection.get('score', 0))
+
+    def close(self):
+        """Marca el fin de la grabación: el worker termina al vaciar la cola"""
+        self.closed.set()
+
+    def cancel(self):
+        """Descarta la grabación"""
+        self.cancelled = True
+        self.closed.set()
+
+    def next_frame(self):
+        """Siguiente frame a codificar o None cuando la grabación terminó"""
+        while True:
+            try:
+                return self.frames.get(timeout=0.5)
+            except queue.Empty:
+                if self.closed.is_set():
+                    return None
+
+    def to_dict(self):
+        return {
+            "path": os.path.relpath(self.path, Config.EVENTS_FOLDER),
+            "camera_id": self.camera_id,
+            "status": self.status,
+            "preroll_frames": self.preroll_frames,
+            "frames_received": self.frames_received,
+            "frames_encoded": self.frames_encoded,
+            "frames_dropped": self.frames_dropped,
+            "queue_depth": self.frames.qsize(),
+            "wait_seconds": round((self.started_at or time.time()) - self.created_at, 2),
+            "encode_seconds": round((self.finished_at or time.time()) - self.started_at, 2) if self.started_at else 0,
+            "error": self.error
+        }
+
+
+class EncoderPool:
+    """Pool de workers que codifican las grabaciones a H.264 con ffmpeg fuera del hilo de ingesta
+
+    Cada worker alimenta un proceso ffmpeg por stdin. Si todos están ocupados las grabaciones esperan
+    en una cola acotada (ENCODER_MAX_PENDING_JOBS); si también está llena la grabación se rechaza.
+    """
+
+    def __init__(self, workers=Config.ENCODER_WORKERS, max_pending=Config.ENCODER_MAX_PENDING_JOBS,
+                 on_complete=None, preroll_decoder=None):
+        self.workers = workers
+        self.on_complete = on_complete
+        self.preroll_decoder = preroll_decoder
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.active = set()
+        self.recent = collections.deque(maxlen=Config.ENCODER_RECENT_JOBS)
+        self.lock = threading.Lock()
+        
+        # Estadísticas
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_rejected = 0
+        
+        for _ in range(workers):
+            threading.Thread(target=self._worker_loop, daemon=True).start()
+
+    def submit(self, path, preroll=None, camera_id=Config.DEFAULT_CAMERA_ID, preroll_decoder=None):
+        """Encola una nueva grabación. Siempre retorna el trabajo (con estado "rejected" si no hay cupo)"""
+        job = EncodingJob(path, preroll, camera_id, preroll_decoder or self.preroll_decoder)
+        try:
+            self.pending.put_nowait(job)
+        except queue.Full:
+            job.status = "rejected"
+            job.finished_at = time.time()
+            self.jobs_rejected += 1
+            logging.warning(f"Encoder pool saturated - recording rejected: {path}")
+            with self.lock:
+                self.recent.append(job)
+        return job
+
+    def _worker_loop(self):
+        while True:
+            job = self.pending.get()
+            with self.lock:
+                self.active.add(job)
+            try:
+                self._encode(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                logging.error(f"Error encoding {job.path}: {e}", exc_info=True)
+            finally:
+                job.finished_at = time.time()
+                with self.lock:
+                    self.active.discard(job)
+                    self.recent.append(job)
+                if job.status == "done":
+                    self.jobs_completed += 1
+                    if self.on_complete:
+                        self.on_complete(job)
+                elif job.status == "failed":
+                    self.jobs_failed += 1
+
+    def _encode(self, job):
+        """Codifica una grabación en una sola pasada: frames crudos por stdin a ffmpeg"""
+        if job.cancelled:
+            job.status = "cancelled"
+            return
+        
+        job.status = "encoding"
+        job.started_at = time.time()
+        os.makedirs(os.path.dirname(job.path), exist_ok=True)
+        process = subprocess.Popen([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{Config.FRAME_WIDTH}x{Config.FRAME_HEIGHT}', '-r', str(Config.TARGET_FPS),
+            '-i', '-',
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', '-pix_fmt', 'yuv420p',
+            '-f', 'mp4', job.temp_path
+        ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        
+        try:
+            # Primero los frames previos al evento (JPEG), decodificados aquí y no en la ingesta
+            for entry in job.preroll:
+                if job.cancelled:
+                    break
+                frame = job.preroll_decoder(entry) if job.preroll_decoder else None
+                if frame is not None:
+                    process.stdin.write(memoryview(np.ascontiguousarray(frame)))
+                    job.frames_encoded += 1
+            job.preroll = []  # liberar los JPEG ya codificados
+            
+            while not job.cancelled:
+                frame = job.next_frame()
+                if frame is None:
+                    break
+                # Sin copias: se pasa el buffer del arreglo
+                process.stdin.write(memoryview(np.ascontiguousarray(frame)))
+                job.frames_encoded += 1
+        except BrokenPipeError:
+            pass
+        
+        if job.cancelled:
+            process.kill()
+            process.wait()
+            if os.path.exists(job.temp_path):
+                os.remove(job.temp_path)
+            job.status = "cancelled"
+            return
+        
+        process.stdin.close()
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            job.status = "failed"
+            job.error = stderr.decode(errors="replace").strip()
+            logging.error(f"Error al codificar en H.264: {job.path}: {job.error}")
+            # Si falla, dejar el archivo parcial para depuración
+            return
+        
+        # El mp4 sólo aparece en /events cuando está completo
+        os.replace(job.temp_path, job.path)
+        job.status = "done"
+        logging.info(f"Video guardado en H.264: {job.path}")
+
+    def get_stats(self):
+        with self.lock:
+            active = [job.to_dict() for job in self.active]
+            recent = [job.to_dict() for job in self.recent]
+        return {
+            "workers": self.workers,
+            "queue_depth": self.pending.qsize(),
+            "active_jobs": active,
+            "recent_jobs": recent,
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "jobs_rejected": self.jobs_rejected
+        }
+
+
+class EventRecorder:
+    """Grabador incremental de eventos: reenvía cada frame al trabajo de codificación en segundo plano"""
+
+    def __init__(self, encoder_pool, camera_id=Config.DEFAULT_CAMERA_ID, preroll_decoder=None):
+        self.encoder_pool = encoder_pool
+        self.camera_id = camera_id
+        self.preroll_decoder = preroll_decoder
+        self.job = None
+        self.frames_written = 0
+
+    @property
+    def recording(self):
+        return self.job is not None
+
+    def start(self, path, preroll=None):
+        """Crea el trabajo de codificación para un nuevo evento, empezando por los frames previos"""
+        self.job = self.encoder_pool.submit(path, preroll, self.camera_id, self.preroll_decoder)
+        self.frames_written = 0
+
+    def write(self, frame, detections, capture_time, breach):
+        """Entrega un frame a la grabación actual sin esperar al codificador"""
+        self.job.put(frame)
+        self.job.note(detections, capture_time, breach)
+        self.frames_written += 1
+
+    def finish(self):
+        """Cierra la grabación; la codificación termina en segundo plano. Retorna el trabajo"""
+        if not self.recording:
+            return None
+        
+        job = self.job
+        output_seconds = int(self.frames_written / Config.TARGET_FPS)
+        self.job = None
+        self.frames_written = 0
+        
+        logging.warning(f"EVENT: {output_seconds} seconds {job.path}")
+        job.close()
+        return job
+
+    def discard(self):
+        """Descarta la grabación actual"""
+        if not self.recording:
             return
+        self.job.cancel()
+        self.job = None
+        self.frames_written = 0
+
+
+class SharedFrameSlots:
+    """Anillo de ranuras en memoria compartida de una cámara: el JPEG recibido y el frame anotado
+
+    El proceso principal copia el JPEG a la ranura (en vez de serializarlo) y el proceso del pool escribe
+    ahí mismo el frame decodificado y anotado; el proceso principal se queda con una copia, porque la
+    ranura se reutiliza a las PROCESSING_SHARED_SLOTS tareas.
+    """
+
+    def __init__(self, slots=Config.PROCESSING_SHARED_SLOTS, jpeg_bytes=Config.PROCESSING_JPEG_SLOT_BYTES,
+                 shape=(Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), name=None):
+        self.slots = slots
+        self.jpeg_bytes = jpeg_bytes
+        self.shape = tuple(shape)
+        size = slots * (jpeg_bytes + int(np.prod(shape)))
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self.jpegs = np.ndarray((slots, jpeg_bytes), dtype=np.uint8, buffer=self.memory.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf,
+                                 offset=slots * jpeg_bytes)
+        self.next_slot = 0
+        self.sequence = 0
+        self.shard = None
+        self.results = None
+
+    @property
+    def layout(self):
+        """Datos para que otro proceso se conecte a las mismas ranuras"""
+        return self.memory.name, self.slots, self.jpeg_bytes, self.shape
+
+    def close(self):
+        """Cierra el mapeo; sólo es seguro cuando ya no quedan vistas sobre las ranuras"""
+        self.jpegs = self.frames = None
+        self.memory.close()
+
+
+class FrameProcessPool:
+    """Pool de procesos que decodifican y anotan frames fuera del GIL del servidor
+
+    Cada cámara se asigna a un proceso (shard) al conectarse, de modo que sus frames siguen en orden;
+    las tareas y resultados viajan por colas propias del shard como tuplas pequeñas y los píxeles por
+    SharedFrameSlots. Si un proceso muere se reinicia con colas nuevas, sin afectar a los demás shards.
+    """
+
+    def __init__(self, workers=Config.PROCESSING_WORKERS):
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.cameras = {}
+        self.retired = []
+        self.lock = threading.Lock()
+        
+        # Estadísticas
+        self.frames_processed = [0] * workers
+        self.frames_failed = 0
+        self.frames_oversized = 0
+        self.frames_timed_out = 0
+        self.workers_restarted = 0
+        
+        self.tasks = [self.context.Queue() for _ in range(workers)]
+        self.results = [self.context.Queue() for _ in range(workers)]
+        self.processes = [self._spawn(shard) for shard in range(workers)]
+        atexit.register(self.stop)
+        logging.info(f"Frame process pool started with {workers} workers")
+
+    def _spawn(self, shard):
+        """Inicia el proceso de un shard y el hilo que reparte sus resultados"""
+        process = self.context.Process(target=FrameProcessPool._worker_main, args=(self.tasks[shard], self.results[shard]),
+                                       name=f"frame-worker-{shard}", daemon=True)
+        process.start()
+        threading.Thread(target=self._dispatch_loop, args=(shard, self.results[shard]), daemon=True).start()
+        return process
+
+    def _ensure_worker(self, shard):
+        """Reinicia el proceso de un shard si terminó; retorna True si estaba vivo"""
+        with self.lock:
+            process = self.processes[shard]
+            if process.is_alive():
+                return True
+            logging.error(f"Frame worker {shard} exited with code {process.exitcode} - restarting")
+            # Colas nuevas: el proceso pudo morir con el lock de alguna tomado, y sus tareas pendientes
+            # ya se resuelven en el hilo de la cámara
+            self.tasks[shard] = self.context.Queue()
+            self.results[shard] = self.context.Queue()
+            self.processes[shard] = self._spawn(shard)
+            self.workers_restarted += 1
+            return False
+
+    def attach(self, camera_id):
+        """Reserva las ranuras compartidas de una cámara y le asigna el shard con menos cámaras"""
+        slots = SharedFrameSlots()
+        slots.results = queue.Queue()
+        with self.lock:
+            load = [0] * self.workers
+            for other in self.cameras.values():
+                load[other.shard] += 1
+            slots.shard = load.index(min(load))
+            self.cameras[camera_id] = slots
+        return slots
+
+    def detach(self, camera_id):
+        """Libera el nombre de las ranuras compartidas de una cámara
+
+        El mapeo no se cierra: numpy no retiene el buffer, y el hilo de la cámara puede seguir
+        esperando un resultado sobre sus ranuras. La memoria se libera al terminar el proceso.
+        """
+        with self.lock:
+            slots = self.cameras.pop(camera_id, None)
+            if slots is not None:
+                self.retired.append(slots)
+        if slots is not None:
+            slots.memory.unlink()
+
+    def process(self, slots, jpeg, detections, timestamp_str, fps, safe_zone):
+        """Procesa un frame en el shard de la cámara y espera el resultado: (frame, invasión)
+
+        Retorna None si el JPEG no cabe en la ranura, o si el resultado no llega en PROCESSING_RESULT_TIMEOUT
+        segundos o el proceso del shard murió (se reinicia); en esos casos el llamador lo procesa en su hilo.
+        """
+        jpeg = np.frombuffer(jpeg, dtype=np.uint8)
+        if len(jpeg) > slots.jpeg_bytes:
+            self.frames_oversized += 1
+            return None
         
-        events_folder_size = StorageManager.folder_size_gb(self.events_folder)
-        logging.info(f"STORAGE: '{self.events_folder}' size: {events_folder_size:.4f} GB")
+        slot = slots.next_slot
+        slots.next_slot = (slot + 1) % slots.slots
+        slots.jpegs[slot, :len(jpeg)] = jpeg
+        slots.sequence += 1
+        self.tasks[slots.shard].put((id(slots), slots.sequence, slots.layout, slot, len(jpeg),
+                                     detections, timestamp_str, fps, safe_zone))
         
-        while events_folder_size > self.storage_capacity:
-            folders = [f for f in os.listdir(self.events_folder) 
-                      if os.path.isdir(os.path.join(self.events_folder, f))]
-            if not folders:
+        deadline = time.monotonic() + Config.PROCESSING_RESULT_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                sequence, ok, security_breach = slots.results.get(timeout=max(0, min(remaining, 0.5)))
+            except queue.Empty:
+                if not self._ensure_worker(slots.shard) or remaining <= 0:
+                    self.frames_timed_out += 1
+                    return None
+                continue
+            # Descarta resultados tardíos de tareas que ya se procesaron en el hilo de la cámara
+            if sequence == slots.sequence:
                 break
-            folder_to_delete = os.path.join(self.events_folder, min(folders))
-            events_folder_size -= StorageManager.delete_folder(folder_to_delete)
+        if not ok:
+            self.frames_failed += 1
+            return None, False
+        self.frames_processed[slots.shard] += 1
+        # Copia: el stream, el estado y la grabación retienen el frame más allá de la vida de la ranura
+        return slots.frames[slot].copy(), security_breach
 
+    def _dispatch_loop(self, shard, results):
+        """Entrega cada resultado de un shard al hilo de la cámara que lo espera (hasta que se reemplaza su cola)"""
+        waiting = {}
+        while self.results[shard] is results:
+            try:
+                key, sequence, ok, security_breach = results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            slots = waiting.get(key)
+            if slots is None:
+                with self.lock:
+                    waiting = {id(slots): slots for slots in self.cameras.values()}
+                slots = waiting.get(key)
+            if slots is not None:
+                slots.results.put((sequence, ok, security_breach))
 
-class SecurityProcessor:
-    def __init__(self):
-        Config.validate_config()
+    @staticmethod
+    def _worker_main(tasks, results):
+        """Proceso del pool: decodifica el JPEG de la ranura y deja el frame anotado en la misma ranura"""
+        attached = {}
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            key, sequence, layout, slot, length, detections, timestamp_str, fps, safe_zone = task
+            try:
+                name, count, jpeg_bytes, shape = layout
+                slots = attached.get(name)
+                if slots is None:
+                    slots = attached[name] = SharedFrameSlots(count, jpeg_bytes, shape, name=name)
+                
+                decoded = cv2.imdecode(slots.jpegs[slot, :length], cv2.IMREAD_COLOR)
+                if decoded is None:
+                    results.put((key, sequence, False, False))
+                    continue
+                frame = slots.frames[slot]
+                if decoded.shape == frame.shape:
+                    np.copyto(frame, decoded)
+                else:
+                    cv2.resize(decoded, (shape[1], shape[0]), dst=frame)
+                
+                security_breach = CameraPipeline.annotate_frame(frame, detections, timestamp_str, fps, *safe_zone)
+                results.put((key, sequence, True, security_breach))
+            except Exception as e:
+                logging.error(f"Error in frame worker: {e}", exc_info=True)
+                results.put((key, sequence, False, False))
         
-        self.storage_manager = StorageManager()
+        for slots in attached.values():
+            slots.close()
+
+    def stop(self):
+        """Detiene los procesos y libera la memoria compartida"""
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+        for camera_id in list(self.cameras):
+            self.detach(camera_id)
+
+    def get_stats(self):
+        with self.lock:
+            shards = [[camera_id for camera_id, slots in self.cameras.items() if slots.shard == shard]
+                      for shard in range(self.workers)]
+        return {
+            "workers": self.workers,
+            "alive_workers": sum(process.is_alive() for process in self.processes),
+            "shards": [{"cameras": cameras, "frames_processed": processed}
+                       for cameras, processed in zip(shards, self.frames_processed)],
+            "frames_failed": self.frames_failed,
+            "frames_oversized": self.frames_oversized,
+            "frames_timed_out": self.frames_timed_out,
+            "workers_restarted": self.workers_restarted
+        }
+
+
+class CameraPipeline:
+    """Estado y procesamiento de una cámara: su propio hilo de trabajo, stream, buffer previo, grabación
+    y zona segura. Cada cámara procesa sus frames en orden sin bloquear a las demás."""
+
+    def __init__(self, camera_id, encoder_pool, queue_size=Config.CAMERA_QUEUE_SIZE, frame_pool=None):
+        self.camera_id = camera_id
+        self.safe_zone_start, self.safe_zone_end = Config.get_safe_zone(camera_id)
+        self.broadcaster = FrameBroadcaster()
+        
+        # Modo multiproceso: decodificación y anotación en un proceso del pool, frames en memoria compartida
+        self.frame_pool = frame_pool
+        self.shared_slots = frame_pool.attach(camera_id) if frame_pool else None
         
         # Estado de grabación
         self.last_detection_timestamp = None
-        self.frame_buffer = []
-        self.output = {}
-        self.events = 0
+        self.preroll = PreRollBuffer()
+        self.recorder = EventRecorder(encoder_pool, camera_id, self._decode_preroll_frame)
         self.current_processed_frame = None
         
+        # Frames pendientes de procesar (decodificación, dibujo y lógica de seguridad en el hilo de la cámara)
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.running = True
+        self.worker = threading.Thread(target=self._worker_loop, name=f"camera-{camera_id}", daemon=True)
+        self.worker.start()
+        
         # Estadísticas
         self.frames_received = 0
-        self.start_time = time.time()
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.frames_failed = 0
         self.last_frame_time = 0
+        self.last_process_time = 0
+        self.processing_fps = 0
+        self._window_start = time.time()
+        self._window_frames = 0
         
-        # Inicializar carpeta de eventos
-        os.makedirs(Config.EVENTS_FOLDER, exist_ok=True)
-        self.storage_manager.supervise_folder_capacity()
-        
-        logging.info("Security Processor initialized")
-        logging.info(f"Safe zone: {Config.SAFE_ZONE_START} to {Config.SAFE_ZONE_END}")
-        logging.info(f"Storage capacity: {Config.STORAGE_CAPACITY_GB} GB")
-        logging.info(f"Events folder: {Config.EVENTS_FOLDER}")
-        logging.info(f"Allowed IPs: {Config.ALLOWED_RASPBERRY_IPS}")
+        logging.info(f"Camera '{camera_id}' pipeline started (safe zone {self.safe_zone_start} to {self.safe_zone_end})")
+
+    def submit(self, frame_data, block=False):
+        """Encola (jpeg, detecciones, timestamp, fps) para el hilo de la cámara
+
+        Sin bloqueo (HTTP) se descarta el frame más viejo si la cola está llena; con bloqueo (conexión
+        persistente) se espera, de modo que la presión llega hasta la Pi por TCP.
+        """
+        self.frames_received += 1
+        self.last_frame_time = time.time()
+        if block:
+            self.frames.put(frame_data)
+            return True
+        while True:
+            try:
+                self.frames.put_nowait(frame_data)
+                return True
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _worker_loop(self):
+        while self.running:
+            frame_data = self.frames.get()
+            if frame_data is None:
+                break
+            jpeg, detections, timestamp_str, fps = frame_data
+            start = time.perf_counter()
+            result = None
+            if self.shared_slots is not None:
+                result = self.frame_pool.process(self.shared_slots, jpeg, detections, timestamp_str, fps,
+                                                 (self.safe_zone_start, self.safe_zone_end))
+            if result is None:
+                result = self._decode_and_annotate(jpeg, detections, timestamp_str, fps)
+            frame, security_breach = result
+            if self._process_frame(frame, jpeg, detections, timestamp_str, fps, security_breach):
+                self.frames_processed += 1
+            else:
+                self.frames_failed += 1
+            self.last_process_time = time.perf_counter() - start
+            
+            # Throughput por ventanas de un segundo
+            self._window_frames += 1
+            elapsed = time.time() - self._window_start
+            if elapsed >= 1.0:
+                self.processing_fps = round(self._window_frames / elapsed, 2)
+                self._window_start = time.time()
+                self._window_frames = 0
 
-    def _safe_zone_invasion(self, rect_start, rect_end):
+    @staticmethod
+    def _safe_zone_invasion(rect_start, rect_end, safe_zone_start, safe_zone_end):
         """Detecta si un rectángulo invade la zona segura"""
-        if Config.SAFE_ZONE_START[0] > rect_end[0] or Config.SAFE_ZONE_END[0] < rect_start[0]:
+        if safe_zone_start[0] > rect_end[0] or safe_zone_end[0] < rect_start[0]:
             return False
-        if Config.SAFE_ZONE_START[1] > rect_end[1] or Config.SAFE_ZONE_END[1] < rect_start[1]:
+        if safe_zone_start[1] > rect_end[1] or safe_zone_end[1] < rect_start[1]:
             return False
         return True
 
-    def process_frame_data(self, frame_data):
-        """Procesa los datos del frame recibidos de la Raspberry Pi"""
+    def _decode_and_annotate(self, jpeg, detections, timestamp_str, fps):
+        """Decodifica y anota el frame en el hilo de la cámara. Retorna (frame, invasión)"""
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None, False
+        return frame, self.annotate_frame(frame, detections, timestamp_str, fps, self.safe_zone_start, self.safe_zone_end)
+
+    def _process_frame(self, frame, jpeg, detections, timestamp_str, fps, security_breach):
+        """Publica el frame ya anotado y aplica la lógica de seguridad"""
         try:
-            # Actualizar estadísticas
-            self.frames_received += 1
-            self.last_frame_time = time.time()
-            
-            # Decodificar frame
-            frame_bytes = base64.b64decode(frame_data['frame'])
-            frame_array = np.frombuffer(frame_bytes, np.uint8)
-            frame = cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
-            
             if frame is None:
-                logging.error("Failed to decode frame")
+                logging.error(f"Failed to decode frame from camera '{self.camera_id}'")
                 return False
             
-            # Obtener datos
-            detections = frame_data['detections']
-            timestamp_str = frame_data['timestamp']
-            fps = frame_data.get('fps', Config.TARGET_FPS)
-            detections_count = frame_data.get('detections_count', len(detections))
-            
-            # Procesar detecciones y dibujar en el frame
-            security_breach = False
-            color = (0, 0, 255)  # Rojo
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_size = 1
-            font_thickness = 2
-            
-            for detection in detections:
-                bbox = detection['bbox']
-                category = detection['category']
-                score = detection.get('score', 0)
-                
-                rect_start = (int(bbox['x']), int(bbox['y']))
-                rect_end = (int(bbox['x'] + bbox['width']), int(bbox['y'] + bbox['height']))
-                text_position = (7 + int(bbox['x']), 21 + int(bbox['y']))
-                
-                # Dibujar rectángulo y texto con score
-                label = f"{category} ({score:.2f})"
-                cv2.putText(frame, label, text_position, font, font_size, color, font_thickness)
-                cv2.rectangle(frame, rect_start, rect_end, color, font_thickness)
-                
-                # Verificar invasión de zona segura
-                if self._safe_zone_invasion(rect_start, rect_end):
-                    security_breach = True
-                    # Marcar invasión con color diferente
-                    cv2.putText(frame, label, text_position, font, font_size, (0, 255, 0), font_thickness)
-                    cv2.rectangle(frame, rect_start, rect_end, (0, 255, 0), font_thickness)
-            
-            # Dibujar timestamp
-            cv2.putText(frame, timestamp_str, (21, 42), font, font_size, color, font_thickness)
-            
-            # Dibujar zona segura
-            zone_color = (0, 255, 255)  # Amarillo
-            if security_breach:
-                zone_color = (0, 0, 255)  # Rojo si hay invasión
-            cv2.rectangle(frame, Config.SAFE_ZONE_START, Config.SAFE_ZONE_END, zone_color, font_thickness)
-            
-            # Dibujar FPS
-            cv2.putText(frame, f"FPS: {fps}", (Config.FRAME_WIDTH - 180, Config.FRAME_HEIGHT - 18), 
-                       font, font_size, color, font_thickness)
-            
-            # Dibujar contador de detecciones
-            # cv2.putText(frame, f"Detections: {detections_count}", (Config.FRAME_WIDTH - 250, 42), 
-            #           font, font_size, color, font_thickness)
-            
             # Guardar frame procesado
             self.current_processed_frame = frame
+            self.broadcaster.publish(frame)
             
             # Lógica de seguridad y grabación
             time_localtime = time.strptime(timestamp_str, "%B%d/%Y %H:%M:%S")
-            self._handle_security_logic(security_breach, time_localtime, frame)
+            self._handle_security_logic(security_breach, time_localtime, frame, detections)
+            
+            # Guardar el JPEG recibido (sin anotar) para los segundos previos del próximo evento;
+            # durante una grabación no, para que el clip siguiente no repita el final del anterior
+            if not self.recorder.recording:
+                self.preroll.push(jpeg, (detections, timestamp_str, fps))
             
             return True
             
@@ -265,141 +1648,444 @@ class SecurityProcessor:
             logging.error(f"Error processing frame data: {e}", exc_info=True)
             return False
 
-    def _handle_security_logic(self, security_breach, time_localtime, frame):
+    @staticmethod
+    def annotate_frame(frame, detections, timestamp_str, fps, safe_zone_start, safe_zone_end):
+        """Dibuja detecciones, zona segura, timestamp y FPS. Retorna True si hay invasión de la zona segura
+
+        Es estático para poder ejecutarse también en los procesos de FrameProcessPool.
+        """
+        detections_count = len(detections)
+        
+        # Procesar detecciones y dibujar en el frame
+        security_breach = False
+        color = (0, 0, 255)  # Rojo
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_size = 1
+        font_thickness = 2
+        
+        for detection in detections:
+            bbox = detection['bbox']
+            category = detection['category']
+            score = detection.get('score', 0)
+            
+            rect_start = (int(bbox['x']), int(bbox['y']))
+            rect_end = (int(bbox['x'] + bbox['width']), int(bbox['y'] + bbox['height']))
+            text_position = (7 + int(bbox['x']), 21 + int(bbox['y']))
+            
+            # Dibujar rectángulo y texto con score
+            label = f"{category} ({score:.2f})"
+            cv2.putText(frame, label, text_position, font, font_size, color, font_thickness)
+            cv2.rectangle(frame, rect_start, rect_end, color, font_thickness)
+            
+            # Verificar invasión de zona segura
+            if CameraPipeline._safe_zone_invasion(rect_start, rect_end, safe_zone_start, safe_zone_end):
+                security_breach = True
+                # Marcar invasión con color diferente
+                cv2.putText(frame, label, text_position, font, font_size, (0, 255, 0), font_thickness)
+                cv2.rectangle(frame, rect_start, rect_end, (0, 255, 0), font_thickness)
+        
+        # Dibujar timestamp
+        cv2.putText(frame, timestamp_str, (21, 42), font, font_size, color, font_thickness)
+        
+        # Dibujar zona segura
+        zone_color = (0, 255, 255)  # Amarillo
+        if security_breach:
+            zone_color = (0, 0, 255)  # Rojo si hay invasión
+        cv2.rectangle(frame, tuple(safe_zone_start), tuple(safe_zone_end), zone_color, font_thickness)
+        
+        # Dibujar FPS
+        cv2.putText(frame, f"FPS: {fps}", (Config.FRAME_WIDTH - 180, Config.FRAME_HEIGHT - 18), 
+                   font, font_size, color, font_thickness)
+        
+        # Dibujar contador de detecciones
+        # cv2.putText(frame, f"Detections: {detections_count}", (Config.FRAME_WIDTH - 250, 42), 
+        #           font, font_size, color, font_thickness)
+        
+        return security_breach
+
+    def _decode_preroll_frame(self, entry):
+        """Decodifica y anota un frame del buffer previo (se ejecuta en el worker de codificación)"""
+        jpeg, (detections, timestamp_str, fps) = entry
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+        if frame.shape[1] != Config.FRAME_WIDTH or frame.shape[0] != Config.FRAME_HEIGHT:
+            frame = cv2.resize(frame, (Config.FRAME_WIDTH, Config.FRAME_HEIGHT))
+        self.annotate_frame(frame, detections, timestamp_str, fps, self.safe_zone_start, self.safe_zone_end)
+        return frame
+
+    def _handle_security_logic(self, security_breach, time_localtime, frame, detections):
         """Maneja la lógica de seguridad y grabación de eventos"""
         if security_breach:
-            if not self.frame_buffer:
-                self.output["file_name"] = time.strftime("%B%d_%Hhr_%Mmin%Ssec", time_localtime)
-                self.output["day"], self.output["hours"], self.output["mins"] = self.output["file_name"].split("_")
-                self.output["path"] = os.path.join(Config.EVENTS_FOLDER, self.output["day"], 
-                                                 self.output["hours"], f"{self.output['file_name']}.mp4")
-                logging.info(f"Security breach detected - starting recording: {self.output['file_name']}")
+            if not self.recorder.recording:
+                file_name = time.strftime("%B%d_%Hhr_%Mmin%Ssec", time_localtime)
+                day, hours, _ = file_name.split("_")
+                if self.camera_id != Config.DEFAULT_CAMERA_ID:
+                    file_name = f"{file_name}_{self.camera_id}"
+                path = os.path.join(Config.EVENTS_FOLDER, day, hours, f"{file_name}.mp4")
+                self.recorder.start(path, self.preroll.drain())
+                logging.info(f"Security breach detected - starting recording: {file_name}")
                 
             self.last_detection_timestamp = time.time()
-            self.frame_buffer.append(frame)
+            self.recorder.write(frame, detections, time.mktime(time_localtime), security_breach)
         else:
             if self.last_detection_timestamp and ((time.time() - self.last_detection_timestamp) >= Config.MAX_DETECTION_DELAY):
-                if len(self.frame_buffer) >= Config.TARGET_FPS * Config.MIN_VIDEO_DURATION:
-                    self.save_frame_buffer(self.output["path"])
+                if self.recorder.frames_written >= Config.TARGET_FPS * Config.MIN_VIDEO_DURATION:
+                    self.finish_recording()
                 else:
-                    logging.info(f"Recording too short ({len(self.frame_buffer)} frames) - discarding")
+                    logging.info(f"Recording too short ({self.recorder.frames_written} frames) - discarding")
+                    self.recorder.discard()
                 
                 self.last_detection_timestamp = None
-                self.frame_buffer = []
-                self.output = {}
-            elif len(self.frame_buffer) >= Config.TARGET_FPS * Config.MAX_VIDEO_DURATION:
+            elif self.recorder.frames_written >= Config.TARGET_FPS * Config.MAX_VIDEO_DURATION:
                 logging.info(f"Max recording duration reached - saving video")
-                self.save_frame_buffer(self.output["path"])
+                self.finish_recording()
 
-    def save_frame_buffer(self, path):
-        """Guarda el buffer de frames como video H.264 usando ffmpeg directamente"""
-        if not self.frame_buffer:
+    def finish_recording(self):
+        """Cierra la grabación en curso; se codifica a H.264 en segundo plano"""
+        if not self.recorder.recording:
             return
         
-        output_seconds = int(len(self.frame_buffer) / Config.TARGET_FPS)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.recorder.finish()
+
+    def get_current_frame(self):
+        """Retorna el frame procesado actual"""
+        return self.current_processed_frame
+
+    def stop(self):
+        """Detiene el hilo de la cámara y el codificador del stream"""
+        self.running = False
+        try:
+            self.frames.put_nowait(None)
+        except queue.Full:
+            pass
+        self.worker.join(timeout=2)
+        self.broadcaster.stop()
+        if self.frame_pool:
+            self.frame_pool.detach(self.camera_id)
 
-        # Guardar frames temporales en un archivo .avi sin compresión
-        temp_path = path + ".tmp.avi"
-        fourcc = cv2.VideoWriter_fourcc(*"MJPG")
-        out = cv2.VideoWriter(temp_path, fourcc, Config.TARGET_FPS, (Config.FRAME_WIDTH, Config.FRAME_HEIGHT))
+    def get_stats(self):
+        return {
+            "safe_zone": [list(self.safe_zone_start), list(self.safe_zone_end)],
+            "frames_received": self.frames_received,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "frames_failed": self.frames_failed,
+            "processing_fps": self.processing_fps,
+            "processing_shard": self.shared_slots.shard if self.shared_slots is not None else None,
+            "last_process_ms": round(self.last_process_time * 1000, 2),
+            "queue_depth": self.frames.qsize(),
+            "last_frame_time": self.last_frame_time,
+            "recording": self.recorder.recording,
+            "current_buffer_size": self.recorder.frames_written,
+            "preroll": self.preroll.get_stats(),
+            "stream": self.broadcaster.get_stats()
+        }
+
+
+class SecurityProcessor:
+    """Recibe los frames de todas las cámaras y los reparte a su CameraPipeline; comparte el almacenamiento,
+    el catálogo de eventos y el pool de codificación"""
+
+    CAMERA_ID_PATTERN = re.compile(r'^[A-Za-z0-9-]{1,32}$')
+
+    def __init__(self):
+        Config.validate_config()
+        
+        self.storage_manager = StorageManager()
+        self.encoder_pool = EncoderPool(on_complete=self._on_clip_saved)
+        self.frame_pool = FrameProcessPool() if Config.PROCESSING_MODE == "processes" else None
+        self.cameras = {}
+        self.cameras_lock = threading.Lock()
+        self.events = 0
+        
+        # Estadísticas
+        self.frames_rejected = 0
+        self.start_time = time.time()
+        
+        # Inicializar carpeta de eventos
+        os.makedirs(Config.EVENTS_FOLDER, exist_ok=True)
+        self.storage_manager.rescan(remove_partial=True)
+        self.storage_manager.supervise_folder_capacity()
+        
+        # La cámara por defecto existe siempre (Raspberry Pi sin camera_id y /stream)
+        self.get_camera(Config.DEFAULT_CAMERA_ID, create=True)
+        
+        logging.info("Security Processor initialized")
+        logging.info(f"Storage capacity: {Config.STORAGE_CAPACITY_GB} GB")
+        logging.info(f"Events folder: {Config.EVENTS_FOLDER}")
+        logging.info(f"Allowed IPs: {Config.ALLOWED_RASPBERRY_IPS}")
 
-        logging.warning(f"EVENT: {output_seconds} seconds {path}")
+    def get_camera(self, camera_id, create=False):
+        """Pipeline de una cámara (None si no existe); con create=True se crea al recibir su primer frame"""
+        camera = self.cameras.get(camera_id)
+        if camera is not None or not create:
+            return camera
+        
+        if not self.CAMERA_ID_PATTERN.match(camera_id):
+            raise ValueError(f"Invalid camera id: {camera_id!r}")
+        with self.cameras_lock:
+            camera = self.cameras.get(camera_id)
+            if camera is None:
+                if len(self.cameras) >= Config.MAX_CAMERAS:
+                    raise ValueError(f"Camera limit reached ({Config.MAX_CAMERAS}) - rejecting '{camera_id}'")
+                camera = CameraPipeline(camera_id, self.encoder_pool, frame_pool=self.frame_pool)
+                self.cameras[camera_id] = camera
+        return camera
 
-        for frame in self.frame_buffer:
-            out.write(frame)
-        out.release()
+    def process_frame_data(self, frame_data, block=False):
+        """Encola los datos del frame recibidos de la Raspberry Pi (JSON con JPEG en base64)"""
+        try:
+            camera = self.get_camera(frame_data.get('camera_id') or Config.DEFAULT_CAMERA_ID, create=True)
+            return camera.submit((
+                base64.b64decode(frame_data['frame']),
+                frame_data['detections'],
+                frame_data['timestamp'],
+                frame_data.get('fps', Config.TARGET_FPS)
+            ), block)
+            
+        except Exception as e:
+            self.frames_rejected += 1
+            logging.error(f"Error processing frame data: {e}", exc_info=True)
+            return False
 
-        # Convertir a H.264 usando ffmpeg directamente
+    def process_binary_frame(self, body, block=False):
+        """Encola un frame recibido en el sobre binario (cabecera + detecciones + JPEG) en su cámara"""
         try:
-            result = subprocess.run([
-                'ffmpeg', '-y', '-i', temp_path,
-                '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
-                path
-            ], check=True, capture_output=True)
-            logging.info(f"Video guardado en H.264: {path}")
-            os.remove(temp_path)
+            envelope = FrameEnvelope.unpack(body)
+            camera = self.get_camera(envelope["camera_id"], create=True)
+            timestamp_str = time.strftime("%B%d/%Y %H:%M:%S", time.localtime(envelope["timestamp"]))
+            
+            return camera.submit((envelope["jpeg"], envelope["detections"], timestamp_str, envelope["fps"]), block)
+            
         except Exception as e:
-            logging.error(f'Error al convertir a H.264: {e}')
-            if hasattr(e, 'stderr'):
-                logging.error(e.stderr.decode())
-            # Si falla, dejar el archivo temporal para depuración
+            self.frames_rejected += 1
+            logging.error(f"Error processing binary frame: {e}", exc_info=True)
+            return False
+
+    def _on_clip_saved(self, job):
+        """Llamado desde un worker del pool de codificación cuando un video queda guardado"""
+        self.storage_manager.catalog.add(
+            os.path.relpath(job.path, Config.EVENTS_FOLDER),
+            job.start_time,
+            job.end_time + 1.0 / Config.TARGET_FPS,
+            round(job.frames_encoded / Config.TARGET_FPS, 2),
+            os.path.getsize(job.path),
+            job.categories,
+            round(job.max_score, 3),
+            job.breach,
+            job.camera_id
+        )
         self.events += 1
-        self.frame_buffer = []
         
-        if self.events % Config.EVENT_CHECK_INTERVAL == 0:
-            storage_thread = threading.Thread(target=self.storage_manager.supervise_folder_capacity)
-            storage_thread.daemon = True
-            storage_thread.start()
+        # Por debajo de la marca alta la verificación es O(1): se hace con cada video
+        self.storage_manager.supervise_folder_capacity()
 
-    def get_events_json(self):
-        """Retorna la lista de eventos en formato JSON"""
-        if not os.path.exists(Config.EVENTS_FOLDER):
-            return {"events": [], "message": "No events folder found"}
-        
-        events = []
-        
+    def get_events_json(self, start=None, end=None, day=None, categories=None, page=None, page_size=None,
+                        descending=False, camera=None):
+        """Retorna los eventos del catálogo agrupados por día y hora (filtros y paginación opcionales)
+
+        Sin page ni page_size se retornan todos los eventos, como antes de existir la paginación.
+        """
         try:
-            for day in sorted(os.listdir(Config.EVENTS_FOLDER)):
-                day_path = os.path.join(Config.EVENTS_FOLDER, day)
-                if not os.path.isdir(day_path):
-                    continue
-                    
-                day_info = {"date": day, "hours": []}
-                
-                for hour in sorted(os.listdir(day_path)):
-                    hour_path = os.path.join(day_path, hour)
-                    if not os.path.isdir(hour_path):
-                        continue
-                        
-                    hour_info = {"time": hour, "videos": []}
-                    
-                    for video in sorted(os.listdir(hour_path)):
-                        if video.endswith('.mp4'):
-                            video_name = "".join(video.split("_")[1:]).replace(".mp4", "")
-                            video_path = os.path.join(day, hour, video)
-                            file_size = os.path.getsize(os.path.join(hour_path, video))
-                            
-                            hour_info["videos"].append({
-                                "name": video_name,
-                                "path": video_path,
-                                "filename": video,
-                                "size_mb": round(file_size / (1024 * 1024), 2)
-                            })
-                    
-                    if hour_info["videos"]:
-                        day_info["hours"].append(hour_info)
+            paged = page is not None or page_size is not None
+            if paged:
+                page_size = min(page_size or Config.EVENTS_PAGE_SIZE, Config.EVENTS_MAX_PAGE_SIZE)
+                page = max(page or 1, 1)
+            else:
+                page = 1
+            rows, total = self.storage_manager.catalog.query(
+                start=start, end=end, day=day, categories=categories,
+                limit=page_size, offset=(page - 1) * (page_size or 0), descending=descending, camera=camera
+            )
+            
+            events = []
+            for row in rows:
+                if not events or events[-1]["date"] != row["day"]:
+                    events.append({"date": row["day"], "hours": []})
+                hours = events[-1]["hours"]
+                if not hours or hours[-1]["time"] != row["hour"]:
+                    hours.append({"time": row["hour"], "videos": []})
                 
-                if day_info["hours"]:
-                    events.append(day_info)
+                filename = os.path.basename(row["path"])
+                hours[-1]["videos"].append({
+                    "name": "".join(filename.split("_")[1:3]).replace(".mp4", ""),
+                    "camera_id": row["camera"],
+                    "path": row["path"].replace(os.sep, "/"),
+                    "filename": filename,
+                    "size_mb": round(row["size_bytes"] / (1024 * 1024), 2),
+                    "start_time": row["start_time"],
+                    "end_time": row["end_time"],
+                    "duration": row["duration"],
+                    "categories": row["categories"].split(",") if row["categories"] else [],
+                    "max_score": row["max_score"],
+                    "breach": bool(row["breach"])
+                })
             
             return {
                 "events": events,
-                "total_events": sum(len(hour["videos"]) for day in events for hour in day["hours"]),
-                "storage_used_gb": round(self.storage_manager.folder_size_gb(Config.EVENTS_FOLDER), 3)
+                "total_events": total,
+                "page": page,
+                "page_size": page_size if paged else total,
+                "has_more": paged and page * page_size < total,
+                "storage_used_gb": round(self.storage_manager.used_gb(), 3)
             }
             
         except Exception as e:
             logging.error(f"Error getting events: {e}", exc_info=True)
             return {"events": [], "error": str(e)}
 
-    def get_current_frame(self):
-        """Retorna el frame procesado actual"""
-        return self.current_processed_frame
-
     def get_stats(self):
-        """Retorna estadísticas del procesador"""
+        """Retorna estadísticas del procesador (globales y por cámara)"""
         uptime = time.time() - self.start_time
+        cameras = {camera_id: camera.get_stats() for camera_id, camera in list(self.cameras.items())}
         return {
-            "frames_received": self.frames_received,
+            "frames_received": sum(camera["frames_received"] for camera in cameras.values()),
+            "frames_rejected": self.frames_rejected,
             "events_count": self.events,
             "uptime_seconds": round(uptime, 2),
-            "storage_used_gb": round(self.storage_manager.folder_size_gb(Config.EVENTS_FOLDER), 3),
+            "storage_used_gb": round(self.storage_manager.used_gb(), 3),
             "storage_capacity_gb": Config.STORAGE_CAPACITY_GB,
-            "last_frame_time": self.last_frame_time,
-            "current_buffer_size": len(self.frame_buffer) if self.frame_buffer else 0
+            "storage": self.storage_manager.get_stats(),
+            "last_frame_time": max((camera["last_frame_time"] for camera in cameras.values()), default=0),
+            "encoder": self.encoder_pool.get_stats(),
+            "processing_mode": Config.PROCESSING_MODE,
+            "processing_pool": self.frame_pool.get_stats() if self.frame_pool else None,
+            "cameras": cameras
+        }
+
+    def get_service_info(self):
+        """Información general del servicio (endpoint /)"""
+        return {
+            "status": "running",
+            "service": "processing-server",
+            "events_folder": Config.EVENTS_FOLDER,
+            "config": {
+                "safe_zone": f"{Config.SAFE_ZONE_START} to {Config.SAFE_ZONE_END}",
+                "cameras": sorted(self.cameras),
+                "storage_capacity_gb": Config.STORAGE_CAPACITY_GB,
+                "target_fps": Config.TARGET_FPS,
+                "frame_resolution": f"{Config.FRAME_WIDTH}x{Config.FRAME_HEIGHT}",
+                "allowed_ips": Config.ALLOWED_RASPBERRY_IPS
+            }
+        }
+
+    def get_status(self, stream_receiver):
+        """Estado completo del servidor (endpoint /status)"""
+        return {
+            "status": "running",
+            "has_current_frame": any(camera.current_processed_frame is not None
+                                     for camera in list(self.cameras.values())),
+            "stream_ingest": stream_receiver.get_stats(),
+            "allowlists": SecurityMiddleware.get_stats(),
+            "serving_mode": Config.SERVING_MODE,
+            **self.get_stats()
+        }
+
+
+def create_async_app(processor, video_sender, stream_receiver):
+    """App ASGI (uvicorn) con los endpoints de clientes para SERVING_MODE = "asyncio"
+
+    Cada espectador de /stream y cada descarga de /video es una corrutina en vez de un hilo; las lecturas
+    de disco y las consultas al catálogo van al pool de hilos compartido del event loop. La ingesta no
+    pasa por aquí: sigue en el puerto 8081 (werkzeug) y en la conexión persistente de 8082.
+    """
+    from fastapi import Depends, FastAPI, HTTPException, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response as ASGIResponse, StreamingResponse
+    from werkzeug.wrappers import Request as WSGIRequest
+
+    async def client_allowed(request: Request):
+        # async: una dependencia síncrona ocuparía un hilo del pool de FastAPI por petición
+        if not SecurityMiddleware.is_client_allowed(request.client.host):
+            logging.warning(f"Unauthorized client access attempt from: {request.client.host}")
+            raise HTTPException(status_code=403)
+
+    def int_arg(args, name):
+        # Igual que request.args.get(name, type=int) en Flask: None si falta o no es un entero
+        try:
+            return int(args[name])
+        except (KeyError, ValueError):
+            return None
+
+    app = FastAPI(title="processing-server", docs_url=None, redoc_url=None, openapi_url=None)
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    protected = [Depends(client_allowed)]
+
+    @app.get("/")
+    async def index():
+        return processor.get_service_info()
+
+    @app.get("/stream", dependencies=protected)
+    @app.get("/stream/{camera_id}", dependencies=protected)
+    async def stream(camera_id: str = Config.DEFAULT_CAMERA_ID):
+        """Stream de video procesado de una cámara (una corrutina por espectador)"""
+        camera = processor.get_camera(camera_id)
+        if camera is None:
+            return JSONResponse({"error": "Camera not found"}, status_code=404)
+        return StreamingResponse(camera.broadcaster.astream(), media_type='multipart/x-mixed-replace; boundary=frame')
+
+    @app.get("/events", dependencies=protected)
+    async def events(request: Request):
+        """Mismos filtros que la versión WSGI; la consulta al catálogo corre fuera del event loop"""
+        args = request.query_params
+        try:
+            start = args.get("start")
+            end = args.get("end")
+            categories = [category for value in args.getlist("category")
+                          for category in value.split(",") if category]
+            result = await asyncio.to_thread(
+                processor.get_events_json,
+                start=datetime.fromisoformat(start).timestamp() if start else None,
+                end=datetime.fromisoformat(end).timestamp() if end else None,
+                day=args.get("day"),
+                categories=categories,
+                page=int_arg(args, "page"),
+                page_size=int_arg(args, "page_size"),
+                descending=args.get("order", "asc") == "desc",
+                camera=args.get("camera")
+            )
+        except ValueError as e:
+            return JSONResponse({"error": f"Invalid filter: {e}"}, status_code=400)
+        return JSONResponse(result)
+
+    @app.api_route("/video/{video_path:path}", methods=["GET", "HEAD"], dependencies=protected)
+    async def get_video(video_path: str, request: Request):
+        """Videos con Range, If-Range y ETag (misma lógica que VideoFileSender.send) leídos en bloques asíncronos"""
+        full_path = safe_join(Config.EVENTS_FOLDER, video_path)
+        if not full_path or not await asyncio.to_thread(os.path.isfile, full_path):
+            return JSONResponse({"error": "Video not found"}, status_code=404)
+        
+        # VideoFileSender interpreta los encabezados condicionales y de rango sobre un environ WSGI
+        environ = {"REQUEST_METHOD": request.method, "QUERY_STRING": "", "wsgi.url_scheme": request.url.scheme}
+        environ.update((f"HTTP_{name.upper().replace('-', '_')}", value) for name, value in request.headers.items())
+        status, headers, mimetype, parts, trailer = await asyncio.to_thread(
+            video_sender.prepare, full_path, WSGIRequest(environ)
+        )
+        if parts is None:
+            parts = [(b'', 0, int(headers['Content-Length']))]
+        if not parts:
+            return ASGIResponse(status_code=status, headers=headers)
+        return StreamingResponse(video_sender.aread_ranges(full_path, parts, trailer), status_code=status,
+                                 headers=headers, media_type=mimetype)
+
+    @app.post("/storage/rescan", dependencies=protected)
+    async def storage_rescan():
+        """Resincroniza el catálogo de eventos (y el espacio usado) con la carpeta de eventos"""
+        files = await asyncio.to_thread(processor.storage_manager.rescan)
+        return {
+            "status": "rescanned",
+            "files": files,
+            "storage_used_gb": round(processor.storage_manager.used_gb(), 3)
         }
 
+    @app.get("/status", dependencies=protected)
+    async def status():
+        """Status del servidor de procesamiento"""
+        return JSONResponse(processor.get_status(stream_receiver))
+
+    return app
+
 
 if __name__ == "__main__":
     # Configurar logging
@@ -414,7 +2100,9 @@ if __name__ == "__main__":
 
     try:
         # Inicializar procesador de seguridad
+        SecurityMiddleware.warm_up("ALLOWED_RASPBERRY_IPS", "ALLOWED_CLIENT_IPS")
         processor = SecurityProcessor()
+        video_sender = VideoFileSender()
 
         # Inicializar Flask
         app = Flask(__name__)
@@ -425,10 +2113,10 @@ if __name__ == "__main__":
             client_ip = request.remote_addr
             
             # Endpoints que solo puede acceder la Raspberry Pi
-            raspberry_endpoints = ['process_frame']
+            raspberry_endpoints = ['process_frame', 'process_frame_binary']
             
             # Endpoints que solo pueden acceder clientes autorizados
-            client_endpoints = ['stream', 'events', 'get_video', 'status']
+            client_endpoints = ['stream', 'events', 'get_video', 'status', 'storage_rescan']
             
             if request.endpoint in raspberry_endpoints:
                 if not SecurityMiddleware.is_raspberry_allowed(client_ip):
@@ -442,18 +2130,7 @@ if __name__ == "__main__":
 
         @app.route("/")
         def index():
-            return jsonify({
-                "status": "running",
-                "service": "processing-server",
-                "events_folder": Config.EVENTS_FOLDER,
-                "config": {
-                    "safe_zone": f"{Config.SAFE_ZONE_START} to {Config.SAFE_ZONE_END}",
-                    "storage_capacity_gb": Config.STORAGE_CAPACITY_GB,
-                    "target_fps": Config.TARGET_FPS,
-                    "frame_resolution": f"{Config.FRAME_WIDTH}x{Config.FRAME_HEIGHT}",
-                    "allowed_ips": Config.ALLOWED_RASPBERRY_IPS
-                }
-            })
+            return jsonify(processor.get_service_info())
 
         @app.route("/process_frame", methods=["POST"])
         def process_frame():
@@ -466,7 +2143,7 @@ if __name__ == "__main__":
                 success = processor.process_frame_data(frame_data)
                 
                 if success:
-                    return jsonify({"status": "processed"})
+                    return jsonify({"status": "queued"})
                 else:
                     return jsonify({"error": "Failed to process frame"}), 500
                     
@@ -474,65 +2151,88 @@ if __name__ == "__main__":
                 logging.error(f"Error in process_frame endpoint: {e}", exc_info=True)
                 return jsonify({"error": str(e)}), 500
 
-        @app.route("/stream")
-        def stream():
-            """Stream de video procesado"""
-            def generate():
-                while True:
-                    frame = processor.get_current_frame()
-                    if frame is not None:
-                        # Añadir indicador de transmisión
-                        current_time = int(time.time())
-                        if current_time % 2:
-                            cv2.circle(frame, (1238, 21), 12, (0, 255, 0), -1)  # Verde
-                        
-                        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY])
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        @app.route("/process_frame_binary", methods=["POST"])
+        def process_frame_binary():
+            """Endpoint de ingesta binaria (sin base64 ni JSON) para la Raspberry Pi (IP protegida)"""
+            try:
+                body = request.get_data(cache=False)
+                if not body:
+                    return jsonify({"error": "No data provided"}), 400
+                
+                success = processor.process_binary_frame(body)
+                
+                if success:
+                    return jsonify({"status": "queued"})
+                else:
+                    return jsonify({"error": "Failed to process frame"}), 500
                     
-                    time.sleep(1.0 / Config.STREAM_FPS)
-            
-            return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+            except Exception as e:
+                logging.error(f"Error in process_frame_binary endpoint: {e}", exc_info=True)
+                return jsonify({"error": str(e)}), 500
+
+        @app.route("/stream")
+        @app.route("/stream/<camera_id>")
+        def stream(camera_id=Config.DEFAULT_CAMERA_ID):
+            """Stream de video procesado de una cámara (codificado una sola vez para todos los espectadores)"""
+            camera = processor.get_camera(camera_id)
+            if camera is None:
+                return jsonify({"error": "Camera not found"}), 404
+            return Response(camera.broadcaster.stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
         @app.route("/events")
         def events():
-            """Endpoint para obtener la lista de eventos en JSON"""
-            return jsonify(processor.get_events_json())
+            """Endpoint para obtener la lista de eventos en JSON
+
+            Parámetros opcionales: start / end (fecha u hora ISO 8601, end exclusivo), day (carpeta, p. ej. June07),
+            category (repetible o separado por comas), camera, page, page_size, order (asc | desc).
+            """
+            try:
+                start = request.args.get("start")
+                end = request.args.get("end")
+                categories = [category for value in request.args.getlist("category")
+                              for category in value.split(",") if category]
+                return jsonify(processor.get_events_json(
+                    start=datetime.fromisoformat(start).timestamp() if start else None,
+                    end=datetime.fromisoformat(end).timestamp() if end else None,
+                    day=request.args.get("day"),
+                    categories=categories,
+                    page=request.args.get("page", type=int),
+                    page_size=request.args.get("page_size", type=int),
+                    descending=request.args.get("order", "asc") == "desc",
+                    camera=request.args.get("camera")
+                ))
+            except ValueError as e:
+                return jsonify({"error": f"Invalid filter: {e}"}), 400
 
         @app.route("/video/<path:video_path>")
         def get_video(video_path):
-            """Endpoint para servir videos"""
-            full_path = os.path.join(Config.EVENTS_FOLDER, video_path)
-            if os.path.exists(full_path):
-                file_size = os.path.getsize(full_path)
-
-                def generate():
-                    with open(full_path, 'rb') as f:
-                        data = f.read(1024)
-                        while data:
-                            yield data
-                            data = f.read(1024)
-                
-                response = Response(generate(), mimetype='video/mp4')
-                response.headers['Content-Length'] = str(file_size)
-                response.headers['Accept-Ranges'] = 'bytes'
-                response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache 1 hora
-        
-                return response
+            """Endpoint para servir videos (soporta Range, If-Range y validación por ETag)"""
+            full_path = safe_join(Config.EVENTS_FOLDER, video_path)
+            if full_path and os.path.isfile(full_path):
+                return video_sender.send(full_path, request)
             else:
                 return jsonify({"error": "Video not found"}), 404
 
+        @app.route("/storage/rescan", methods=["POST"])
+        def storage_rescan():
+            """Resincroniza el catálogo de eventos (y el espacio usado) con la carpeta de eventos"""
+            files = processor.storage_manager.rescan()
+            return jsonify({
+                "status": "rescanned",
+                "files": files,
+                "storage_used_gb": round(processor.storage_manager.used_gb(), 3)
+            })
+
         @app.route("/status")
         def status():
             """Status del servidor de procesamiento"""
-            stats = processor.get_stats()
-            return jsonify({
-                "status": "running",
-                "has_current_frame": processor.current_processed_frame is not None,
-                **stats
-            })
+            return jsonify(processor.get_status(stream_receiver))
+
+        # Receptor de frames por conexión persistente
+        stream_receiver = FrameStreamReceiver(processor)
+        stream_receiver.start()
 
-        logging.info("Starting processing server on ports 8080 (web) and 8081 (raspberry)")
+        logging.info(f"Starting processing server on ports 8080 (web), 8081 (raspberry) and {Config.STREAM_INGEST_PORT} (raspberry stream)")
         logging.info(f"Safe zone configured: {Config.SAFE_ZONE_START} to {Config.SAFE_ZONE_END}")
         logging.info(f"Detection categories: {Config.DETECTION_CATEGORY_ALLOWLIST}")
         logging.info(f"Authorized IPs: {Config.ALLOWED_RASPBERRY_IPS}")
@@ -540,15 +2240,27 @@ if __name__ == "__main__":
         # Iniciar servidor en puerto 8081 para recibir datos de raspberry
         from werkzeug.serving import make_server
         
-        # Servidor principal en puerto 8080
-        server = make_server('0.0.0.0', 8080, app, threaded=True)
-        server_thread = threading.Thread(target=server.serve_forever)
-        server_thread.daemon = True
-        server_thread.start()
-        
-        # Servidor para raspberry en puerto 8081
-        server_8081 = make_server('0.0.0.0', 8081, app, threaded=True)
-        server_8081.serve_forever()
+        if Config.SERVING_MODE == "asyncio":
+            import uvicorn
+            
+            # Ingesta de la raspberry en 8081 (werkzeug) en su propio hilo
+            server_8081 = make_server('0.0.0.0', 8081, app, threaded=True)
+            threading.Thread(target=server_8081.serve_forever, daemon=True).start()
+            
+            # Clientes en 8080: un event loop con una corrutina por espectador o descarga
+            logging.info("Serving client endpoints on port 8080 with uvicorn (asyncio)")
+            uvicorn.run(create_async_app(processor, video_sender, stream_receiver),
+                        host='0.0.0.0', port=8080, log_level="warning")
+        else:
+            # Servidor principal en puerto 8080
+            server = make_server('0.0.0.0', 8080, app, threaded=True)
+            server_thread = threading.Thread(target=server.serve_forever)
+            server_thread.daemon = True
+            server_thread.start()
+            
+            # Servidor para raspberry en puerto 8081
+            server_8081 = make_server('0.0.0.0', 8081, app, threaded=True)
+            server_8081.serve_forever()
 
     except Exception as e:
         logging.error(f"Error starting processing server: {e}", exc_info=True)
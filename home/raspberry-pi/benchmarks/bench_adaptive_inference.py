@@ -0,0 +1,89 @@
+"""
+Benchmark de la cadencia adaptativa y del filtro de movimiento de ObjectDetector sobre el video de prueba.
+
+Ejecuta el detector inferiendo en todos los frames, con la cadencia adaptativa (sin filtro) y con el
+filtro de movimiento, y compara CPU usada, frames filtrados, costo del filtro por frame y recall de
+eventos (tramos de frames con alguna detección dentro de la zona segura).
+
+Uso (desde raspberry-pi/, con el modelo descargado): python benchmarks/bench_adaptive_inference.py [video]
+"""
+import os
+import sys
+import time
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_rp import Config
+from pi_detector import ObjectDetector
+
+
+def read_frames(video_path):
+    cap = cv2.VideoCapture(video_path)
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+    cap.release()
+
+
+def breach(detections):
+    """Misma regla que el servidor de procesamiento: alguna detección toca la zona segura"""
+    for detection in detections:
+        box = detection["bbox"]
+        if Config.SAFE_ZONE_START[0] > box["x"] + box["width"] or Config.SAFE_ZONE_END[0] < box["x"]:
+            continue
+        if Config.SAFE_ZONE_START[1] > box["y"] + box["height"] or Config.SAFE_ZONE_END[1] < box["y"]:
+            continue
+        return True
+    return False
+
+
+def events(breach_frames, max_gap):
+    """Agrupa frames con invasión en eventos (tramos separados por más de max_gap frames)"""
+    grouped = []
+    for index in breach_frames:
+        if grouped and index - grouped[-1][1] <= max_gap:
+            grouped[-1][1] = index
+        else:
+            grouped.append([index, index])
+    return grouped
+
+
+def run(video_path, idle_interval, motion_gate_enabled):
+    detector = ObjectDetector(idle_interval=idle_interval, motion_gate_enabled=motion_gate_enabled)
+    breach_frames = []
+    cpu = 0.0
+    for index, frame in enumerate(read_frames(video_path)):
+        start = time.process_time()
+        detections = detector.detections(frame)
+        cpu += time.process_time() - start
+        if breach(detections):
+            breach_frames.append(index)
+    return cpu, breach_frames, detector.get_stats()
+
+
+if __name__ == "__main__":
+    video_path = sys.argv[1] if len(sys.argv) > 1 else Config.FALLBACK_VIDEO
+    max_gap = Config.TARGET_FPS
+
+    full_cpu, full_frames, full_stats = run(video_path, 1, False)
+    full_events = events(full_frames, max_gap)
+    print(f"frames: {full_stats['frames_seen']}")
+    print(f"full:     CPU {full_cpu:.2f} s, inferred {full_stats['frames_inferred']}")
+
+    modes = {
+        "adaptive": (Config.INFERENCE_IDLE_INTERVAL, False),
+        "gated": (Config.INFERENCE_IDLE_INTERVAL, True),
+    }
+    for name, (idle_interval, motion_gate_enabled) in modes.items():
+        cpu, frames, stats = run(video_path, idle_interval, motion_gate_enabled)
+        frame_set = set(frames)
+        recalled = sum(1 for start, end in full_events if any(i in frame_set for i in range(start, end + 1)))
+        frame_recall = len(frame_set & set(full_frames)) / len(full_frames) if full_frames else 1.0
+
+        print(f"{name}: CPU {cpu:.2f} s ({(1 - cpu / full_cpu) * 100 if full_cpu else 0:.1f} % saved), "
+              f"inferred {stats['frames_inferred']}, skipped ratio {stats['skipped_ratio']}, "
+              f"gated ratio {stats['gated_ratio']}, gate cost {stats['motion_gate']['avg_gate_ms']} ms/frame")
+        print(f"{' ' * len(name)}  event recall {recalled}/{len(full_events)}, breach-frame recall {frame_recall * 100:.1f} %")
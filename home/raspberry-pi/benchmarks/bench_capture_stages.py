@@ -0,0 +1,111 @@
+"""
+Microbenchmark por etapa del camino captura -> entrada del modelo -> envío.
+
+Compara el camino anterior (redimensionar cada captura a FRAME_WIDTH x FRAME_HEIGHT, convertir a RGB
+el frame completo y dejar que TFLite lo reduzca a su entrada) contra el actual (captura en resolución
+nativa, una sola reducción bilineal a MODEL_INPUT_SIZE y conversión a RGB en buffers preasignados,
+y redimensionado del envío sólo si la captura difiere). Reporta ms y KB asignados por frame y etapa.
+
+Uso: python benchmarks/bench_capture_stages.py [iteraciones]
+"""
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_rp import Config
+
+NATIVE_SIZES = [(1280, 720), (1920, 1080)]
+
+
+def synthetic_frame(width, height):
+    """Frame con ruido suavizado para que la reducción y el JPEG tengan un costo realista"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(frame, (9, 9), 0)
+
+
+def measure(stage, iterations):
+    """Retorna (ms por llamada, KB asignados por llamada) de una etapa"""
+    stage()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        stage()
+    elapsed = (time.perf_counter() - start) / iterations
+
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024
+
+
+def legacy_stages(frame):
+    """Etapas del camino anterior; cada una asigna su salida"""
+    size = (Config.FRAME_WIDTH, Config.FRAME_HEIGHT)
+    resized = frame if frame.shape[1::-1] == size else cv2.resize(frame, size)
+    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    return {
+        "captura a 1280x720": lambda: frame if frame.shape[1::-1] == size else cv2.resize(frame, size),
+        "BGR->RGB completo": lambda: cv2.cvtColor(resized, cv2.COLOR_BGR2RGB),
+        "reducción interna del modelo": lambda: cv2.resize(rgb, Config.MODEL_INPUT_SIZE),
+        "JPEG de envío": lambda: cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY]),
+    }
+
+
+def current_stages(frame):
+    """Etapas del camino actual (mismas operaciones que ObjectDetector.model_input y _upload_frame)"""
+    width, height = Config.MODEL_INPUT_SIZE
+    model_bgr = np.empty((height, width, 3), dtype=np.uint8)
+    model_rgb = np.empty((height, width, 3), dtype=np.uint8)
+    upload_buffer = np.empty((Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), dtype=np.uint8)
+    size = (Config.FRAME_WIDTH, Config.FRAME_HEIGHT)
+
+    def upload_frame():
+        if frame.shape[1::-1] == size:
+            return frame
+        cv2.resize(frame, size, dst=upload_buffer, interpolation=cv2.INTER_LINEAR)
+        return upload_buffer
+
+    sent = upload_frame()
+
+    return {
+        "reducción a la entrada": lambda: cv2.resize(frame, (width, height), dst=model_bgr, interpolation=cv2.INTER_LINEAR),
+        "BGR->RGB reducido": lambda: cv2.cvtColor(model_bgr, cv2.COLOR_BGR2RGB, dst=model_rgb),
+        "redimensionado de envío": upload_frame,
+        "JPEG de envío": lambda: cv2.imencode('.jpg', sent, [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY]),
+    }
+
+
+def report(name, stages, iterations):
+    """Imprime cada etapa y retorna el total en ms"""
+    total_ms = 0
+    for stage_name, stage in stages.items():
+        ms, kb = measure(stage, iterations)
+        total_ms += ms
+        print(f"  {name:<9}{stage_name:<32}{ms:>10.3f}{kb:>12.0f}")
+    return total_ms
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cv2.setNumThreads(1)
+    print(f"Entrada del modelo {Config.MODEL_INPUT_SIZE[0]}x{Config.MODEL_INPUT_SIZE[1]}, "
+          f"envío {Config.FRAME_WIDTH}x{Config.FRAME_HEIGHT}, {iterations} iteraciones por etapa")
+
+    for width, height in NATIVE_SIZES:
+        frame = synthetic_frame(width, height)
+        print(f"\nCaptura nativa {width}x{height}")
+        print(f"  {'camino':<9}{'etapa':<32}{'ms/frame':>10}{'KB asign.':>12}")
+        legacy_ms = report("anterior", legacy_stages(frame), iterations)
+        current_ms = report("actual", current_stages(frame), iterations)
+        print(f"  total: anterior {legacy_ms:.2f} ms, actual {current_ms:.2f} ms "
+              f"({(1 - current_ms / legacy_ms) * 100:.1f} % menos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,32 @@ class Config:
     
     # ================= CONFIGURACIÓN MANUAL (Usuario) =================
     
+    # Identificador de esta cámara en el servidor de procesamiento (letras, números y guiones)
+    CAMERA_ID = os.getenv("CAMERA_ID", "cam0")
+    
     # Detección de objetos
     DETECTION_SCORE_THRESHOLD = 0.5
     DETECTION_MAX_RESULTS = 3
     DETECTION_CATEGORY_ALLOWLIST = ["person", "bicycle"]
+    
+    # Cadencia adaptativa de inferencia (sólo aplica con el filtro de movimiento desactivado)
+    INFERENCE_IDLE_INTERVAL = 6  # con la escena quieta, inferir 1 de cada N frames (1 = siempre)
+    
+    # Filtro de movimiento previo a la inferencia
+    MOTION_GATE_ENABLED = True  # sin movimiento no se ejecuta la inferencia (se reutilizan las últimas detecciones)
+    MOTION_GATE_SIZE = (160, 90)  # resolución reducida en escala de grises para el análisis
+    MOTION_GATE_PIXEL_THRESHOLD = 25  # diferencia con el fondo (0-255) para marcar un pixel como cambiado
+    MOTION_GATE_CELL_SIZE = 10  # lado en px (resolución reducida) de cada región analizada
+    MOTION_GATE_REGION_THRESHOLD = 0.05  # fracción de pixeles cambiados en una región para considerar movimiento
+    MOTION_GATE_BACKGROUND_RATE = 0.05  # velocidad de adaptación del fondo (0-1)
+    MOTION_GATE_ROI = None  # None = todo el frame, o lista de (x1, y1, x2, y2) en px, p. ej. [(0, 0, 580, 720)]
+    
+    # Zona segura (x1, y1, x2, y2) - debe coincidir con la de esta cámara en el servidor de procesamiento
+    SAFE_ZONE_START = (0, 0)
+    SAFE_ZONE_END = (480, 720)
+    SAFE_ZONE_MARGIN = 100  # px alrededor de la zona segura en los que una detección mantiene la inferencia continua
 
-    # Seguridad de red - Solo acepta conexiones del servidor de procesamiento
+    # Seguridad de red (IPs, redes CIDR o hostnames) - Solo acepta conexiones del servidor de procesamiento
     ALLOWED_PROCESSING_SERVER_IPS = ["172.20.0.12"]  # Solo IP del contenedor processing
     ALLOWED_ADMIN_IPS = [
         "127.0.0.1",
@@ -19,6 +39,8 @@ class Config:
         "192.168.65.254",  # IP del gateway Docker Desktop
         "host.docker.internal"
     ]
+    ALLOWLIST_DNS_TTL = 300  # segundos que se confía en la IP resuelta de un hostname antes de re-resolverlo
+    ALLOWLIST_DNS_NEGATIVE_TTL = 30  # segundos antes de reintentar un hostname que no resolvió
     
     # ================= CONFIGURACIÓN AUTOMÁTICA (Sistema) =================
     
@@ -26,9 +48,12 @@ class Config:
     FRAME_WIDTH = 1280
     FRAME_HEIGHT = 720
     TARGET_FPS = 24  # REDUCIDO para evitar saturación del processing server
+    PACING_POLICY = os.getenv("PACING_POLICY", "skip")  # con atraso: "skip" descarta los ticks perdidos, "catch_up" los recupera sin esperar
+    PACING_MAX_LAG = 1.0  # segundos de atraso a partir de los cuales "catch_up" se resincroniza en vez de recuperar
     
     # Modelo de detección
     MODEL_NAME = "efficientdet_lite0.tflite"
+    MODEL_INPUT_SIZE = (320, 320)  # (ancho, alto) de entrada del modelo: el frame se reduce una sola vez a este tamaño
     
     # Threads automáticos basados en CPU
     @staticmethod
@@ -39,11 +64,20 @@ class Config:
     # Cámara
     CAMERA_NUMBER = 0
     FALLBACK_VIDEO = "test.mp4"
+    FALLBACK_LOOKAHEAD_FRAMES = 8  # frames del video de prueba decodificados por adelantado
+    FALLBACK_CACHE = os.getenv("FALLBACK_CACHE", "none")  # "none" (se lee el archivo en cada vuelta) o "jpeg" (primera vuelta en memoria comprimida)
+    FALLBACK_CACHE_MAX_MB = 64  # tamaño máximo de la caché JPEG; si el video no cabe se sigue leyendo el archivo
+    FALLBACK_CACHE_QUALITY = 90  # calidad JPEG de la caché
     
     # Streaming
     STREAM_FPS = 30
     STREAM_QUALITY = 70  # Calidad JPEG para streaming
     
+    # Protocolo de envío al servidor de procesamiento:
+    # "stream" (conexión TCP persistente), "binary" (POST con sobre compacto) o "json" (base64, compatibilidad)
+    FRAME_TRANSPORT = os.getenv("FRAME_TRANSPORT", "binary")
+    STREAM_WINDOW_SIZE = 8  # frames enviados sin ack antes de considerar que hay contrapresión
+    
     # Timeouts de red automáticos basados en contenedores (AUMENTADOS)
     @staticmethod
     def get_network_timeout():
@@ -58,6 +92,9 @@ class Config:
     # FPS calculation
     FPS_CALCULATION_FRAMES = 30
     
+    # Pipeline captura -> inferencia -> codificación/envío
+    PIPELINE_QUEUE_SIZE = 2  # frames en cola entre etapas (se descarta el más viejo si se llena)
+    
     # Configuración de red automática
     @staticmethod
     def get_processing_server_host():
@@ -69,6 +106,11 @@ class Config:
         """Obtiene el puerto del servidor de procesamiento"""
         return int(os.getenv("PROCESSING_SERVER_PORT", "8081"))
     
+    @staticmethod
+    def get_processing_server_stream_port():
+        """Obtiene el puerto de la conexión persistente del servidor de procesamiento"""
+        return int(os.getenv("PROCESSING_SERVER_STREAM_PORT", "8082"))
+    
     @classmethod
     def get_processing_server_url(cls):
         """Retorna la URL completa del servidor de procesamiento"""
@@ -79,6 +121,23 @@ class Config:
         """Valida la configuración antes de iniciar el sistema"""
         if cls.DETECTION_SCORE_THRESHOLD < 0 or cls.DETECTION_SCORE_THRESHOLD > 1:
             raise ValueError("DETECTION_SCORE_THRESHOLD debe estar entre 0 y 1")
+        if cls.INFERENCE_IDLE_INTERVAL < 1:
+            raise ValueError("INFERENCE_IDLE_INTERVAL debe ser mayor o igual a 1")
+        if cls.MOTION_GATE_REGION_THRESHOLD < 0 or cls.MOTION_GATE_REGION_THRESHOLD > 1:
+            raise ValueError("MOTION_GATE_REGION_THRESHOLD debe estar entre 0 y 1")
+        if cls.MODEL_INPUT_SIZE[0] < 1 or cls.MODEL_INPUT_SIZE[1] < 1:
+            raise ValueError("MODEL_INPUT_SIZE debe tener ancho y alto positivos")
+        if cls.FRAME_TRANSPORT not in ("stream", "binary", "json"):
+            raise ValueError("FRAME_TRANSPORT debe ser 'stream', 'binary' o 'json'")
+        if cls.PACING_POLICY not in ("skip", "catch_up"):
+            raise ValueError("PACING_POLICY debe ser 'skip' o 'catch_up'")
+        if cls.FALLBACK_CACHE not in ("none", "jpeg"):
+            raise ValueError("FALLBACK_CACHE debe ser 'none' o 'jpeg'")
+        if cls.FALLBACK_LOOKAHEAD_FRAMES < 1:
+            raise ValueError("FALLBACK_LOOKAHEAD_FRAMES debe ser mayor o igual a 1")
+        camera_chars = cls.CAMERA_ID.replace("-", "")
+        if not cls.CAMERA_ID or len(cls.CAMERA_ID) > 32 or not (camera_chars.isascii() and camera_chars.isalnum()):
+            raise ValueError("CAMERA_ID debe tener de 1 a 32 letras, números o guiones")
         
         # Verificar que el modelo existe
         if not os.path.exists(cls.MODEL_NAME):
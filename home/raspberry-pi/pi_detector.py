@@ -1,11 +1,15 @@
 import cv2
 import time
+import queue
 import base64
 import socket
+import struct
 import logging
 import requests
 import ipaddress
 import threading
+import collections
+import numpy as np
 from tflite_support.task import core
 from tflite_support.task import vision
 from tflite_support.task import processor
@@ -14,99 +18,627 @@ from flask_cors import CORS
 from config_rp import Config
 
 
-class SecurityMiddleware:
-    """Middleware para validar IPs y hostnames autorizados"""
-    
-    @staticmethod
-    def resolve_hostname_to_ip(hostname):
-        """Resuelve un hostname a su IP correspondiente"""
-        try:
-            return socket.gethostbyname(hostname)
-        except socket.gaierror:
-            logging.warning(f"Could not resolve hostname: {hostname}")
-            return None
-    
-    @staticmethod
-    def get_all_allowed_ips(allowed_list):
-        """Convierte lista de IPs y hostnames a lista de IPs válidas"""
-        allowed_ips = []
-        
-        for item in allowed_list:
-            # Si es una IP directa
+class IPAllowlist:
+    """Lista de acceso precompilada: IPs exactas en un set (búsqueda O(1)), redes CIDR como ip_network
+    y hostnames resueltos en segundo plano con TTL (y TTL negativo para los que no resuelven)"""
+
+    def __init__(self, entries, ttl=Config.ALLOWLIST_DNS_TTL, negative_ttl=Config.ALLOWLIST_DNS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.static_addresses = set()
+        self.networks = []
+        self.hostnames = {}  # hostname -> (IPs resueltas, expiración)
+
+        for item in entries:
             try:
-                ipaddress.ip_address(item)
-                allowed_ips.append(item)
-                continue
+                network = ipaddress.ip_network(item, strict=False)
             except ValueError:
-                pass
-            
-            # Si es un hostname, intentar resolverlo
-            resolved_ip = SecurityMiddleware.resolve_hostname_to_ip(item)
-            if resolved_ip:
-                allowed_ips.append(resolved_ip)
-                logging.info(f"Resolved {item} -> {resolved_ip}")
-        
-        return allowed_ips
-    
+                self.hostnames[item] = (frozenset(), 0.0)
+                continue
+            if network.num_addresses == 1:
+                self.static_addresses.add(network.network_address)
+            else:
+                self.networks.append(network)
+
+        self.addresses = frozenset(self.static_addresses)
+
     @staticmethod
-    def is_raspberry_allowed(client_ip):
-        """Verifica si la IP es de la Raspberry Pi autorizada"""
+    def resolve(hostname):
+        """Resuelve un hostname a todas sus IPs (vacío si no resuelve)"""
+        try:
+            return frozenset(ipaddress.ip_address(info[4][0].split('%')[0])
+                             for info in socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP))
+        except (socket.gaierror, UnicodeError, ValueError):
+            return frozenset()
+
+    def refresh(self, force=False):
+        """Vuelve a resolver los hostnames vencidos y publica el nuevo conjunto de IPs de una sola vez"""
+        now = time.monotonic()
+        changed = False
+        for hostname, (resolved, expires) in list(self.hostnames.items()):
+            if not force and expires > now:
+                continue
+            ips = self.resolve(hostname)
+            if ips:
+                if ips != resolved:
+                    logging.info(f"Resolved {hostname} -> {', '.join(sorted(map(str, ips)))}")
+                self.hostnames[hostname] = (ips, now + self.ttl)
+            else:
+                if resolved or expires == 0.0:
+                    logging.warning(f"Could not resolve hostname: {hostname}")
+                self.hostnames[hostname] = (ips, now + self.negative_ttl)
+            changed = changed or ips != resolved
+
+        if changed:
+            addresses = set(self.static_addresses)
+            for ips, _ in self.hostnames.values():
+                addresses.update(ips)
+            self.addresses = frozenset(addresses)
+
+    def next_refresh(self):
+        """Instante (monotonic) en que vence el primer hostname, None si no hay hostnames"""
+        return min((expires for _, expires in self.hostnames.values()), default=None)
+
+    def __contains__(self, client_ip):
         try:
             client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_RASPBERRY_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
         except ValueError:
             return False
-    
+        if client_addr.version == 6 and client_addr.ipv4_mapped:
+            client_addr = client_addr.ipv4_mapped
+        if client_addr in self.addresses:
+            return True
+        return any(client_addr in network for network in self.networks)
+
+    def get_stats(self):
+        return {
+            "addresses": sorted(map(str, self.addresses)),
+            "networks": [str(network) for network in self.networks],
+            "unresolved_hostnames": sorted(name for name, (ips, _) in self.hostnames.items() if not ips)
+        }
+
+
+class SecurityMiddleware:
+    """Middleware para validar IPs y hostnames autorizados (listas precompiladas, sin DNS por petición)"""
+
+    allowlists = {}
+    _lock = threading.Lock()
+    _refresher = None
+
+    @staticmethod
+    def get_allowlist(name):
+        """Lista precompilada para el atributo de Config indicado (se construye y resuelve una sola vez)"""
+        allowlist = SecurityMiddleware.allowlists.get(name)
+        if allowlist is None:
+            with SecurityMiddleware._lock:
+                allowlist = SecurityMiddleware.allowlists.get(name)
+                if allowlist is None:
+                    allowlist = IPAllowlist(getattr(Config, name, []))
+                    allowlist.refresh(force=True)
+                    SecurityMiddleware.allowlists[name] = allowlist
+                    SecurityMiddleware._start_refresher()
+        return allowlist
+
+    @staticmethod
+    def _start_refresher():
+        """Hilo que re-resuelve los hostnames cuando vence su TTL, fuera del camino de las peticiones"""
+        if SecurityMiddleware._refresher is not None:
+            return
+        SecurityMiddleware._refresher = threading.Thread(target=SecurityMiddleware._refresh_loop, daemon=True)
+        SecurityMiddleware._refresher.start()
+
+    @staticmethod
+    def _refresh_loop():
+        while True:
+            allowlists = list(SecurityMiddleware.allowlists.values())
+            for allowlist in allowlists:
+                allowlist.refresh()
+            deadlines = [d for d in (a.next_refresh() for a in allowlists) if d is not None]
+            wait = min(deadlines) - time.monotonic() if deadlines else Config.ALLOWLIST_DNS_TTL
+            time.sleep(min(max(wait, 1.0), Config.ALLOWLIST_DNS_TTL))
+
+    @staticmethod
+    def warm_up(*names):
+        """Compila (y resuelve) las listas indicadas al arrancar para que la primera petición no espere DNS"""
+        for name in names:
+            SecurityMiddleware.get_allowlist(name)
+
+    @staticmethod
+    def get_stats():
+        return {name: allowlist.get_stats() for name, allowlist in SecurityMiddleware.allowlists.items()}
+
+    @staticmethod
+    def is_raspberry_allowed(client_ip):
+        """Verifica si la IP es de la Raspberry Pi autorizada"""
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_RASPBERRY_IPS")
+
     @staticmethod
     def is_client_allowed(client_ip):
         """Verifica si la IP es de un cliente autorizado para ver contenido"""
-        try:
-            client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_CLIENT_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
-        except ValueError:
-            return False
-    
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_CLIENT_IPS")
+
     @staticmethod
     def is_processing_server_allowed(client_ip):
         """Verifica si la IP es del servidor de procesamiento autorizado"""
-        try:
-            client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_PROCESSING_SERVER_IPS)
-            
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
-        except ValueError:
-            return False
-        
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_PROCESSING_SERVER_IPS")
+
     @staticmethod
     def is_admin_allowed(client_ip):
         """Verifica si la IP es de un administrador autorizado"""
+        return client_ip in SecurityMiddleware.get_allowlist("ALLOWED_ADMIN_IPS")
+
+
+class FrameEnvelope:
+    """Sobre binario de envío: cabecera fija + id de cámara + arreglo de detecciones empaquetado + JPEG crudo
+
+    Debe coincidir con FrameEnvelope del servidor de procesamiento.
+    """
+
+    MAGIC = b'OSPF'
+    VERSION = 2
+    HEADER = struct.Struct('<4sBBHHdfH')
+    DETECTION_DTYPE = np.dtype([
+        ('x', '<i4'), ('y', '<i4'), ('width', '<i4'), ('height', '<i4'),
+        ('score', '<f4'), ('category', 'S16')
+    ])
+    CONTENT_TYPE = 'application/x-osp-frame'
+
+    @classmethod
+    def pack(cls, jpeg, detections, timestamp, fps, width=Config.FRAME_WIDTH, height=Config.FRAME_HEIGHT,
+             camera_id=Config.CAMERA_ID):
+        """Empaqueta un frame sin pasar el JPEG por base64"""
+        camera = camera_id.encode()
+        records = np.zeros(len(detections), dtype=cls.DETECTION_DTYPE)
+        for i, detection in enumerate(detections):
+            bbox = detection['bbox']
+            records[i] = (bbox['x'], bbox['y'], bbox['width'], bbox['height'],
+                          detection.get('score', 0), detection['category'].encode())
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(camera), width, height, timestamp, fps, len(records))
+        return b''.join([header, camera, records.tobytes(), memoryview(jpeg)])
+
+
+class FrameStreamClient:
+    """Envío de frames por una conexión TCP persistente con ventana de acks
+
+    Los frames se escriben sin esperar respuesta; un hilo lector consume los acks del servidor y
+    libera la ventana. Si la ventana está llena (el servidor va atrasado) el frame se descarta.
+    """
+
+    LENGTH = struct.Struct('<I')
+    ACK = struct.Struct('<IBH')
+
+    # Resultados de send()
+    SENT = "sent"
+    DROPPED = "dropped"  # ventana llena: el servidor va atrasado y el frame se descarta
+    DISCONNECTED = "disconnected"
+
+    def __init__(self, host, port, window_size=Config.STREAM_WINDOW_SIZE, on_ack=None):
+        self.host = host
+        self.port = port
+        self.window_size = window_size
+        self.on_ack = on_ack
+        self.connection = None
+        self.lock = threading.Lock()
+        self.window = threading.BoundedSemaphore(window_size)
+        self.sequence = 0
+        self.send_times = {}
+
+        # Estadísticas
+        self.frames_sent = 0
+        self.frames_acked = 0
+        self.frames_failed = 0
+        self.backpressure_drops = 0
+        self.server_queue_depth = 0
+        self.last_ack_rtt = 0
+        self.connections = 0
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def connect(self):
+        """Abre la conexión y el hilo lector de acks"""
+        connection = socket.create_connection((self.host, self.port), timeout=Config.get_network_timeout())
+        connection.settimeout(None)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        with self.lock:
+            self.connection = connection
+            self.sequence = 0
+            self.send_times = {}
+            self.window = threading.BoundedSemaphore(self.window_size)
+            # El lector de acks trabaja sólo con la ventana y los tiempos de su conexión
+            args = (connection, self.window, self.send_times)
+        self.connections += 1
+
+        threading.Thread(target=self._ack_loop, args=args, daemon=True).start()
+        logging.info(f"Frame stream connected to {self.host}:{self.port}")
+
+    def send(self, body):
+        """Envía un frame sin esperar su ack. Retorna SENT, DROPPED (ventana llena) o DISCONNECTED"""
+        with self.lock:
+            if self.connection is None:
+                return self.DISCONNECTED
+            if not self.window.acquire(blocking=False):
+                self.backpressure_drops += 1
+                return self.DROPPED
+
+            # El permiso sólo queda tomado si el frame salió: si no, ningún ack lo devolvería
+            try:
+                self.sequence += 1
+                self.send_times[self.sequence] = time.time()
+                self.connection.sendall(self.LENGTH.pack(len(body)))
+                self.connection.sendall(body)
+                self.frames_sent += 1
+                return self.SENT
+            except OSError as e:
+                logging.error(f"Error sending frame stream data: {e}")
+                self.send_times.pop(self.sequence, None)
+                self.window.release()
+                self._disconnect()
+                return self.DISCONNECTED
+
+    def _ack_loop(self, connection, window, send_times):
+        buffer = bytearray(self.ACK.size)
+        view = memoryview(buffer)
         try:
-            client_addr = ipaddress.ip_address(client_ip)
-            allowed_ips = SecurityMiddleware.get_all_allowed_ips(Config.ALLOWED_ADMIN_IPS)
+            while True:
+                received = 0
+                while received < self.ACK.size:
+                    count = connection.recv_into(view[received:])
+                    if count == 0:
+                        raise ConnectionError("connection closed by processing server")
+                    received += count
+
+                sequence, status, queue_depth = self.ACK.unpack(buffer)
+                sent_time = send_times.pop(sequence, None)
+                if sent_time:
+                    self.last_ack_rtt = time.time() - sent_time
+                self.server_queue_depth = queue_depth
+                if status:
+                    self.frames_acked += 1
+                    if self.on_ack:
+                        self.on_ack()
+                else:
+                    self.frames_failed += 1
+                window.release()
+        except (OSError, ConnectionError) as e:
+            logging.warning(f"Frame stream ack reader stopped: {e}")
+            with self.lock:
+                if self.connection is connection:
+                    self._disconnect()
+
+    def _disconnect(self):
+        if self.connection:
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+        self.connection = None
+
+    def close(self):
+        with self.lock:
+            self._disconnect()
+
+    def get_stats(self):
+        return {
+            "connected": self.connected,
+            "in_flight": len(self.send_times),
+            "window_size": self.window_size,
+            "frames_sent": self.frames_sent,
+            "frames_acked": self.frames_acked,
+            "frames_failed": self.frames_failed,
+            "backpressure_drops": self.backpressure_drops,
+            "server_queue_depth": self.server_queue_depth,
+            "last_ack_rtt_ms": round(self.last_ack_rtt * 1000, 2),
+            "connections": self.connections
+        }
+
+
+class FrameRingBuffer:
+    """Cola acotada entre etapas del pipeline: si está llena descarta el frame más viejo"""
+
+    def __init__(self, capacity=Config.PIPELINE_QUEUE_SIZE):
+        self.items = collections.deque(maxlen=capacity)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=1.0):
+        """Retorna el siguiente elemento o None si no llega nada en timeout segundos"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items, timeout=timeout):
+                return None
+            return self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class PipelineStage:
+    """Mide la latencia de una etapa del pipeline y la profundidad de su cola de entrada"""
+
+    def __init__(self, name, input_queue=None):
+        self.name = name
+        self.input_queue = input_queue
+        self.frames = 0
+        self.latencies = collections.deque(maxlen=Config.FPS_CALCULATION_FRAMES)
+
+    def record(self, latency):
+        self.frames += 1
+        self.latencies.append(latency)
+
+    def get_stats(self):
+        latencies = list(self.latencies)
+        stats = {
+            "frames": self.frames,
+            "avg_latency_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0,
+            "last_latency_ms": round(latencies[-1] * 1000, 2) if latencies else 0
+        }
+        if self.input_queue is not None:
+            stats["queue_depth"] = len(self.input_queue)
+            stats["queue_dropped"] = self.input_queue.dropped
+        return stats
+
+
+class FramePacer:
+    """Marca el ritmo de un bucle contra plazos absolutos del reloj monotónico
+
+    Cada tick tiene un plazo fijo (inicio + n * intervalo), así que el tiempo de trabajo del bucle se
+    descuenta solo y los errores de sleep no se acumulan. Si el bucle llega tarde, con la política
+    "skip" se descartan los ticks perdidos y se sigue desde el más reciente; con "catch_up" se ejecutan
+    sin esperar hasta recuperar el ritmo, salvo que el atraso supere PACING_MAX_LAG (se resincroniza).
+    """
+
+    def __init__(self, fps, policy=Config.PACING_POLICY, max_lag=Config.PACING_MAX_LAG):
+        self.interval = 1.0 / fps
+        self.policy = policy
+        self.max_lag = max_lag
+        self.deadline = None
+        
+        # Estadísticas
+        self.ticks = 0
+        self.late_ticks = 0
+        self.skipped_ticks = 0
+        self.resyncs = 0
+        self.jitter = collections.deque(maxlen=Config.FPS_CALCULATION_FRAMES)
+
+    def wait(self):
+        """Espera hasta el plazo del siguiente tick y retorna cuántos ticks se descartaron por atraso"""
+        now = time.monotonic()
+        self.ticks += 1
+        if self.deadline is None:
+            self.deadline = now
+            return 0
+        
+        self.deadline += self.interval
+        late = now - self.deadline
+        if late < 0:
+            time.sleep(-late)
+            self.jitter.append(time.monotonic() - self.deadline)
+            return 0
+        
+        self.late_ticks += 1
+        self.jitter.append(late)
+        skipped = 0
+        if self.policy == "skip":
+            skipped = int(late // self.interval)
+            self.deadline += skipped * self.interval
+            self.skipped_ticks += skipped
+        elif late > self.max_lag:
+            self.deadline = now
+            self.resyncs += 1
+        return skipped
+
+    def reset(self):
+        """Reinicia la secuencia de plazos (p. ej. tras una pausa)"""
+        self.deadline = None
+
+    def get_stats(self):
+        jitter = list(self.jitter)
+        return {
+            "target_fps": round(1.0 / self.interval, 2),
+            "policy": self.policy,
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "resyncs": self.resyncs,
+            "avg_jitter_ms": round(sum(jitter) / len(jitter) * 1000, 3) if jitter else 0,
+            "max_jitter_ms": round(max(jitter) * 1000, 3) if jitter else 0
+        }
+
+
+class LatestFrameSlot:
+    """Último frame capturado, publicado como instantánea inmutable con número de secuencia
+
+    El hilo de captura congela el frame (solo lectura) y publica (secuencia, frame) en una sola asignación:
+    los lectores toman la instantánea sin locks y nunca ven un frame a medio escribir ni modificado. El JPEG
+    de cada secuencia se codifica una sola vez y sólo si algún espectador lo pide.
+    """
+
+    def __init__(self, quality=Config.STREAM_QUALITY):
+        self.quality = quality
+        self._snapshot = (0, None)
+        self._encoded = (0, None)
+        self._encode_lock = threading.Lock()
+        self._condition = threading.Condition()
+        
+        # Estadísticas
+        self.viewers = 0
+        self.frames_encoded = 0
+        self.jpeg_reused = 0
+
+    def publish(self, frame):
+        """Publica un nuevo frame (desde el hilo de captura) y despierta a los espectadores"""
+        frame.flags.writeable = False
+        snapshot = (self._snapshot[0] + 1, frame)
+        self._snapshot = snapshot
+        with self._condition:
+            self._condition.notify_all()
+        return snapshot[0]
+
+    def snapshot(self):
+        """Retorna (secuencia, frame) del último frame publicado"""
+        return self._snapshot
+
+    def wait(self, after_sequence, timeout=1.0):
+        """Espera un frame posterior a after_sequence (retorna la instantánea actual si vence el timeout)"""
+        snapshot = self._snapshot
+        if snapshot[0] != after_sequence:
+            return snapshot
+        with self._condition:
+            self._condition.wait_for(lambda: self._snapshot[0] != after_sequence, timeout=timeout)
+        return self._snapshot
+
+    def encoded(self, snapshot, render=None):
+        """JPEG de la instantánea, compartido por todos los espectadores de esa secuencia
+
+        render recibe el frame inmutable y retorna la imagen a codificar (p. ej. una copia con texto).
+        """
+        sequence, frame = snapshot
+        encoded = self._encoded
+        if encoded[0] == sequence:
+            self.jpeg_reused += 1
+            return encoded[1]
+        
+        with self._encode_lock:
+            encoded = self._encoded
+            if encoded[0] == sequence:
+                self.jpeg_reused += 1
+                return encoded[1]
+            image = render(frame) if render else frame
+            _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            self._encoded = (sequence, buffer.tobytes())
+            self.frames_encoded += 1
+            return self._encoded[1]
+
+    def get_stats(self):
+        return {
+            "sequence": self._snapshot[0],
+            "viewers": self.viewers,
+            "frames_encoded": self.frames_encoded,
+            "jpeg_reused": self.jpeg_reused
+        }
+
+
+class MotionGate:
+    """Detección de movimiento barata (sustracción de fondo sobre una copia reducida en grises)
+
+    El frame reducido se divide en regiones de MOTION_GATE_CELL_SIZE px; hay movimiento si en alguna
+    región la fracción de pixeles cambiados supera MOTION_GATE_REGION_THRESHOLD. Opcionalmente sólo se
+    consideran las regiones de interés de MOTION_GATE_ROI.
+    """
+
+    def __init__(self):
+        self.width, self.height = Config.MOTION_GATE_SIZE
+        self.cell = Config.MOTION_GATE_CELL_SIZE
+        self.rows = self.height // self.cell
+        self.cols = self.width // self.cell
+        
+        # Buffers preasignados
+        self.small = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.gray = np.empty((self.height, self.width), dtype=np.uint8)
+        self.background_u8 = np.empty((self.height, self.width), dtype=np.uint8)
+        self.diff = np.empty((self.height, self.width), dtype=np.uint8)
+        self.changed = np.empty((self.height, self.width), dtype=bool)
+        self.background = None
+        self.roi_mask = self._build_roi_mask(Config.MOTION_GATE_ROI)
+        
+        # Estadísticas
+        self.frames_checked = 0
+        self.frames_with_motion = 0
+        self.total_time = 0
+        self.last_time = 0
+
+    def _build_roi_mask(self, regions):
+        """Convierte rectángulos en px del frame a una máscara booleana en la resolución reducida"""
+        if not regions:
+            return None
+        scale_x = self.width / Config.FRAME_WIDTH
+        scale_y = self.height / Config.FRAME_HEIGHT
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        for x1, y1, x2, y2 in regions:
+            mask[int(y1 * scale_y):int(np.ceil(y2 * scale_y)), int(x1 * scale_x):int(np.ceil(x2 * scale_x))] = True
+        return mask
+
+    def check(self, image):
+        """Retorna True si hay movimiento respecto al fondo aprendido"""
+        start = time.perf_counter()
+        
+        cv2.resize(image, (self.width, self.height), dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.GaussianBlur(self.gray, (5, 5), 0, dst=self.gray)
+        
+        if self.background is None:
+            self.background = self.gray.astype(np.float32)
+            motion = True
+        else:
+            cv2.convertScaleAbs(self.background, dst=self.background_u8)
+            cv2.absdiff(self.gray, self.background_u8, dst=self.diff)
+            changed = np.greater(self.diff, Config.MOTION_GATE_PIXEL_THRESHOLD, out=self.changed)
+            if self.roi_mask is not None:
+                changed &= self.roi_mask
             
-            for allowed_ip in allowed_ips:
-                if client_addr == ipaddress.ip_address(allowed_ip):
-                    return True
-            return False
-        except ValueError:
-            return False
+            # Fracción de pixeles cambiados por región (vectorizado)
+            regions = changed[:self.rows * self.cell, :self.cols * self.cell]
+            regions = regions.reshape(self.rows, self.cell, self.cols, self.cell).mean(axis=(1, 3))
+            motion = bool((regions > Config.MOTION_GATE_REGION_THRESHOLD).any())
+            
+            cv2.accumulateWeighted(self.gray, self.background, Config.MOTION_GATE_BACKGROUND_RATE)
+        
+        self.last_time = time.perf_counter() - start
+        self.total_time += self.last_time
+        self.frames_checked += 1
+        if motion:
+            self.frames_with_motion += 1
+        return motion
+
+    def get_stats(self):
+        return {
+            "frames_checked": self.frames_checked,
+            "motion_ratio": round(self.frames_with_motion / self.frames_checked, 3) if self.frames_checked else 0,
+            "avg_gate_ms": round(self.total_time / self.frames_checked * 1000, 3) if self.frames_checked else 0,
+            "last_gate_ms": round(self.last_time * 1000, 3)
+        }
 
 
 class ObjectDetector:
-    def __init__(self):
+    """Detector TFLite con filtro de movimiento y cadencia adaptativa
+
+    Con MOTION_GATE_ENABLED los frames sin movimiento no pasan por el modelo. Sin el filtro, en escena
+    quieta infiere 1 de cada N frames; en ambos casos se reutilizan las últimas detecciones y se vuelve a
+    inferir cada frame si hay movimiento o algo cerca de la zona segura.
+
+    El frame llega en la resolución nativa de la cámara y se reduce una sola vez a MODEL_INPUT_SIZE en
+    buffers preasignados (BGR reducido -> RGB); las cajas se devuelven en px de FRAME_WIDTH x FRAME_HEIGHT.
+    """
+
+    def __init__(self, idle_interval=Config.INFERENCE_IDLE_INTERVAL, motion_gate_enabled=Config.MOTION_GATE_ENABLED):
+        self.idle_interval = idle_interval
+        self.motion_gate_enabled = motion_gate_enabled
+        self.motion_gate = MotionGate()
+        self.cadence = 1
+        self.last_detections = []
+        
+        # Buffers preasignados de la entrada del modelo
+        self.input_width, self.input_height = Config.MODEL_INPUT_SIZE
+        self.model_bgr = np.empty((self.input_height, self.input_width, 3), dtype=np.uint8)
+        self.model_rgb = np.empty((self.input_height, self.input_width, 3), dtype=np.uint8)
+        self.scale_x = Config.FRAME_WIDTH / self.input_width
+        self.scale_y = Config.FRAME_HEIGHT / self.input_height
+        
+        # Estadísticas
+        self.frames_seen = 0
+        self.frames_inferred = 0
+        self.frames_gated = 0
+        self.frames_since_inference = 0
+        
         base_options = core.BaseOptions(
             file_name=Config.MODEL_NAME, 
             use_coral=False, 
@@ -124,91 +656,258 @@ class ObjectDetector:
         self.detector = vision.ObjectDetector.create_from_options(options)
 
     def detections(self, image):
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        return self.detector.detect(vision.TensorImage.create_from_array(rgb_image)).detections
+        """Retorna las detecciones del frame (dicts con bbox, category y score), infiriendo sólo cuando la cadencia actual lo pide"""
+        self.frames_seen += 1
+        
+        if self.motion_gate_enabled or self.idle_interval > 1:
+            motion = self.motion_gate.check(image)
+            
+            # Sin movimiento no se ejecuta el modelo
+            if self.motion_gate_enabled and not motion and self.frames_inferred:
+                self.frames_gated += 1
+                self.frames_since_inference += 1
+                return self.last_detections
+            
+            active = motion or self._near_safe_zone(self.last_detections)
+            self.cadence = 1 if active else self.idle_interval
+        
+        if self.frames_since_inference + 1 < self.cadence:
+            self.frames_since_inference += 1
+            return self.last_detections
+        
+        result = self.detector.detect(vision.TensorImage.create_from_array(self.model_input(image)))
+        self.last_detections = self._to_frame_coordinates(result.detections)
+        self.frames_inferred += 1
+        self.frames_since_inference = 0
+        return self.last_detections
+
+    def model_input(self, image):
+        """Reduce el frame directamente al tamaño del modelo y lo convierte a RGB, sin asignar memoria
+
+        El modelo estira la imagen completa a su entrada, así que reducir aquí con la misma interpolación
+        bilineal reemplaza al redimensionado interno de TFLite y la conversión de color se hace sobre el
+        frame pequeño (INTER_AREA es varias veces más lento cuando la escala no es entera).
+        """
+        cv2.resize(image, (self.input_width, self.input_height), dst=self.model_bgr, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self.model_bgr, cv2.COLOR_BGR2RGB, dst=self.model_rgb)
+        return self.model_rgb
+
+    def _to_frame_coordinates(self, detections):
+        """Convierte las detecciones del modelo al formato de envío, con las cajas escaladas al frame enviado"""
+        detection_data = []
+        for detection in detections:
+            box = detection.bounding_box
+            detection_data.append({
+                "bbox": {
+                    "x": round(box.origin_x * self.scale_x),
+                    "y": round(box.origin_y * self.scale_y),
+                    "width": round(box.width * self.scale_x),
+                    "height": round(box.height * self.scale_y)
+                },
+                "category": detection.categories[0].category_name,
+                "score": detection.categories[0].score
+            })
+        return detection_data
+
+    @staticmethod
+    def _near_safe_zone(detections):
+        """Verifica si alguna detección está dentro o cerca (SAFE_ZONE_MARGIN) de la zona segura"""
+        for detection in detections:
+            box = detection["bbox"]
+            if Config.SAFE_ZONE_START[0] - Config.SAFE_ZONE_MARGIN > box["x"] + box["width"]:
+                continue
+            if Config.SAFE_ZONE_END[0] + Config.SAFE_ZONE_MARGIN < box["x"]:
+                continue
+            if Config.SAFE_ZONE_START[1] - Config.SAFE_ZONE_MARGIN > box["y"] + box["height"]:
+                continue
+            if Config.SAFE_ZONE_END[1] + Config.SAFE_ZONE_MARGIN < box["y"]:
+                continue
+            return True
+        return False
+
+    def get_stats(self):
+        """Retorna la cadencia actual, la proporción de frames sin inferencia y el costo del filtro"""
+        skipped = self.frames_seen - self.frames_inferred
+        return {
+            "cadence": self.cadence,
+            "idle_interval": self.idle_interval,
+            "frames_seen": self.frames_seen,
+            "frames_inferred": self.frames_inferred,
+            "skipped_ratio": round(skipped / self.frames_seen, 3) if self.frames_seen else 0,
+            "motion_gate_enabled": self.motion_gate_enabled,
+            "gated_ratio": round(self.frames_gated / self.frames_seen, 3) if self.frames_seen else 0,
+            "motion_gate": self.motion_gate.get_stats()
+        }
 
 
 class VideoFrameProvider:
-    """Proveedor de frames optimizado para video de prueba"""
+    """Proveedor de frames del video de prueba decodificado en streaming
+
+    Un hilo decodifica hasta FALLBACK_LOOKAHEAD_FRAMES frames por adelantado y vuelve al inicio del
+    archivo al terminar, así que el arranque es inmediato y la memoria no depende de la duración del
+    video. Con FALLBACK_CACHE = "jpeg" la primera vuelta se guarda comprimida (hasta
+    FALLBACK_CACHE_MAX_MB) y las siguientes se decodifican desde memoria sin volver a leer el archivo.
+    """
     
-    def __init__(self):
-        self.frames = []
-        self.current_frame_index = 0
-        self.last_frame_time = time.time()
-        self.target_fps = Config.TARGET_FPS
-        self.frame_delay = 1.0 / self.target_fps
+    def __init__(self, lookahead=Config.FALLBACK_LOOKAHEAD_FRAMES, cache_mode=Config.FALLBACK_CACHE):
+        self.frames = queue.Queue(maxsize=lookahead)
+        self.cache_mode = cache_mode
+        self.cache = []
+        self.cache_bytes = 0
+        self.cache_complete = False
+        self.video_path = None
+        self.capture = None
+        self.decode_thread = None
+        self.running = False
         self.is_loaded = False
         
+        # Estadísticas
+        self.total_frames = 0
+        self.frames_decoded = 0
+        self.loops = 0
+        self.underruns = 0
+        
     def load_test_video(self, video_path):
-        """Carga todos los frames del video de prueba en memoria de forma optimizada"""
+        """Abre el video de prueba e inicia la decodificación anticipada (no espera a decodificarlo)"""
         if self.is_loaded:
             return True
             
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
+            capture = cv2.VideoCapture(video_path)
+            if not capture.isOpened():
                 logging.error(f"Cannot open test video: {video_path}")
                 return False
-                
-            logging.info(f"Loading test video frames from {video_path}...")
             
             # Obtener información del video
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            video_fps = cap.get(cv2.CAP_PROP_FPS)
+            self.total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            video_fps = capture.get(cv2.CAP_PROP_FPS)
+            logging.info(f"Video info: {self.total_frames} frames at {video_fps} FPS")
             
-            logging.info(f"Video info: {total_frames} frames at {video_fps} FPS")
-            
-            frame_count = 0
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                    
-                # Redimensionar frame si es necesario
-                if frame.shape[1] != Config.FRAME_WIDTH or frame.shape[0] != Config.FRAME_HEIGHT:
-                    frame = cv2.resize(frame, (Config.FRAME_WIDTH, Config.FRAME_HEIGHT))
-                
-                self.frames.append(frame)
-                frame_count += 1
-                
-                # Log progreso cada 100 frames
-                if frame_count % 100 == 0:
-                    logging.info(f"Loaded {frame_count}/{total_frames} frames")
-                
-            cap.release()
+            self.video_path = video_path
+            self.capture = capture
+            self.running = True
+            self.decode_thread = threading.Thread(target=self._decode_loop, daemon=True)
+            self.decode_thread.start()
             self.is_loaded = True
             
-            logging.info(f"Successfully loaded {len(self.frames)} frames from test video")
+            logging.info(f"Streaming test video from {video_path} (look-ahead {self.frames.maxsize} frames, cache {self.cache_mode})")
             return True
             
         except Exception as e:
             logging.error(f"Error loading test video: {e}")
             return False
-    
-    def get_next_frame(self):
-        """Obtiene el siguiente frame del video de prueba con control de FPS preciso"""
-        if not self.frames:
-            return None
+
+    def _decode_loop(self):
+        """Decodifica frames por adelantado y vuelve al inicio al llegar al final del archivo"""
+        index = 0
+        while self.running:
+            frame = self._decode_frame(index)
+            if frame is None:
+                if index == 0:
+                    logging.error(f"Test video has no decodable frames: {self.video_path}")
+                    self.running = False
+                    break
+                self._rewind()
+                index = 0
+                continue
             
-        # Control de FPS más preciso
-        current_time = time.time()
-        elapsed = current_time - self.last_frame_time
+            self.frames_decoded += 1
+            index += 1
+            while self.running:
+                try:
+                    self.frames.put(frame, timeout=1.0)
+                    break
+                except queue.Full:
+                    continue
         
-        if elapsed < self.frame_delay:
-            time.sleep(self.frame_delay - elapsed)
-            
-        # Obtener frame actual (copia para evitar modificaciones)
-        frame = self.frames[self.current_frame_index].copy()
+        if self.capture:
+            self.capture.release()
+            self.capture = None
+
+    def _decode_frame(self, index):
+        """Retorna el frame index desde la caché completa o desde el archivo (None al final del video)"""
+        if self.cache_complete:
+            return cv2.imdecode(self.cache[index], cv2.IMREAD_COLOR) if index < len(self.cache) else None
         
-        # Avanzar al siguiente frame (loop infinito)
-        self.current_frame_index = (self.current_frame_index + 1) % len(self.frames)
-        self.last_frame_time = time.time()
+        ret, frame = self.capture.read()
+        if not ret:
+            return None
+        if self.cache_mode == "jpeg" and self.cache is not None:
+            self._cache_frame(frame)
+        return frame
+
+    def _cache_frame(self, frame):
+        """Guarda el frame comprimido; si la caché supera su límite se descarta y se sigue leyendo el archivo"""
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, Config.FALLBACK_CACHE_QUALITY])
+        self.cache.append(buffer)
+        self.cache_bytes += buffer.nbytes
+        if self.cache_bytes > Config.FALLBACK_CACHE_MAX_MB * 1024 * 1024:
+            logging.warning("Test video exceeds FALLBACK_CACHE_MAX_MB, streaming from file instead")
+            self.cache = None
+            self.cache_bytes = 0
+
+    def _rewind(self):
+        """Vuelve al primer frame: con la caché completa se libera el archivo, si no se reposiciona o reabre"""
+        self.loops += 1
+        if self.cache_mode == "jpeg" and self.cache and not self.cache_complete:
+            self.cache_complete = True
+            self.capture.release()
+            self.capture = None
+            logging.info(f"Test video cached: {len(self.cache)} frames in {self.cache_bytes / (1024 * 1024):.1f} MB")
+            return
+        if self.cache_complete:
+            return
+        
+        # Algunos contenedores no permiten reposicionar: se reabre el archivo
+        if not self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0):
+            self.capture.release()
+            self.capture = cv2.VideoCapture(self.video_path)
+    
+    def get_next_frame(self):
+        """Obtiene el siguiente frame del video de prueba (el ritmo lo marca el FramePacer de la captura)"""
+        if not self.is_loaded:
+            return None
         
+        # Cada frame decodificado es un array nuevo: no hace falta copiarlo
+        try:
+            frame = self.frames.get_nowait()
+        except queue.Empty:
+            self.underruns += 1
+            try:
+                frame = self.frames.get(timeout=1.0)
+            except queue.Empty:
+                return None
         return frame
+
+    def skip(self, count):
+        """Descarta frames ya decodificados para que el video avance al ritmo de los ticks perdidos"""
+        for _ in range(count):
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                return
     
     def get_total_frames(self):
-        """Retorna el número total de frames cargados"""
-        return len(self.frames)
+        """Retorna el número de frames del video según su contenedor"""
+        return self.total_frames
+
+    def stop(self):
+        """Detiene la decodificación anticipada"""
+        self.running = False
+        if self.decode_thread:
+            self.decode_thread.join(timeout=2.0)
+
+    def get_stats(self):
+        return {
+            "total_frames": self.total_frames,
+            "frames_decoded": self.frames_decoded,
+            "loops": self.loops,
+            "buffered": self.frames.qsize(),
+            "underruns": self.underruns,
+            "cache": self.cache_mode,
+            "cache_complete": self.cache_complete,
+            "cache_mb": round(self.cache_bytes / (1024 * 1024), 1)
+        }
 
 
 class Camera:
@@ -250,30 +949,32 @@ class Camera:
             if not self.video_provider.load_test_video(Config.FALLBACK_VIDEO):
                 raise RuntimeError("Cannot initialize camera or load fallback video")
                 
-            logging.info(f"Fallback video loaded with {self.video_provider.get_total_frames()} frames")
+            logging.info(f"Fallback video opened with {self.video_provider.get_total_frames()} frames")
 
     def frame(self):
         """Obtiene el siguiente frame de la cámara o video de prueba"""
         if self.use_fallback:
             return self.video_provider.get_next_frame()
         else:
+            # Resolución nativa: la inferencia y el envío reducen cada uno una sola vez lo que necesitan
             success, frame = self.video_capture.read()
-            if success:
-                # Redimensionar si es necesario
-                if frame.shape[1] != Config.FRAME_WIDTH or frame.shape[0] != Config.FRAME_HEIGHT:
-                    frame = cv2.resize(frame, (Config.FRAME_WIDTH, Config.FRAME_HEIGHT))
-                return frame
-            return None
+            return frame if success else None
+
+    def skip(self, count):
+        """Avanza el video de prueba los frames perdidos por atraso; la cámara real siempre entrega el más reciente"""
+        if self.use_fallback:
+            self.video_provider.skip(count)
 
     def isOpened(self):
         """Verifica si la cámara o video está disponible"""
         if self.use_fallback:
-            return len(self.video_provider.frames) > 0
+            return self.video_provider.running
         else:
             return self.video_capture and self.video_capture.isOpened()
 
     def release(self):
         """Libera recursos de la cámara"""
+        self.video_provider.stop()
         if self.video_capture:
             self.video_capture.release()
             self.video_capture = None
@@ -286,11 +987,31 @@ class RaspberryPiDetector:
         self.camera = Camera()
         self.object_detector = ObjectDetector()
         self.processing_server_url = Config.get_processing_server_url()
-        self.current_frame = None
+        self.session = requests.Session()
+        self.stream_client = None
+        if Config.FRAME_TRANSPORT == "stream":
+            self.stream_client = FrameStreamClient(
+                Config.get_processing_server_host(),
+                Config.get_processing_server_stream_port(),
+                on_ack=self._on_frame_acked
+            )
+        self.latest_frame = LatestFrameSlot()
+        self.pacer = FramePacer(Config.TARGET_FPS)
+        self.upload_buffer = np.empty((Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3), dtype=np.uint8)
         self.running = True
         
+        # Pipeline: captura -> inferencia -> codificación/envío
+        self.inference_queue = FrameRingBuffer()
+        self.upload_queue = FrameRingBuffer()
+        self.stages = {
+            "capture": PipelineStage("capture"),
+            "inference": PipelineStage("inference", self.inference_queue),
+            "upload": PipelineStage("upload", self.upload_queue)
+        }
+        
         # Estadísticas de rendimiento
         self.frame_times = []
+        self.last_output_time = None
         self.fps = Config.TARGET_FPS
         self.frames_processed = 0
         self.start_time = time.time()
@@ -302,10 +1023,21 @@ class RaspberryPiDetector:
         logging.info(f"Target FPS: {Config.TARGET_FPS}")
 
     def capture_and_detect(self):
-        """Captura frames y detecta objetos, enviando datos al servidor de procesamiento"""
+        """Inicia el pipeline: captura en este hilo, inferencia y envío en hilos propios"""
+        threading.Thread(target=self._inference_loop, daemon=True).start()
+        threading.Thread(target=self._upload_loop, daemon=True).start()
+        self._capture_loop()
+
+    def _capture_loop(self):
+        """Etapa 1: captura frames y los entrega a la inferencia"""
         try:
             while self.running and self.camera.isOpened():
-                frame_start_time = time.time()
+                # Único control de ritmo del pipeline (plazos absolutos sobre el reloj monotónico)
+                skipped = self.pacer.wait()
+                if skipped:
+                    self.camera.skip(skipped)
+                
+                frame_start_time = time.perf_counter()
                 frame = self.camera.frame()
                 
                 if frame is None:
@@ -313,43 +1045,93 @@ class RaspberryPiDetector:
                     time.sleep(0.1)
                     continue
                 
-                self.current_frame = frame
-                time_localtime = time.localtime()
+                self.latest_frame.publish(frame)
+                self.inference_queue.put((frame, time.time()))
+                self.stages["capture"].record(time.perf_counter() - frame_start_time)
                 
-                # Detectar objetos
-                detections = self.object_detector.detections(frame)
+        except Exception as e:
+            logging.error(f"Error in capture loop: {e}", exc_info=True)
+        finally:
+            self.running = False
+            self.camera.release()
+
+    def _inference_loop(self):
+        """Etapa 2: detecta objetos y entrega frame + detecciones al envío"""
+        while self.running:
+            item = self.inference_queue.get()
+            if item is None:
+                continue
+            frame, capture_time = item
+            
+            try:
+                stage_start_time = time.perf_counter()
+                detection_data = self.object_detector.detections(frame)
+                self.upload_queue.put((frame, detection_data, capture_time))
+                self.stages["inference"].record(time.perf_counter() - stage_start_time)
                 
-                # Convertir detecciones a formato JSON
-                detection_data = []
-                for detection in detections:
-                    box = detection.bounding_box
-                    detection_data.append({
-                        "bbox": {
-                            "x": box.origin_x,
-                            "y": box.origin_y,
-                            "width": box.width,
-                            "height": box.height
-                        },
-                        "category": detection.categories[0].category_name,
-                        "score": detection.categories[0].score
-                    })
+            except Exception as e:
+                logging.error(f"Error in inference loop: {e}", exc_info=True)
+
+    def _upload_loop(self):
+        """Etapa 3: codifica en JPEG y envía al servidor de procesamiento"""
+        while self.running:
+            item = self.upload_queue.get()
+            if item is None:
+                continue
+            frame, detection_data, capture_time = item
+            
+            try:
+                stage_start_time = time.perf_counter()
                 
-                # Codificar frame en base64
-                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY])
-                frame_base64 = base64.b64encode(buffer).decode('utf-8')
+                # Codificar frame en JPEG a la resolución que espera el servidor
+                _, buffer = cv2.imencode('.jpg', self._upload_frame(frame), [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY])
                 
-                # Calcular FPS
-                frame_time = time.time() - frame_start_time
-                self.frame_times.append(frame_time)
+                # Enviar datos al servidor de procesamiento
+                if self.stream_client:
+                    self._send_stream_frame(FrameEnvelope.pack(buffer, detection_data, capture_time, self.fps))
+                else:
+                    self._post_frame(buffer, detection_data, capture_time, time.localtime(capture_time))
                 
-                if len(self.frame_times) >= Config.FPS_CALCULATION_FRAMES:
-                    average_frame_time = sum(self.frame_times) / len(self.frame_times)
-                    self.fps = round(1/average_frame_time, 2)
-                    self.frame_times = []
+                self.stages["upload"].record(time.perf_counter() - stage_start_time)
+                self._update_fps()
                 
-                # Preparar datos para envío
+            except Exception as e:
+                logging.error(f"Error in upload loop: {e}", exc_info=True)
+
+    def _upload_frame(self, frame):
+        """Retorna el frame en FRAME_WIDTH x FRAME_HEIGHT, redimensionando en un buffer reutilizado si la captura difiere"""
+        if frame.shape[1] == Config.FRAME_WIDTH and frame.shape[0] == Config.FRAME_HEIGHT:
+            return frame
+        cv2.resize(frame, (Config.FRAME_WIDTH, Config.FRAME_HEIGHT), dst=self.upload_buffer, interpolation=cv2.INTER_LINEAR)
+        return self.upload_buffer
+
+    def _update_fps(self):
+        """Calcula el FPS a la salida del pipeline (limitado por la etapa más lenta)"""
+        now = time.monotonic()
+        if self.last_output_time is not None:
+            self.frame_times.append(now - self.last_output_time)
+        self.last_output_time = now
+        
+        if len(self.frame_times) >= Config.FPS_CALCULATION_FRAMES:
+            average_frame_time = sum(self.frame_times) / len(self.frame_times)
+            self.fps = round(1/average_frame_time, 2)
+            self.frame_times = []
+
+    def _post_frame(self, buffer, detection_data, capture_time, time_localtime):
+        """Envía un frame con un POST por frame (modos "binary" y "json") reutilizando la sesión HTTP"""
+        try:
+            if Config.FRAME_TRANSPORT == "binary":
+                response = self.session.post(
+                    f"{self.processing_server_url}/process_frame_binary",
+                    data=FrameEnvelope.pack(buffer, detection_data, capture_time, self.fps),
+                    headers={"Content-Type": FrameEnvelope.CONTENT_TYPE},
+                    timeout=Config.get_network_timeout()
+                )
+            else:
+                # Preparar datos para envío (formato JSON con base64, compatibilidad)
                 data = {
-                    "frame": frame_base64,
+                    "camera_id": Config.CAMERA_ID,
+                    "frame": base64.b64encode(buffer).decode('utf-8'),
                     "detections": detection_data,
                     "timestamp": time.strftime("%B%d/%Y %H:%M:%S", time_localtime),
                     "fps": self.fps,
@@ -357,53 +1139,64 @@ class RaspberryPiDetector:
                     "frame_height": Config.FRAME_HEIGHT,
                     "detections_count": len(detection_data)
                 }
-                
-                # Enviar datos al servidor de procesamiento
-                try:
-                    response = requests.post(
-                        f"{self.processing_server_url}/process_frame",
-                        json=data,
-                        timeout=Config.get_network_timeout()
-                    )
-                    
-                    if response.status_code == 200:
-                        self.frames_processed += 1
-                    else:
-                        logging.warning(f"Processing server responded with status {response.status_code}")
-                        
-                except requests.exceptions.RequestException as e:
-                    logging.error(f"Error sending data to processing server: {e}")
-                    time.sleep(Config.get_retry_delay())
-                
-                # Control de FPS para no saturar el procesador
-                elapsed = time.time() - frame_start_time
-                target_frame_time = 1.0 / Config.TARGET_FPS
-                if elapsed < target_frame_time:
-                    time.sleep(target_frame_time - elapsed)
-                
-        except Exception as e:
-            logging.error(f"Error in capture_and_detect: {e}", exc_info=True)
-        finally:
-            self.camera.release()
+                response = self.session.post(
+                    f"{self.processing_server_url}/process_frame",
+                    json=data,
+                    timeout=Config.get_network_timeout()
+                )
+
+            if response.status_code == 200:
+                self.frames_processed += 1
+            else:
+                logging.warning(f"Processing server responded with status {response.status_code}")
+
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error sending data to processing server: {e}")
+            time.sleep(Config.get_retry_delay())
+
+    def _send_stream_frame(self, body):
+        """Envía un frame por la conexión persistente, reconectando si es necesario"""
+        if not self.stream_client.connected:
+            try:
+                self.stream_client.connect()
+            except OSError as e:
+                logging.error(f"Error connecting frame stream to processing server: {e}")
+                time.sleep(Config.get_retry_delay())
+                return
+        
+        self.stream_client.send(body)
+
+    def _on_frame_acked(self):
+        self.frames_processed += 1
 
     def get_current_frame(self):
-        """Retorna el frame actual para stream directo"""
-        return self.current_frame
+        """Retorna el último frame capturado (solo lectura)"""
+        return self.latest_frame.snapshot()[1]
 
     def get_stats(self):
         """Retorna estadísticas del detector"""
         uptime = time.time() - self.start_time
         return {
+            "camera_id": Config.CAMERA_ID,
             "fps": self.fps,
             "frames_processed": self.frames_processed,
             "uptime_seconds": round(uptime, 2),
             "camera_fallback": self.camera.use_fallback,
-            "detection_threads": Config.get_num_threads()
+            "fallback_video": self.camera.video_provider.get_stats() if self.camera.use_fallback else None,
+            "pacing": self.pacer.get_stats(),
+            "raw_stream": self.latest_frame.get_stats(),
+            "detection_threads": Config.get_num_threads(),
+            "frame_transport": Config.FRAME_TRANSPORT,
+            "stream": self.stream_client.get_stats() if self.stream_client else None,
+            "pipeline": {name: stage.get_stats() for name, stage in self.stages.items()},
+            "inference": self.object_detector.get_stats()
         }
 
     def stop(self):
         """Detiene el detector"""
         self.running = False
+        if self.stream_client:
+            self.stream_client.close()
         self.camera.release()
 
 
@@ -417,6 +1210,7 @@ if __name__ == "__main__":
 
     try:
         # Crear detector
+        SecurityMiddleware.warm_up("ALLOWED_ADMIN_IPS")
         detector = RaspberryPiDetector()
 
         # Iniciar captura en un hilo separado
@@ -467,21 +1261,30 @@ if __name__ == "__main__":
         @app.route("/raw_stream")
         def raw_stream():
             """Stream de video directo desde la cámara (solo para debugging)"""
+            def render(frame):
+                # Información de debugging sobre una copia: el frame publicado es inmutable
+                frame = frame.copy()
+                cv2.putText(frame, f"RAW FEED - FPS: {detector.fps}", 
+                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                cv2.putText(frame, f"Threads: {Config.get_num_threads()}", 
+                           (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                return frame
+
             def generate():
-                while True:
-                    frame = detector.get_current_frame()
-                    if frame is not None:
-                        # Añadir información de debugging
-                        cv2.putText(frame, f"RAW FEED - FPS: {detector.fps}", 
-                                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        cv2.putText(frame, f"Threads: {Config.get_num_threads()}", 
-                                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        
-                        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_QUALITY])
+                # Sólo se codifica cuando avanza la secuencia; sin frames nuevos el espectador espera sin CPU
+                slot = detector.latest_frame
+                slot.viewers += 1
+                try:
+                    sequence = 0
+                    while True:
+                        snapshot = slot.wait(sequence)
+                        if snapshot[0] == sequence or snapshot[1] is None:
+                            continue
+                        sequence = snapshot[0]
                         yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                    
-                    time.sleep(1.0 / Config.STREAM_FPS)
+                               b'Content-Type: image/jpeg\r\n\r\n' + slot.encoded(snapshot, render) + b'\r\n')
+                finally:
+                    slot.viewers -= 1
             
             return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
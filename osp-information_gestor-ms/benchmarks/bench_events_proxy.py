@@ -0,0 +1,109 @@
+"""
+Benchmark of the upstream call behind /events: p50/p99 latency with a new httpx.AsyncClient
+per request (previous proxy_events) against the shared keep-alive pool of UpstreamClient.
+
+A local uvicorn server plays the Raspberry Pi and answers /events with a JSON list of events;
+each mode runs the same number of requests at several concurrency levels.
+
+Usage: python benchmarks/bench_events_proxy.py [requests_per_level]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upstream import UpstreamClient
+
+PORT = 8095
+EVENTS_URL = f"http://127.0.0.1:{PORT}/events"
+CONCURRENCY_LEVELS = [1, 10, 50]
+
+
+def serve(ready):
+    """Fake Raspberry Pi /events endpoint"""
+    logging.basicConfig(level=logging.ERROR)
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    events = [
+        {"camera_id": "cam0", "start_time": f"2025-06-07 10:{i % 60:02d}:00", "path": f"cam0/clip_{i}.mp4", "size": 1048576}
+        for i in range(50)
+    ]
+
+    @app.get("/events")
+    async def get_events():
+        return events
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="error"))
+    threading.Timer(1.0, ready.set).start()
+    server.run()
+
+
+async def fresh_client_call():
+    """Previous proxy_events: one client, and therefore one TCP connection, per request"""
+    async with httpx.AsyncClient() as client:
+        response = await client.get(EVENTS_URL)
+        return response.json()
+
+
+def percentile(latencies, q):
+    return latencies[int(q * (len(latencies) - 1))] * 1000
+
+
+async def run(call, requests, concurrency):
+    """Runs the calls with the given concurrency and returns (p50 ms, p99 ms, requests/s)"""
+    latencies = []
+    pending = iter(range(requests))
+
+    async def worker():
+        for _ in pending:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return percentile(latencies, 0.5), percentile(latencies, 0.99), requests / elapsed
+
+
+async def main(requests):
+    upstream = UpstreamClient()
+    upstream.open()
+
+    async def pooled_call():
+        response = await upstream.get("events", EVENTS_URL)
+        return response.json()
+
+    print(f"{requests} requests per level")
+    print(f"{'mode':<8}{'concurrency':>12}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>9}")
+    for concurrency in CONCURRENCY_LEVELS:
+        for mode, call in (("fresh", fresh_client_call), ("pooled", pooled_call)):
+            await run(call, concurrency, concurrency)
+            p50, p99, rate = await run(call, requests, concurrency)
+            print(f"{mode:<8}{concurrency:>12}{p50:>9.2f}{p99:>9.2f}{rate:>9.0f}")
+
+    stats = upstream.get_stats()["upstreams"]["events"]
+    print(f"pool hit rate {stats['pool_hit_rate']:.3f} over {stats['requests']} pooled requests")
+    await upstream.close()
+
+
+if __name__ == "__main__":
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(ready,), daemon=True)
+    server.start()
+    ready.wait()
+    try:
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
+    finally:
+        server.terminate()
+        server.join()
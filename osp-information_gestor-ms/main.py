@@ -1,16 +1,18 @@
 # Standard Library Imports
 import os
+import asyncio
 import logging
 from datetime import datetime
+from contextlib import asynccontextmanager
 
 import redis
+import redis.asyncio
 
 #Setup Redis connection (configure via environment variables)
 print("Connecting to Redis...")
 redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = int(os.getenv("REDIS_PORT", 6379))
 redis_db = int(os.getenv("REDIS_DB", 0))
-redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
 
 #Redis ping test
 r = redis.Redis(redis_host, socket_connect_timeout=1) # short timeout for the test
@@ -18,14 +20,17 @@ r.ping()
 print('connected to redis "{}"'.format(redis_host))
 
 # Third-party Imports
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import httpx
 from apscheduler.schedulers.background import BackgroundScheduler
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
+# Local Imports
+from upstream import UpstreamClient
+from relay import MJPEGRelayHub
+
 """
     Author: Cristian Beltran
     Email: crbeltranr@unal.edu.co
@@ -52,8 +57,20 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
+# Shared keep-alive connection pools to the Raspberry Pi (see upstream.py)
+upstream = UpstreamClient()
+
+@asynccontextmanager
+async def lifespan(app):
+    """Opens the upstream connection pools on startup; stops recordings and closes connections on shutdown"""
+    upstream.open()
+    yield
+    await video_recorder.stop()
+    await async_redis_client.close()
+    await upstream.close()
+
 # Initialize FastAPI application instance
-app = FastAPI(title="Video Surveillance System", description="System of video streaming and information management for Raspberry Pi devices", version="1.0")
+app = FastAPI(title="Video Surveillance System", description="System of video streaming and information management for Raspberry Pi devices", version="1.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -94,51 +111,185 @@ print("Connecting to Redis...")
 redis_host = os.getenv("REDIS_HOST", "localhost")
 redis_port = int(os.getenv("REDIS_PORT", 6379))
 redis_db = int(os.getenv("REDIS_DB", 0))
-redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
+# Non-blocking client used from the event loop
+async_redis_client = redis.asyncio.Redis(host=redis_host, port=redis_port, db=redis_db)
 
 #Redis ping test
 r = redis.Redis(redis_host, socket_connect_timeout=1) # short timeout for the test
 r.ping() 
 print('connected to redis "{}"'.format(redis_host))
 
-async def store_video_stream_in_redis():
+#####
+
+### MJPEG relay ###
+
+# One upstream connection per source shared by all viewers (see relay.py)
+video_relay_hub = MJPEGRelayHub(upstream)
+
+### Video recording to Redis ###
+
+# Bounds of one recording: duration (seconds) and size (MB), defaults and maximum accepted
+VIDEO_STORE_DEFAULT_SECONDS = float(os.getenv("VIDEO_STORE_DEFAULT_SECONDS", 30))
+VIDEO_STORE_MAX_SECONDS = float(os.getenv("VIDEO_STORE_MAX_SECONDS", 300))
+VIDEO_STORE_DEFAULT_MB = float(os.getenv("VIDEO_STORE_DEFAULT_MB", 50))
+VIDEO_STORE_MAX_MB = float(os.getenv("VIDEO_STORE_MAX_MB", 200))
+# Frames or bytes written per Redis pipeline
+VIDEO_STORE_BATCH_FRAMES = int(os.getenv("VIDEO_STORE_BATCH_FRAMES", 15))
+VIDEO_STORE_BATCH_BYTES = int(os.getenv("VIDEO_STORE_BATCH_BYTES", 1024 * 1024))
+# Cap on entries per recording stream (XADD MAXLEN ~) and expiration of the key (seconds)
+VIDEO_STORE_MAXLEN = int(os.getenv("VIDEO_STORE_MAXLEN", 10000))
+VIDEO_STORE_TTL = int(os.getenv("VIDEO_STORE_TTL", 86400))
+# Recordings running at once, and finished recordings kept for GET /video/store
+VIDEO_STORE_MAX_ACTIVE = int(os.getenv("VIDEO_STORE_MAX_ACTIVE", 2))
+VIDEO_STORE_HISTORY = int(os.getenv("VIDEO_STORE_HISTORY", 20))
+
+class RedisVideoRecorder:
     """
-    Proxies the video stream and stores each chunk in Redis.
-    Each chunk is stored with an incrementing key for later retrieval.
+    Records the MJPEG relay into Redis streams as background tasks.
+    Each frame becomes one XADD entry ({"ts", "jpeg"}), so recordings are frame-aligned, and
+    frames are written in batches through a non-transactional pipeline together with the
+    key TTL. Recordings stop when their duration or size bound is reached; only the last
+    VIDEO_STORE_HISTORY finished ones are kept for reporting.
     """
-    stream_key = f"video_stream:{datetime.utcnow().isoformat()}"
-    chunk_counter = 0
-    async with httpx.AsyncClient() as client:
-        async with client.stream("GET", VIDEOS_URL) as response:
-            async for chunk in response.aiter_bytes():
-                # Store each chunk in Redis list
-                redis_client.rpush(stream_key, chunk)
-                chunk_counter += 1
-    return stream_key  # Return the key for reference
+    def __init__(self, redis_client, relay_hub, url):
+        self.redis = redis_client
+        self.relay_hub = relay_hub
+        self.url = url
+        self.recordings = {}
+
+    def active(self):
+        """Number of recordings still running"""
+        return sum(not r["task"].done() for r in self.recordings.values())
+
+    def _prune(self):
+        """Forgets the oldest finished recordings beyond VIDEO_STORE_HISTORY"""
+        finished = [key for key, r in self.recordings.items() if r["status"] != "recording"]
+        for key in finished[:max(0, len(finished) - VIDEO_STORE_HISTORY)]:
+            del self.recordings[key]
+
+    def start(self, duration, max_bytes):
+        """Starts a recording and returns its Redis key without waiting for it"""
+        stream_key = f"video_stream:{datetime.utcnow().isoformat()}"
+        recording = {
+            "redis_key": stream_key,
+            "status": "recording",
+            "duration": duration,
+            "max_bytes": max_bytes,
+            "frames": 0,
+            "bytes": 0,
+            "batches": 0
+        }
+        recording["task"] = asyncio.create_task(self._record(recording))
+        self.recordings[stream_key] = recording
+        return stream_key
+
+    @staticmethod
+    def _jpeg(part):
+        """JPEG payload of a multipart part (without boundary, headers and closing CRLF)"""
+        body = part[part.find(b"\r\n\r\n") + 4:]
+        return body[:-2] if body.endswith(b"\r\n") else body
+
+    async def _write(self, stream_key, batch):
+        pipe = self.redis.pipeline(transaction=False)
+        for ts, jpeg in batch:
+            pipe.xadd(stream_key, {"ts": ts, "jpeg": jpeg}, maxlen=VIDEO_STORE_MAXLEN, approximate=True)
+        pipe.expire(stream_key, VIDEO_STORE_TTL)
+        await pipe.execute()
+
+    async def _record(self, recording):
+        relay = self.relay_hub.relay(self.url)
+        # Room for two batches so a slow pipeline does not make the relay drop frames
+        queue = relay.subscribe(queue_size=2 * VIDEO_STORE_BATCH_FRAMES)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + recording["duration"]
+        batch, batch_bytes = [], 0
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    part = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if part is None:
+                    break  # The relay stopped
+                jpeg = self._jpeg(part)
+                if recording["bytes"] + batch_bytes + len(jpeg) > recording["max_bytes"]:
+                    break
+                batch.append((datetime.utcnow().isoformat(), jpeg))
+                batch_bytes += len(jpeg)
+                if len(batch) >= VIDEO_STORE_BATCH_FRAMES or batch_bytes >= VIDEO_STORE_BATCH_BYTES:
+                    await self._flush(recording, batch, batch_bytes)
+                    batch, batch_bytes = [], 0
+            if batch:
+                await self._flush(recording, batch, batch_bytes)
+            recording["status"] = "completed"
+        except asyncio.CancelledError:
+            recording["status"] = "cancelled"
+            raise
+        except Exception as e:
+            recording["status"] = "failed"
+            logging.error(f"Video recording {recording['redis_key']} failed: {e}")
+        finally:
+            relay.unsubscribe(queue)
+            self._prune()
+            logging.info(f"Video recording {recording['redis_key']} {recording['status']}: "
+                         f"{recording['frames']} frames, {recording['bytes']} bytes")
+
+    async def _flush(self, recording, batch, batch_bytes):
+        await self._write(recording["redis_key"], batch)
+        recording["frames"] += len(batch)
+        recording["bytes"] += batch_bytes
+        recording["batches"] += 1
+
+    async def stop(self):
+        """Cancels the recordings still running (application shutdown)"""
+        tasks = [r["task"] for r in self.recordings.values() if not r["task"].done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self):
+        return [{k: v for k, v in r.items() if k != "task"} for r in self.recordings.values()]
+
+video_recorder = RedisVideoRecorder(async_redis_client, video_relay_hub, VIDEOS_URL)
 
 # Endpoint to trigger storing the video stream in Redis
 @app.post("/video/store")
-async def store_video():
+async def store_video(
+    duration: float = Query(VIDEO_STORE_DEFAULT_SECONDS, gt=0, le=VIDEO_STORE_MAX_SECONDS),
+    max_mb: float = Query(VIDEO_STORE_DEFAULT_MB, gt=0, le=VIDEO_STORE_MAX_MB)
+):
     """
-    Endpoint to start storing the video stream in Redis.
-    Returns the Redis key where the stream is stored.
+    Starts storing the video stream in Redis in the background.
+    Returns right away with the Redis stream key; the capture stops after duration
+    seconds or max_mb megabytes, whichever comes first.
+    At most VIDEO_STORE_MAX_ACTIVE recordings run at once; further requests get 429.
     """
-    stream_key = await store_video_stream_in_redis()
-    return {"message": "Video stream stored in Redis", "redis_key": stream_key}
+    if video_recorder.active() >= VIDEO_STORE_MAX_ACTIVE:
+        raise HTTPException(status_code=429, detail=f"{VIDEO_STORE_MAX_ACTIVE} recordings already running")
+    stream_key = video_recorder.start(duration, int(max_mb * 1024 * 1024))
+    return {
+        "message": "Video stream capture started",
+        "redis_key": stream_key,
+        "duration": duration,
+        "max_mb": max_mb,
+        "ttl": VIDEO_STORE_TTL
+    }
 
-#####
+@app.get("/video/store")
+async def video_store_status():
+    """Progress of the running recordings and the last finished ones"""
+    return {"recordings": video_recorder.get_stats()}
 
 async def proxy_video_stream():
     """
     Asynchronous generator function to proxy video stream from Raspberry Pi.
-    Uses streaming response to handle MJPEG format efficiently.
+    All viewers share a single upstream connection through the relay hub.
     """
-    async with httpx.AsyncClient() as client:
-        # Maintain persistent connection to video stream source
-        async with client.stream("GET", VIDEOS_URL) as response:
-            # Stream bytes in real-time as they arrive
-            async for chunk in response.aiter_bytes():
-                yield chunk
+    async for frame in video_relay_hub.relay(VIDEOS_URL).stream():
+        yield frame
 
 # Root endpoint
 @app.get("/")
@@ -158,6 +309,11 @@ async def video():
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
+@app.get("/video/relay")
+async def video_relay_stats():
+    """Upstream connections and viewers of the video relay"""
+    return {"relays": video_relay_hub.get_stats()}
+
 @app.get("/logs")
 @app.get("/logs/")
 async def get_logs(source: str = "mongo"):
@@ -168,9 +324,8 @@ async def get_logs(source: str = "mongo"):
     - source: 'mongo' (default) or 'direct'
     """
     if source == "direct":
-        async with httpx.AsyncClient() as client:
-            response = await client.get(LOGS_URL)
-            return Response(content=response.text, media_type="text/plain")
+        response = await upstream.get("logs", LOGS_URL)
+        return Response(content=response.text, media_type="text/plain")
     else:
         logs = list(db[collection_name].find({}, {"_id": 0}))
         return {"logs": logs}
@@ -182,12 +337,16 @@ async def proxy_events():
     Proxy endpoint for event notifications from Raspberry Pi.
     Preserves original response status and content.
     """
-    async with httpx.AsyncClient() as client:
-        response = await client.get(EVENTS_URL)
-        return JSONResponse(
-            content=response.json(),
-            status_code=response.status_code
-        )
+    response = await upstream.get("events", EVENTS_URL)
+    return JSONResponse(
+        content=response.json(),
+        status_code=response.status_code
+    )
+
+@app.get("/metrics/upstream")
+async def upstream_metrics():
+    """Pool settings plus request count, pool hit rate, retries and p50/p99 latency per upstream"""
+    return upstream.get_stats()
 
 # Variable to track last processed log entry
 last_log = ""  
@@ -200,7 +359,7 @@ def fetch_logs():
     print("Executing fetch_logs...")
     try:
         # Fetch raw logs from Raspberry Pi endpoint
-        response = httpx.get(information_port)
+        response = upstream.get_sync("logs_sync", information_port)
         response.raise_for_status()
         logs = response.text.splitlines()
         now = datetime.now()
@@ -0,0 +1,174 @@
+import os
+import asyncio
+import logging
+
+"""
+    MJPEG relay for the information gestor: one upstream connection per video source,
+    shared by every viewer of /video and by the Redis recordings.
+
+    The upstream client is an UpstreamClient (see upstream.py) or anything with the same
+    stream(name, url) method.
+"""
+
+# Frames buffered per viewer before the oldest is dropped, and delay before reconnecting upstream
+RELAY_CLIENT_QUEUE_SIZE = int(os.getenv("RELAY_CLIENT_QUEUE_SIZE", 2))
+RELAY_RETRY_DELAY = float(os.getenv("RELAY_RETRY_DELAY", 2.0))
+
+class MultipartFrameParser:
+    """
+    Incremental parser for a multipart/x-mixed-replace stream.
+    Yields each complete part (boundary line, headers and JPEG) as raw bytes, so it can be
+    re-sent to viewers without re-encoding. Uses Content-Length when the part carries one.
+    """
+    def __init__(self, boundary=b"frame"):
+        self.delimiter = b"--" + boundary
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        parts = []
+        while True:
+            start = self.buffer.find(self.delimiter)
+            if start < 0:
+                # Keep only a tail that could be the beginning of a split delimiter
+                del self.buffer[:max(0, len(self.buffer) - len(self.delimiter))]
+                return parts
+            header_end = self.buffer.find(b"\r\n\r\n", start)
+            if header_end < 0:
+                del self.buffer[:start]
+                return parts
+            body_start = header_end + 4
+            end = self._part_end(start, body_start)
+            if end < 0:
+                del self.buffer[:start]
+                return parts
+            parts.append(bytes(self.buffer[start:end]))
+            del self.buffer[:end]
+
+    def _part_end(self, start, body_start):
+        """End offset of the part starting at start, or -1 if it has not fully arrived"""
+        for line in bytes(self.buffer[start:body_start]).split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length" and value.strip().isdigit():
+                end = body_start + int(value)
+                # Include the CRLF that closes the part
+                if len(self.buffer) < end + 2:
+                    return -1
+                return end + 2 if self.buffer[end:end + 2] == b"\r\n" else end
+        end = self.buffer.find(self.delimiter, body_start)
+        if end < 0 and self.buffer.endswith(b"\xff\xd9\r\n"):
+            # JPEG end marker plus closing CRLF: complete without waiting for the next boundary
+            end = len(self.buffer)
+        return end
+
+class MJPEGRelay:
+    """
+    Single upstream connection for one MJPEG source shared by every viewer.
+    Connects lazily with the first subscriber, disconnects when the last one leaves and
+    fans each frame out to per-viewer queues that drop the oldest frame when a viewer lags.
+    """
+    def __init__(self, url, client, client_queue_size=RELAY_CLIENT_QUEUE_SIZE):
+        self.url = url
+        self.client = client
+        self.client_queue_size = client_queue_size
+        self.subscribers = set()
+        self.latest_frame = None
+        self.task = None
+        # Statistics
+        self.upstream_connections = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+
+    def subscribe(self, queue_size=None):
+        """Registers a viewer and starts the upstream connection if it is the first one"""
+        queue = asyncio.Queue(maxsize=queue_size or self.client_queue_size)
+        if self.latest_frame is not None:
+            queue.put_nowait(self.latest_frame)  # Show the last frame right away
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._pump())
+        return queue
+
+    def unsubscribe(self, queue):
+        """Removes a viewer and closes the upstream connection after the last one"""
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.latest_frame = None
+
+    async def _pump(self):
+        """Reads the upstream stream while there are viewers, reconnecting after errors or end of stream"""
+        try:
+            while self.subscribers:
+                try:
+                    async with self.client.stream("video_relay", self.url) as response:
+                        response.raise_for_status()
+                        self.upstream_connections += 1
+                        boundary = response.headers.get("content-type", "").partition("boundary=")[2].strip('"')
+                        parser = MultipartFrameParser(boundary.encode() or b"frame")
+                        async for chunk in response.aiter_bytes():
+                            for frame in parser.feed(chunk):
+                                self._publish(frame)
+                    logging.warning(f"Video relay upstream closed for {self.url}")
+                except Exception as e:
+                    logging.error(f"Video relay upstream error for {self.url}: {e}")
+                # Always wait before reconnecting so a device that keeps closing the stream is not hammered
+                await asyncio.sleep(RELAY_RETRY_DELAY)
+        finally:
+            # A pump cancelled by unsubscribe() may already be replaced by a newer one: leave its viewers alone
+            if self.task is asyncio.current_task():
+                self.task = None
+                # If the relay stops with viewers still subscribed, end their streams instead of leaving them waiting
+                for queue in self.subscribers:
+                    self._offer(queue, None)
+
+    def _offer(self, queue, item):
+        """Queues an item for one viewer, dropping its oldest queued frame if it lags"""
+        if queue.full():
+            queue.get_nowait()
+            self.frames_dropped += 1
+        queue.put_nowait(item)
+
+    def _publish(self, frame):
+        """Delivers a frame to every viewer"""
+        self.latest_frame = frame
+        self.frames_received += 1
+        for queue in self.subscribers:
+            self._offer(queue, frame)
+
+    async def stream(self):
+        """Asynchronous generator of MJPEG parts for one viewer (ends if the relay stops)"""
+        queue = self.subscribe()
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.unsubscribe(queue)
+
+    def get_stats(self):
+        return {
+            "url": self.url,
+            "viewers": len(self.subscribers),
+            "connected": self.task is not None and not self.task.done(),
+            "upstream_connections": self.upstream_connections,
+            "frames_received": self.frames_received,
+            "frames_dropped": self.frames_dropped
+        }
+
+class MJPEGRelayHub:
+    """Keeps one MJPEGRelay per source URL, all reading through the same upstream client"""
+    def __init__(self, client):
+        self.client = client
+        self.relays = {}
+
+    def relay(self, url):
+        if url not in self.relays:
+            self.relays[url] = MJPEGRelay(url, self.client)
+        return self.relays[url]
+
+    def get_stats(self):
+        return [relay.get_stats() for relay in self.relays.values()]
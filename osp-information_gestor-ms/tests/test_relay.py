@@ -0,0 +1,77 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from relay import MJPEGRelay
+
+FRAME = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: 4\r\n\r\n\xff\xd8\xff\xd9\r\n"
+
+
+class FakeResponse:
+    """Upstream MJPEG response that sends one frame and then stays open"""
+    headers = {"content-type": "multipart/x-mixed-replace; boundary=frame"}
+
+    def raise_for_status(self):
+        pass
+
+    async def aiter_bytes(self):
+        yield FRAME
+        await asyncio.Event().wait()
+
+
+class FakeStream:
+    async def __aenter__(self):
+        return FakeResponse()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeClient:
+    def __init__(self):
+        self.streams = 0
+
+    def stream(self, name, url):
+        self.streams += 1
+        return FakeStream()
+
+
+def test_resubscribe_before_cancellation_keeps_new_viewer_streaming():
+    async def scenario():
+        client = FakeClient()
+        relay = MJPEGRelay("http://camera/videos", client)
+        first = relay.subscribe()
+        await asyncio.sleep(0)
+        # Page refresh: the viewer leaves and comes back before the old pump sees its cancellation
+        relay.unsubscribe(first)
+        second = relay.subscribe()
+        await asyncio.sleep(0.05)
+        frame = await asyncio.wait_for(second.get(), timeout=1)
+        assert frame == FRAME
+        assert second.empty()
+        assert relay.task is not None and not relay.task.done()
+        relay.unsubscribe(second)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+
+def test_stopped_relay_ends_viewer_streams():
+    async def scenario():
+        relay = MJPEGRelay("http://camera/videos", FakeClient())
+        frames = []
+
+        async def viewer():
+            async for frame in relay.stream():
+                frames.append(frame)
+
+        task = asyncio.create_task(viewer())
+        await asyncio.sleep(0.05)
+        relay.task.cancel()
+        await asyncio.wait_for(task, timeout=1)
+        assert frames == [FRAME]
+        assert relay.task is None
+
+    asyncio.run(scenario())
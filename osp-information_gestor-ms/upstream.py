@@ -0,0 +1,164 @@
+import os
+import time
+import random
+import asyncio
+import collections
+import importlib.util
+
+import httpx
+
+"""
+    Shared HTTP connection pools for the calls from the information gestor to the edge devices.
+
+    The async client serves the API endpoints and the video relay; the sync client serves the
+    background scheduler thread. Both keep connections alive between calls, retry idempotent
+    requests with jittered exponential backoff and record latency and pool reuse per upstream.
+"""
+
+# Pool limits and timeouts (seconds), configurable via environment variables
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 20))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 10))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30.0))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 10.0))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3.0))
+
+# Retries on transport errors and gateway status codes
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", 0.2))
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# HTTP/2 is negotiated on HTTPS upstreams when the optional h2 package is installed
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+# Latency samples kept per upstream for the percentiles
+UPSTREAM_LATENCY_SAMPLES = 1000
+
+class UpstreamMetrics:
+    """Request count, pool hit rate (requests served on a kept-alive connection), errors and latency"""
+    def __init__(self):
+        self.requests = 0
+        self.reused = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies = collections.deque(maxlen=UPSTREAM_LATENCY_SAMPLES)
+
+    def record(self, latency, new_connection):
+        self.requests += 1
+        if not new_connection:
+            self.reused += 1
+        self.latencies.append(latency)
+
+    def percentile(self, latencies, q):
+        return round(latencies[int(q * (len(latencies) - 1))] * 1000, 2) if latencies else 0
+
+    def get_stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "pool_hit_rate": round(self.reused / self.requests, 3) if self.requests else 0,
+            "errors": self.errors,
+            "retries": self.retries,
+            "latency_p50_ms": self.percentile(latencies, 0.5),
+            "latency_p99_ms": self.percentile(latencies, 0.99)
+        }
+
+class UpstreamClient:
+    """
+    Keep-alive connection pools opened and closed with the application lifespan.
+    get() and get_sync() retry on httpx.TransportError and 502/503/504 responses; stream()
+    is not retried because long-lived streams handle their own reconnection.
+    """
+    def __init__(self):
+        self.client = None
+        self.sync_client = None
+        self.metrics = collections.defaultdict(UpstreamMetrics)
+
+    def _options(self):
+        return {
+            "http2": UPSTREAM_HTTP2,
+            "limits": httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+            ),
+            "timeout": httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+        }
+
+    def open(self):
+        """Creates both pools (called on application startup)"""
+        self.client = httpx.AsyncClient(**self._options())
+        self.sync_client = httpx.Client(**self._options())
+
+    async def close(self):
+        """Closes every pooled connection (called on application shutdown)"""
+        await self.client.aclose()
+        self.sync_client.close()
+
+    @staticmethod
+    def backoff(attempt):
+        """Full-jitter exponential backoff so clients retrying together do not hit the device in lockstep"""
+        return random.uniform(0, UPSTREAM_BACKOFF * 2 ** attempt)
+
+    async def get(self, name, url, **kwargs):
+        """GET through the async pool; name groups the metrics (e.g. "events")"""
+        metrics = self.metrics[name]
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            opened = []
+
+            async def trace(event, info):
+                if event == "connection.connect_tcp.started":
+                    opened.append(event)
+
+            start = time.perf_counter()
+            try:
+                response = await self.client.get(url, extensions={"trace": trace}, **kwargs)
+            except httpx.TransportError:
+                metrics.errors += 1
+                if attempt == UPSTREAM_RETRIES:
+                    raise
+            else:
+                metrics.record(time.perf_counter() - start, bool(opened))
+                if response.status_code not in RETRY_STATUS_CODES or attempt == UPSTREAM_RETRIES:
+                    return response
+            metrics.retries += 1
+            await asyncio.sleep(self.backoff(attempt))
+
+    def get_sync(self, name, url, **kwargs):
+        """GET through the sync pool, for code running outside the event loop (scheduler jobs)"""
+        metrics = self.metrics[name]
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            opened = []
+
+            def trace(event, info):
+                if event == "connection.connect_tcp.started":
+                    opened.append(event)
+
+            start = time.perf_counter()
+            try:
+                response = self.sync_client.get(url, extensions={"trace": trace}, **kwargs)
+            except httpx.TransportError:
+                metrics.errors += 1
+                if attempt == UPSTREAM_RETRIES:
+                    raise
+            else:
+                metrics.record(time.perf_counter() - start, bool(opened))
+                if response.status_code not in RETRY_STATUS_CODES or attempt == UPSTREAM_RETRIES:
+                    return response
+            metrics.retries += 1
+            time.sleep(self.backoff(attempt))
+
+    def stream(self, name, url):
+        """Streaming GET through the async pool (use as an async context manager)"""
+        self.metrics[name].requests += 1
+        return self.client.stream("GET", url)
+
+    def get_stats(self):
+        return {
+            "pool": {
+                "max_connections": UPSTREAM_MAX_CONNECTIONS,
+                "max_keepalive_connections": UPSTREAM_MAX_KEEPALIVE,
+                "keepalive_expiry": UPSTREAM_KEEPALIVE_EXPIRY,
+                "http2": UPSTREAM_HTTP2
+            },
+            "upstreams": {name: metrics.get_stats() for name, metrics in self.metrics.items()}
+        }